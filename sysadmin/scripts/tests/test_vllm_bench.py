@@ -0,0 +1,979 @@
+import http.client
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from array import array
+from contextlib import redirect_stderr, redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+
+MODULE_PATH = Path(__file__).parents[1] / "vllm-bench.py"
+SPEC = importlib.util.spec_from_file_location("vllm_bench", MODULE_PATH)
+vllm_bench = importlib.util.module_from_spec(SPEC)
+sys.modules[SPEC.name] = vllm_bench
+SPEC.loader.exec_module(vllm_bench)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    reasoning = ["Let", " me", " think"]
+    content = ["Waves", " fold", " in"]
+    usage = {"prompt_tokens": 7, "completion_tokens": 6}
+    delay = 0.0
+
+    def log_message(self, *_args):
+        pass
+
+    def do_GET(self):
+        documents = {
+            "/version": {"version": "0.0-stub"},
+            "/v1/models": {"data": [{"id": "stub-model", "root": "stub", "max_model_len": 4096}]},
+        }
+        if self.path not in documents:
+            self.send_error(404)
+            return
+        self.send_json(documents[self.path])
+
+    def send_json(self, document):
+        payload = json.dumps(document).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.bodies.append(body)
+        if not body.get("stream"):
+            self.send_json({
+                "choices": [{
+                    "message": {"content": "".join(self.content)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 7, "completion_tokens": 3},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for key, parts in (("reasoning_content", self.reasoning), ("content", self.content)):
+            for part in parts:
+                time.sleep(self.delay)
+                self.send_event({"choices": [{"delta": {key: part}}]})
+        if body.get("stream_options", {}).get("include_usage") and self.usage:
+            self.send_event({"choices": [], "usage": self.usage})
+        self.send_chunk(b"data: [DONE]\n\n")
+        self.send_chunk(b"")
+
+    def send_event(self, event):
+        self.send_chunk(f"data: {json.dumps(event)}\n\n".encode())
+
+    def send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class PacedHandler(StubHandler):
+    delay = 0.03
+
+
+class PrefixCacheHandler(StubHandler):
+    """Pretends to cache everything before "Question": slow prefill the first time only."""
+
+    lock = threading.Lock()
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            return super().do_GET()
+        counters = self.server.counters
+        payload = (
+            "# HELP vllm:prefix_cache_hits_total Prefix cache hits, in terms of tokens.\n"
+            "# TYPE vllm:prefix_cache_hits_total counter\n"
+            f'vllm:prefix_cache_hits_total{{engine="0",model_name="stub"}} {counters["hits"]}\n'
+            f'vllm:prefix_cache_queries_total{{engine="0",model_name="stub"}} {counters["queries"]}\n'
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        raw = self.rfile.read(length)
+        prompt = json.loads(raw)["messages"][0]["content"]
+        prefix = prompt.split("\n\nQuestion")[0]
+        with self.lock:
+            counters = self.server.counters
+            warm = prefix in counters["seen"]
+            counters["seen"].add(prefix)
+            counters["queries"] += 100
+            counters["hits"] += 90 if warm else 0
+        time.sleep(0.0 if warm else 0.05)
+        self.rfile = io.BytesIO(raw)
+        super().do_POST()
+
+
+class CoalescingHandler(StubHandler):
+    """Two tokens per SSE chunk, as with speculative decoding."""
+
+    usage = {
+        "prompt_tokens": 7,
+        "completion_tokens": 12,
+        "completion_tokens_details": {"reasoning_tokens": 6},
+    }
+
+
+class BusyServerHandler(StubHandler):
+    """Reports a backed-up scheduler on /metrics."""
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            return super().do_GET()
+        payload = (
+            'vllm:num_requests_running{engine="0"} 4\n'
+            'vllm:num_requests_waiting{engine="0"} 3\n'
+            'vllm:kv_cache_usage_perc{engine="0"} 0.5\n'
+            'vllm:num_preemptions_total{engine="0"} 2\n'
+            'vllm:generation_tokens_total{engine="0"} 100\n'
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class StubServerTestCase(unittest.TestCase):
+    handler = StubHandler
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+        self.server.bodies = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        for name, value in (("HOST", "127.0.0.1"), ("PORT", self.server.server_port)):
+            patcher = patch.object(vllm_bench, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class StreamRequestTests(StubServerTestCase):
+    def test_tracks_reasoning_and_output_phases(self):
+        result = vllm_bench.stream_request("hello", 16)
+
+        self.assertEqual(result["reasoning_tokens"], 3)
+        self.assertEqual(result["output_tokens"], 3)
+        self.assertEqual(result["output_preview"], "Waves fold in")
+        self.assertIsNotNone(result["tpot_ms"])
+        self.assertTrue(self.server.bodies[0]["stream"])
+
+    def test_records_one_timestamp_per_delta(self):
+        result = vllm_bench.stream_request("hello", 16)
+
+        self.assertEqual(len(result["timeline"]), 6)
+        self.assertEqual(list(result["timeline_phase"]), [0, 0, 0, 1, 1, 1])
+        self.assertEqual(list(result["timeline"]), sorted(result["timeline"]))
+        self.assertEqual(set(result["output_itl_ms"]), {"p50", "p90", "p99", "max"})
+
+
+class ConnectionPoolTests(StubServerTestCase):
+    def test_keepalive_reuses_one_connection(self):
+        results = [vllm_bench.stream_request("hello", 16) for _ in range(3)]
+        vllm_bench.non_streaming_request("hello", 16)
+
+        self.assertIsNotNone(results[0]["connect_ms"])
+        self.assertEqual([r["connect_ms"] for r in results[1:]], [None, None])
+        self.assertEqual(vllm_bench.get_pool().opened, 1)
+
+    def test_no_keepalive_connects_per_request(self):
+        with patch.object(vllm_bench, "KEEPALIVE", False):
+            results = [vllm_bench.stream_request("hello", 16) for _ in range(2)]
+
+            self.assertTrue(all(r["connect_ms"] is not None for r in results))
+            self.assertEqual(vllm_bench.get_pool().opened, 2)
+
+    def test_stale_idle_connection_is_replaced(self):
+        vllm_bench.stream_request("hello", 16)
+        idle = vllm_bench.get_pool()._idle[0]
+        idle.sock.shutdown(socket.SHUT_RDWR)
+
+        result = vllm_bench.stream_request("hello", 16)
+
+        self.assertEqual(result["output_tokens"], 3)
+        self.assertIsNotNone(result["connect_ms"])
+
+
+class PrefixCacheTests(StubServerTestCase):
+    handler = PrefixCacheHandler
+
+    def setUp(self):
+        super().setUp()
+        self.server.counters = {"seen": set(), "hits": 0, "queries": 0}
+        patcher = patch.object(vllm_bench, "load_tokenizer", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_families_share_prefix_within_group_only(self):
+        groups = vllm_bench.prefix_families(2, 3, 200, 8, random.Random(0))
+
+        prefixes = [{prompt.split("\n\nQuestion")[0] for prompt in group} for group in groups]
+        self.assertEqual([len(p) for p in prefixes], [1, 1])
+        self.assertNotEqual(prefixes[0], prefixes[1])
+        self.assertEqual(len(set(groups[0])), 3)
+
+    def test_warm_pass_reports_ttft_drop_and_server_hit_rate(self):
+        with redirect_stdout(io.StringIO()) as out:
+            steps = vllm_bench.run_prefix_cache(2, 3, 200, 8, max_tokens=4, seed=1)
+
+        cold, warm = (step["summary"] for step in steps)
+        self.assertEqual((cold["requests"], warm["requests"]), (2, 4))
+        self.assertLess(warm["ttft_p50_ms"], cold["ttft_p50_ms"])
+        self.assertEqual(cold["prefix_cache"]["hit_rate"], 0.0)
+        self.assertEqual(warm["prefix_cache"], {"hit_tokens": 360, "query_tokens": 400, "hit_rate": 0.9})
+        self.assertIn("Prefill tokens saved:  360 of 400", out.getvalue())
+
+    def test_prometheus_text_is_summed_across_labels(self):
+        metrics = vllm_bench.parse_prometheus(
+            "# TYPE vllm:num_requests_running gauge\n"
+            'vllm:num_requests_running{engine="0",model_name="a b"} 2.0\n'
+            'vllm:num_requests_running{engine="1",model_name="a b"} 3.0\n'
+            "process_start_time_seconds 1.7e9\n"
+            "garbage line\n"
+        )
+
+        self.assertEqual(metrics["vllm:num_requests_running"], 5.0)
+        self.assertEqual(metrics["process_start_time_seconds"], 1.7e9)
+        self.assertNotIn("garbage", metrics)
+
+
+class CoalescedStreamTests(StubServerTestCase):
+    handler = CoalescingHandler
+
+    def test_usage_block_overrides_chunk_counts(self):
+        result = vllm_bench.stream_request("hello", 16)
+
+        self.assertTrue(self.server.bodies[0]["stream_options"]["include_usage"])
+        self.assertEqual(result["token_source"], "usage")
+        self.assertEqual(result["chunk_count"], 6)
+        self.assertEqual((result["reasoning_tokens"], result["output_tokens"]), (6, 6))
+        self.assertEqual(result["prompt_tokens"], 7)
+
+
+class TokenReconcileTests(unittest.TestCase):
+    def test_usage_total_is_split_by_phase_estimate(self):
+        with patch.object(vllm_bench, "count_tokens", return_value=None):
+            counts = vllm_bench.reconcile_tokens(10, 30, "r", "o", {"completion_tokens": 80})
+
+        self.assertEqual(counts, (20, 60, "usage"))
+
+    def test_falls_back_to_local_tokenizer_without_usage(self):
+        with patch.object(vllm_bench, "count_tokens", side_effect=[9, 4]):
+            counts = vllm_bench.reconcile_tokens(3, 2, "reasoning text", "output", None)
+
+        self.assertEqual(counts, (9, 4, "tokenizer"))
+
+    def test_uses_chunk_counts_as_last_resort(self):
+        with patch.object(vllm_bench, "count_tokens", return_value=None):
+            counts = vllm_bench.reconcile_tokens(3, 2, "r", "o", None)
+
+        self.assertEqual(counts, (3, 2, "chunks"))
+
+
+class PacedStreamTests(StubServerTestCase):
+    handler = PacedHandler
+
+    def test_deltas_are_stamped_as_they_arrive(self):
+        result = vllm_bench.stream_request("hello", 16)
+
+        spread = result["timeline"][-1] - result["timeline"][0]
+        self.assertGreaterEqual(spread, 5 * PacedHandler.delay * 0.8)
+
+
+class SSEParserTests(unittest.TestCase):
+    def test_lines_split_across_reads_are_reassembled(self):
+        parser = vllm_bench.SSEParser()
+        stream = b'data: {"a": 1}\n\n: keep-alive\n\ndata: {"b": 2}\n\ndata: [DONE]\n\n'
+
+        payloads = []
+        for i in range(0, len(stream), 3):
+            payloads.extend(parser.feed(stream[i:i + 3]))
+
+        self.assertEqual(payloads, [b'{"a": 1}', b'{"b": 2}'])
+
+    def test_partial_line_is_held_until_newline(self):
+        parser = vllm_bench.SSEParser()
+
+        self.assertEqual(parser.feed(b"data: {\"x\""), [])
+        self.assertEqual(parser.feed(b": 1}\r\n"), [b'{"x": 1}'])
+
+    def test_parser_bench_counts_every_delta(self):
+        result = vllm_bench.bench_parser(events=500, read_size=128)
+
+        self.assertEqual(result["events"], 500)
+        self.assertGreater(result["max_tok_per_s"], 0)
+
+
+class InterTokenLatencyTests(unittest.TestCase):
+    def test_gaps_are_split_by_phase(self):
+        timeline = array("d", [0.10, 0.12, 0.14, 0.50, 0.51])
+        phases = array("b", [0, 0, 0, 1, 1])
+
+        reasoning, output = vllm_bench.itl_gaps(timeline, phases)
+
+        self.assertEqual([round(g, 2) for g in reasoning], [0.02, 0.02])
+        self.assertEqual([round(g, 2) for g in output], [0.36, 0.01])
+
+    def test_stats_expose_tail_and_max(self):
+        stats = vllm_bench.latency_stats([0.01] * 98 + [0.2, 1.0])
+
+        self.assertEqual(stats["p50"], 10.0)
+        self.assertEqual(stats["max"], 1000.0)
+        self.assertGreater(stats["p99"], stats["p90"])
+
+    def test_timelines_are_written_as_jsonl(self):
+        out = io.StringIO()
+        result = {"timeline": array("d", [0.1, 0.2]), "timeline_phase": array("b", [0, 1])}
+
+        vllm_bench.write_timelines(out, "concurrency=4", [result, result])
+
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[1]["label"], "concurrency=4")
+        self.assertEqual(lines[1]["index"], 1)
+        self.assertEqual(lines[0]["phase"], [0, 1])
+
+
+class LoadModeTests(StubServerTestCase):
+    def test_run_load_completes_total_requests(self):
+        results, errors, wall_s = vllm_bench.run_load(concurrency=3, total_requests=7)
+
+        self.assertEqual(len(results), 7)
+        self.assertEqual(errors, 0)
+        self.assertGreater(wall_s, 0)
+        self.assertEqual(len(self.server.bodies), 7)
+
+    def test_summary_reports_throughput_and_percentiles(self):
+        results = [
+            {
+                "ttft_ms": float(ttft),
+                "tpot_ms": 10.0,
+                "total_tokens": 100,
+                "chunk_count": 50,
+                "connect_ms": 0.5 if ttft == 100 else None,
+                "timeline": array("d", [0.0, 0.01, 0.02]),
+                "timeline_phase": array("b", [1, 1, 1]),
+            }
+            for ttft in (100, 200, 300, 400)
+        ]
+
+        summary = vllm_bench.summarize_load(4, results, errors=1, wall_s=2.0)
+
+        self.assertEqual(summary["req_per_s"], 2.0)
+        self.assertEqual(summary["tok_per_s"], 200.0)
+        self.assertEqual(summary["ttft_p50_ms"], 250.0)
+        self.assertEqual(summary["tpot_p99_ms"], 10.0)
+        self.assertEqual(summary["itl_p99_ms"], 10.0)
+        self.assertEqual(summary["errors"], 1)
+        self.assertEqual(summary["tokens_per_chunk"], 2.0)
+        self.assertEqual(summary["new_connections"], 1)
+
+
+class OpenLoopTests(StubServerTestCase):
+    def test_fixed_arrivals_are_evenly_spaced(self):
+        offsets = vllm_bench.arrival_offsets(4, 4, "fixed", random.Random(0))
+
+        self.assertEqual(offsets, [0.0, 0.25, 0.5, 0.75])
+
+    def test_poisson_arrivals_match_target_rate(self):
+        offsets = vllm_bench.arrival_offsets(10, 5000, "poisson", random.Random(1))
+
+        self.assertEqual(offsets[0], 0.0)
+        self.assertAlmostEqual(len(offsets) / offsets[-1], 10, delta=0.5)
+
+    def test_open_loop_splits_wait_from_decode(self):
+        results, errors, _ = vllm_bench.run_open_loop(50, 5, "fixed")
+        summary = vllm_bench.summarize_open_loop(50, results, errors, 1.0)
+
+        self.assertEqual((len(results), errors), (5, 0))
+        for result in results:
+            self.assertGreaterEqual(result["e2e_ms"], result["wait_ms"])
+            self.assertGreaterEqual(result["decode_s"], 0)
+        self.assertIn("wait_p99_ms", summary)
+        self.assertGreaterEqual(summary["peak_in_flight"], 1)
+
+    def test_open_loop_without_requests_returns_nothing(self):
+        self.assertEqual(vllm_bench.run_open_loop(50, 0, "fixed"), ([], 0, 0.0))
+
+    def test_peak_in_flight_counts_overlap(self):
+        results = [
+            {"sent_s": 0.0, "done_s": 3.0},
+            {"sent_s": 1.0, "done_s": 2.0},
+            {"sent_s": 2.5, "done_s": 4.0},
+        ]
+
+        self.assertEqual(vllm_bench.peak_in_flight(results), 2)
+
+
+class ResultsStoreTests(StubServerTestCase):
+    def test_save_records_metadata_and_per_request_metrics(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "runs" / "load.json"
+            with redirect_stdout(io.StringIO()):
+                exit_code = vllm_bench.main(["load", "-c", "2", "-n", "4", "--save", str(path)])
+            doc = json.loads(path.read_text())
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(doc["mode"], "load")
+        self.assertEqual(doc["server"]["version"], "0.0-stub")
+        self.assertEqual(doc["server"]["models"][0]["max_model_len"], 4096)
+        self.assertIn("hostname", doc["client"])
+        step = doc["steps"][0]
+        self.assertEqual(step["label"], "concurrency=2")
+        self.assertEqual(len(step["requests"]), 4)
+        self.assertNotIn("timeline", step["requests"][0])
+        self.assertIn("ttft_ms", step["requests"][0])
+
+
+def saved_run(ttfts, tps):
+    requests = [{"ttft_ms": t, "overall_tps": v} for t, v in zip(ttfts, tps)]
+    return {
+        "mode": "load",
+        "model": "m",
+        "server": {"version": "x"},
+        "steps": [{"label": "concurrency=4", "summary": None, "requests": requests}],
+    }
+
+
+def sharded_run(ttfts):
+    hist = vllm_bench.LatencyHistogram()
+    for ttft in ttfts:
+        hist.record(ttft)
+    run = saved_run([], [])
+    run["steps"][0]["histograms"] = {"ttft_ms": hist.to_dict()}
+    return run
+
+
+class CompareTests(unittest.TestCase):
+    def test_mann_whitney_separates_shifted_samples(self):
+        self.assertLess(vllm_bench.mann_whitney_p(range(20), range(30, 50)), 0.001)
+        self.assertGreater(vllm_bench.mann_whitney_p([5] * 10, [5] * 10), 0.5)
+        self.assertIsNone(vllm_bench.mann_whitney_p([1], [2, 3]))
+
+    def test_flags_significant_ttft_regression_only(self):
+        base = saved_run([100 + i for i in range(20)], [50.0] * 20)
+        slower = saved_run([150 + i for i in range(20)], [50.5] * 20)
+
+        rows = vllm_bench.compare_runs(base, slower, threshold_pct=5, alpha=0.05)
+
+        by_metric = {row["metric"]: row for row in rows}
+        self.assertTrue(by_metric["TTFT ms"]["regression"])
+        self.assertFalse(by_metric["tok/s"]["regression"])
+
+    def test_small_noisy_change_is_not_a_regression(self):
+        base = saved_run([100, 300, 120, 280], [50.0] * 4)
+        noisy = saved_run([110, 320, 125, 290], [50.0] * 4)
+
+        rows = vllm_bench.compare_runs(base, noisy, threshold_pct=5, alpha=0.05)
+
+        self.assertFalse(any(row["regression"] for row in rows))
+
+    def test_sharded_runs_gate_on_histogram_medians_without_a_test(self):
+        base = sharded_run([100 + i for i in range(20)])
+        slower = sharded_run([150 + i for i in range(20)])
+
+        rows = vllm_bench.compare_runs(base, slower, threshold_pct=5, alpha=0.05)
+
+        self.assertEqual([row["metric"] for row in rows], ["TTFT ms"])
+        self.assertAlmostEqual(rows[0]["candidate"], 160, delta=2)
+        self.assertEqual((rows[0]["p_value"], rows[0]["status"]), (None, "REGRESSION (untested)"))
+        self.assertTrue(rows[0]["regression"])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_path = Path(temp_dir) / "base.json"
+            new_path = Path(temp_dir) / "new.json"
+            base_path.write_text(json.dumps(base))
+            new_path.write_text(json.dumps(slower))
+            with redirect_stdout(io.StringIO()) as out:
+                regressed = vllm_bench.main(["compare", str(base_path), str(new_path)])
+                unchanged = vllm_bench.main(["compare", str(base_path), str(base_path)])
+
+        self.assertEqual((regressed, unchanged), (1, 0))
+        self.assertIn("no significance", out.getvalue())
+
+    def test_compare_exits_non_zero_on_regression(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_path = Path(temp_dir) / "base.json"
+            new_path = Path(temp_dir) / "new.json"
+            base_path.write_text(json.dumps(saved_run([100] * 10, [60.0 + i for i in range(10)])))
+            new_path.write_text(json.dumps(saved_run([100] * 10, [40.0 + i for i in range(10)])))
+
+            with redirect_stdout(io.StringIO()):
+                regressed = vllm_bench.main(["compare", str(base_path), str(new_path)])
+                unchanged = vllm_bench.main(["compare", str(base_path), str(base_path)])
+
+        self.assertEqual((regressed, unchanged), (1, 0))
+
+
+class WorkloadTests(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir = Path(temp_dir.name)
+        patcher = patch.object(vllm_bench, "load_tokenizer", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lengths_follow_distribution_and_bounds(self):
+        rng = random.Random(3)
+
+        self.assertEqual(vllm_bench.sample_length(128, rng), 128)
+        uniform = [vllm_bench.sample_length({"dist": "uniform", "min": 10, "max": 20}, rng)
+                   for _ in range(200)]
+        self.assertEqual((min(uniform), max(uniform)), (10, 20))
+        lognormal = [vllm_bench.sample_length(
+            {"dist": "lognormal", "mean": 1000, "stddev": 500, "max": 1500}, rng) for _ in range(2000)]
+        self.assertLessEqual(max(lognormal), 1500)
+        self.assertAlmostEqual(sum(lognormal) / len(lognormal), 950, delta=80)
+
+    def test_jsonl_dataset_is_streamed_and_wraps_around(self):
+        path = self.dir / "prompts.jsonl"
+        path.write_text(
+            json.dumps({"prompt": "first", "max_tokens": 7}) + "\n\n"
+            + json.dumps({"conversations": [{"from": "human", "value": "ignored"}]}) + "\n"
+            + json.dumps({"prompt": "second"}) + "\n"
+        )
+
+        jobs = vllm_bench.load_workload(path).take(4)
+
+        self.assertEqual([prompt for _, prompt, _ in jobs], ["first", "second", "first", "second"])
+        self.assertEqual(jobs[0], ("prompts:1", "first", 7))
+        self.assertEqual(jobs[1][2], 1000)
+
+    def test_spec_mixes_synthetic_and_chat_dataset_sources(self):
+        dataset = self.dir / "chat.jsonl"
+        dataset.write_text(json.dumps(
+            {"messages": [{"role": "system", "content": "s"}, {"role": "user", "content": "hi"}]}
+        ) + "\n")
+        spec = self.dir / "mix.json"
+        spec.write_text(json.dumps({
+            "name": "mix",
+            "seed": 1,
+            "max_tokens": {"dist": "uniform", "min": 64, "max": 128},
+            "sources": [
+                {"synthetic": {"input_tokens": 260}, "weight": 1},
+                {"dataset": {"path": str(dataset), "field": "messages"}, "weight": 1},
+            ],
+        }))
+
+        workload = vllm_bench.load_workload(spec)
+        jobs = workload.take(40)
+
+        self.assertEqual(workload.name, "mix")
+        names = {name for name, _, _ in jobs}
+        self.assertEqual(names, {"synthetic-260tok", "chat:1"})
+        synthetic = next(prompt for name, prompt, _ in jobs if name.startswith("synthetic"))
+        self.assertAlmostEqual(len(synthetic.split()), 260 / vllm_bench.TOKENS_PER_WORD, delta=15)
+        self.assertTrue(all(64 <= max_tok <= 128 for _, _, max_tok in jobs))
+
+    def test_synthetic_prompts_do_not_share_a_prefix(self):
+        rng = random.Random(0)
+
+        first = vllm_bench.synthetic_prompt(200, rng)
+        second = vllm_bench.synthetic_prompt(200, rng)
+
+        header = len("Summarize the following notes:\n\n")
+        self.assertNotEqual(first[header:header + 40], second[header:header + 40])
+
+    def test_synthetic_prompt_hits_the_token_count_in_a_few_encodes(self):
+        class WordPairTokenizer:
+            """Two words per token: far sparser than the words-based first guess."""
+
+            def __init__(self):
+                self.encodes = 0
+
+            def encode(self, text, add_special_tokens=True):
+                self.encodes += 1
+                words = text.split()
+                return types.SimpleNamespace(ids=[" ".join(words[i:i + 2])
+                                                  for i in range(0, len(words), 2)])
+
+            def decode(self, ids):
+                return " ".join(ids)
+
+        tokenizer = WordPairTokenizer()
+        with patch.object(vllm_bench, "load_tokenizer", return_value=tokenizer):
+            prompt = vllm_bench.synthetic_prompt(100_000, random.Random(0))
+
+        self.assertEqual(len(tokenizer.encode(prompt).ids), 100_000)
+        self.assertLessEqual(tokenizer.encodes - 1, 3)
+
+
+class WorkloadCliTests(StubServerTestCase):
+    def test_load_sends_prompts_from_workload_to_selected_model(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "prompts.txt"
+            path.write_text("alpha\nbeta\n")
+            with redirect_stdout(io.StringIO()), patch.object(vllm_bench, "MODEL", vllm_bench.MODEL):
+                vllm_bench.main(["load", "-c", "1", "-n", "3", "--workload", str(path),
+                                 "--host", "127.0.0.1", "--port", str(self.server.server_port),
+                                 "--model", "other/model"])
+
+        prompts = [body["messages"][0]["content"] for body in self.server.bodies]
+        self.assertEqual(prompts, ["alpha", "beta", "alpha"])
+        self.assertEqual({body["model"] for body in self.server.bodies}, {"other/model"})
+
+
+def sample(t, *, waiting=0, preemptions=0, generated=0):
+    return {"t": t, "running": 1, "waiting": waiting, "kv_usage": 0.2,
+            "preemptions": preemptions, "generation_tokens": generated, "prompt_tokens": 0}
+
+
+class ServerMetricsTests(StubServerTestCase):
+    handler = BusyServerHandler
+
+    def test_sampler_collects_gauges_and_counters(self):
+        sampler = vllm_bench.MetricsSampler(0.05).start()
+        vllm_bench.stream_request("hello", 16)
+        sampler.stop()
+
+        self.assertGreaterEqual(len(sampler.samples), 2)
+        self.assertEqual(sampler.samples[-1]["waiting"], 3)
+        self.assertEqual(sampler.samples[-1]["kv_usage"], 0.5)
+        self.assertEqual(sampler.samples[-1]["preemptions"], 2)
+        self.assertEqual(sampler.samples[-1]["prompt_tokens"], None)
+
+    def test_ttft_is_attributed_to_preemption_then_queueing_then_prefill(self):
+        samples = [sample(0.0), sample(1.0, waiting=2), sample(2.0), sample(3.0, preemptions=1),
+                   sample(4.0, preemptions=1)]
+
+        def cause(sent_at, ttft_ms):
+            return vllm_bench.attribute_ttft({"sent_at": sent_at, "ttft_ms": ttft_ms}, samples)
+
+        self.assertEqual(cause(0.5, 200), "queueing")
+        self.assertEqual(cause(2.5, 200), "preemption")
+        self.assertEqual(cause(3.5, 200), "prefill")
+        self.assertIsNone(cause(5.0, 200))
+
+    def test_step_summary_reports_peaks_and_server_throughput(self):
+        samples = [sample(0.0), sample(1.0, waiting=5, generated=50), sample(2.0, generated=200)]
+        requests = [{"sent_at": 0.1, "ttft_ms": 1500, "total_s": 1.8},
+                    {"sent_at": 0.2, "ttft_ms": 100, "total_s": 0.5}]
+
+        server = vllm_bench.server_step_summary(requests, samples)
+
+        self.assertEqual(server["waiting_max"], 5)
+        self.assertEqual(server["server_gen_tok_per_s"], 100.0)
+        self.assertEqual(server["ttft_causes"], {"queueing": 2, "preemption": 0, "prefill": 0})
+        self.assertEqual(requests[0]["ttft_cause"], "queueing")
+
+
+class SingleSlotHandler(StubHandler):
+    """Serves one stream at a time, so TTFT grows with queue depth like a saturated server."""
+
+    delay = 0.02
+    slot = threading.Lock()
+
+    def do_POST(self):
+        with self.slot:
+            super().do_POST()
+
+
+class SloSearchTests(unittest.TestCase):
+    def search(self, limit, low, high, **kwargs):
+        probed = []
+
+        def probe(load):
+            probed.append(load)
+            return load <= limit
+
+        return vllm_bench.search_max_load(probe, low, high, **kwargs), probed
+
+    def test_concurrency_doubles_then_bisects_to_adjacent_levels(self):
+        best, probed = self.search(13, 1, 256, integer=True)
+
+        self.assertEqual(best, 13)
+        self.assertEqual(probed, [1, 2, 4, 8, 16, 12, 14, 13])
+
+    def test_rate_stops_within_tolerance(self):
+        best, _ = self.search(3.3, 0.25, 64, integer=False, tolerance=0.05)
+
+        self.assertLessEqual(best, 3.3)
+        self.assertGreater(best, 3.3 * 0.95)
+
+    def test_reports_ceiling_and_total_miss(self):
+        self.assertEqual(self.search(100, 1, 32, integer=True)[0], 32)
+        self.assertEqual(self.search(0, 1, 32, integer=True), (None, [1]))
+
+    def test_evaluate_slo_lists_violations_and_goodput(self):
+        results = [
+            {"ttft_ms": float(ttft), "tpot_ms": 20.0,
+             "timeline": array("d", [0.0, 0.02]), "timeline_phase": array("b", [1, 1])}
+            for ttft in (100, 200, 300, 3000)
+        ]
+
+        slo = vllm_bench.evaluate_slo(results, 0, 2.0, ttft_ms=2000, itl_ms=100, pct=99,
+                                      max_error_rate=0)
+        relaxed = vllm_bench.evaluate_slo(results, 1, 2.0, ttft_ms=2000, itl_ms=None, pct=50,
+                                          max_error_rate=0.25)
+
+        self.assertFalse(slo["passed"])
+        self.assertEqual(len(slo["violations"]), 1)
+        self.assertIn("TTFT p99", slo["violations"][0])
+        self.assertEqual(slo["itl_ms"], 20.0)
+        self.assertEqual((slo["attainment"], slo["goodput_req_per_s"]), (0.75, 1.5))
+        self.assertTrue(relaxed["passed"])
+        self.assertEqual(relaxed["error_rate"], 0.2)
+
+
+class SloSearchServerTests(StubServerTestCase):
+    handler = SingleSlotHandler
+
+    def test_finds_concurrency_before_queueing_breaks_ttft(self):
+        with redirect_stdout(io.StringIO()) as out:
+            steps = vllm_bench.run_slo_search("concurrency", 1, 8, 4, ttft_ms=80, itl_ms=None)
+
+        self.assertEqual([step["label"] for step in steps], ["concurrency=1", "concurrency=2"])
+        self.assertEqual([step["summary"]["slo"]["passed"] for step in steps], [True, False])
+        self.assertIn("Max concurrency within SLO: 1", out.getvalue())
+
+    def test_rate_probes_run_for_at_least_min_seconds(self):
+        with redirect_stdout(io.StringIO()):
+            steps = vllm_bench.run_slo_search("rate", 20, 20, 2, ttft_ms=60_000, itl_ms=None,
+                                              arrival="fixed", min_seconds=0.3)
+
+        self.assertEqual(steps[0]["summary"]["requests"], 6)
+        self.assertEqual(len(self.server.bodies), 6)
+
+
+class LatencyHistogramTests(unittest.TestCase):
+    def test_percentiles_stay_within_precision(self):
+        rng = random.Random(3)
+        values = [rng.lognormvariate(4, 1) for _ in range(5000)]
+        hist = vllm_bench.LatencyHistogram(precision=0.01)
+        for value in values:
+            hist.record(value)
+
+        for pct in (50, 90, 99):
+            exact = sorted(values)[math.ceil(pct / 100 * len(values)) - 1]
+            self.assertAlmostEqual(hist.percentile(pct), exact, delta=exact * 0.011)
+        self.assertEqual((hist.min, hist.max), (min(values), max(values)))
+        self.assertLess(len(hist.counts), 800)
+
+    def test_merged_shards_equal_one_histogram_after_json_round_trip(self):
+        values = [0.0, 1.5, 3.0, 12.0, 80.0, 80.5, 900.0]
+        whole = vllm_bench.LatencyHistogram()
+        halves = [vllm_bench.LatencyHistogram(), vllm_bench.LatencyHistogram()]
+        for index, value in enumerate(values):
+            whole.record(value)
+            halves[index % 2].record(value)
+
+        merged = vllm_bench.LatencyHistogram()
+        for half in halves:
+            merged.merge(vllm_bench.LatencyHistogram.from_dict(json.loads(json.dumps(half.to_dict()))))
+
+        self.assertEqual(merged.to_dict(), whole.to_dict())
+        self.assertEqual(merged.percentile(10), 0.0)
+        with self.assertRaises(ValueError):
+            merged.merge(vllm_bench.LatencyHistogram(precision=0.1))
+
+    def test_requests_split_in_proportion_to_shares(self):
+        self.assertEqual(vllm_bench._proportional(10, [3, 2]), [6, 4])
+        self.assertEqual(vllm_bench._proportional(7, [1, 1, 1]), [2, 3, 2])
+
+
+class ShardedLoadTests(StubServerTestCase):
+    def setUp(self):
+        super().setUp()
+        listener = socket.create_server(("127.0.0.1", 0))
+        self.addCleanup(listener.close)
+        threading.Thread(target=vllm_bench.serve_workers, args=(listener, "s3cret"),
+                         daemon=True).start()
+        self.worker_address = listener.getsockname()[:2]
+        self.shards = vllm_bench.open_shards(2, [self.worker_address], "s3cret")
+        self.addCleanup(vllm_bench.close_shards, self.shards)
+
+    def test_worker_rejects_a_coordinator_without_the_token(self):
+        with redirect_stderr(io.StringIO()), self.assertRaisesRegex(RuntimeError, "bad token"):
+            vllm_bench.remote_shard(self.worker_address, "guess")
+
+    def test_load_sweep_merges_local_and_remote_shards(self):
+        with redirect_stdout(io.StringIO()) as out:
+            steps = vllm_bench.run_load_sweep([2, 5], 9, shards=self.shards)
+
+        first, second = (step["summary"] for step in steps)
+        self.assertEqual((first["shards"], second["shards"]), (2, 3))
+        self.assertEqual([s["requests"] for s in (first, second)], [9, 9])
+        self.assertEqual(len(self.server.bodies), 18)
+        self.assertEqual(steps[1]["histograms"]["ttft_ms"]["count"], 9)
+        self.assertEqual(steps[1]["requests"], [])
+        self.assertIsNotNone(second["ttft_p99_ms"])
+        self.assertIn("sharded across 3 client processes", out.getvalue())
+
+    def test_rate_sweep_reports_open_loop_summary(self):
+        with redirect_stdout(io.StringIO()):
+            steps = vllm_bench.run_rate_sweep([30], 6, "fixed", None, shards=self.shards)
+
+        summary = steps[0]["summary"]
+        self.assertEqual((summary["requests"], summary["errors"]), (6, 0))
+        self.assertGreater(summary["achieved_qps"], 0)
+        self.assertGreaterEqual(summary["e2e_p99_ms"], summary["wait_p50_ms"])
+
+    def test_rate_sweep_with_fewer_requests_than_shards(self):
+        with redirect_stdout(io.StringIO()):
+            steps = vllm_bench.run_rate_sweep([30], 2, "fixed", None, shards=self.shards)
+
+        summary = steps[0]["summary"]
+        self.assertEqual((summary["requests"], summary["errors"], summary["shards"]), (2, 0, 2))
+        self.assertEqual(len(self.server.bodies), 2)
+
+
+class LongContextHandler(StubHandler):
+    """16k-context server whose prefill slows 5x past 5000 tokens and refuses what won't fit."""
+
+    delay = 0.01
+
+    def do_GET(self):
+        if self.path == "/v1/models":
+            self.send_json({"data": [{"id": "other-model", "max_model_len": 16384}]})
+        else:
+            super().do_GET()
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers["Content-Length"]))
+        prompt = json.loads(raw)["messages"][0]["content"]
+        tokens = round(len(prompt.split()) * vllm_bench.TOKENS_PER_WORD)
+        if tokens > 16384:
+            payload = json.dumps({"message": "maximum context length is 16384 tokens"}).encode()
+            self.send_response(400)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        time.sleep(tokens / (100_000 if tokens <= 5000 else 20_000))
+        self.usage = {"prompt_tokens": tokens, "completion_tokens": 6}
+        self.rfile = io.BytesIO(raw)
+        super().do_POST()
+
+
+class LongContextTests(StubServerTestCase):
+    handler = LongContextHandler
+
+    def test_lengths_grow_geometrically_and_end_near_the_limit(self):
+        self.assertEqual(vllm_bench.context_lengths(1024, 8192, 128, exact=True),
+                         [1024, 2048, 4096, 8000])
+        self.assertEqual(vllm_bench.context_lengths(1000, 4096, 100, factor=4), [1000, 3538])
+        self.assertEqual(vllm_bench.context_lengths(8000, 4096, 100), [])
+
+    def test_sweep_flags_prefill_cliff_and_reports_decode_drop(self):
+        with redirect_stdout(io.StringIO()) as out:
+            steps = vllm_bench.run_long_context(1250, None, 2.0, [1], 1, 16, 0.3, seed=1)
+
+        summaries = [step["summary"] for step in steps]
+        self.assertEqual([s["input_tokens"] for s in summaries], [1250, 2500, 5000, 10000, 14673])
+        self.assertEqual(sum(s["failed"] for s in summaries), 0)
+        prefill_cliffs = [s["input_tokens"] for s in summaries
+                          if any(cliff.startswith("prefill") for cliff in s["cliffs"])]
+        self.assertEqual(prefill_cliffs, [10000])
+        self.assertGreater(summaries[2]["prefill_tok_per_s"], 40_000)
+        drops = [s["decode_drop_pct"] for s in summaries if s["decode_drop_pct"] is not None]
+        self.assertEqual(drops[0], 0.0)
+        self.assertIn("Cliff at 10,000 tok", out.getvalue())
+
+    def test_refused_prompts_are_counted_not_timed(self):
+        with redirect_stdout(io.StringIO()):
+            steps = vllm_bench.run_long_context(20_000, 40_000, 2.0, [1], 2, 16, 0.3, seed=1)
+
+        summary = steps[0]["summary"]
+        self.assertEqual((summary["requests"], summary["failed"]), (0, 2))
+        self.assertIsNone(summary["ttft_p50_ms"])
+        self.assertEqual(summary["cliffs"], ["2 failed"])
+
+    def test_error_response_raises_and_leaves_connection_reusable(self):
+        prompt = " ".join(["word"] * 20_000)
+
+        with self.assertRaisesRegex(http.client.HTTPException, "HTTP 400: .*maximum context"):
+            vllm_bench.stream_request(prompt, 16)
+        result = vllm_bench.stream_request("short prompt", 16)
+
+        self.assertEqual(result["total_tokens"], 6)
+        self.assertIsNone(result["connect_ms"])
+
+
+class CliTests(unittest.TestCase):
+    def test_defaults_to_sequential_run(self):
+        self.assertEqual(vllm_bench.parse_args([]).command, "run")
+
+    def test_load_parses_concurrency_levels(self):
+        args = vllm_bench.parse_args(["load", "-c", "1,8,32", "-n", "10"])
+
+        self.assertEqual(args.concurrency, [1, 8, 32])
+        self.assertEqual(args.requests, 10)
+
+    def test_rate_parses_qps_sweep(self):
+        args = vllm_bench.parse_args(["rate", "-q", "0.5,2", "--arrival", "fixed"])
+
+        self.assertEqual(args.qps, [0.5, 2.0])
+        self.assertEqual(args.arrival, "fixed")
+
+    def test_sharding_options_parse_addresses(self):
+        args = vllm_bench.parse_args(["load", "--processes", "4", "--workers", "c1:9100,c2:9100",
+                                      "--worker-token", "t", "--host", "gpu1"])
+        worker = vllm_bench.parse_args(["worker", "--listen", "9100", "--token", "t"])
+
+        self.assertEqual(args.processes, 4)
+        self.assertEqual(args.workers, [("c1", 9100), ("c2", 9100)])
+        self.assertEqual(worker.listen, ("127.0.0.1", 9100))
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            vllm_bench.parse_args(["load", "--workers", "c1", "--worker-token", "t", "--host", "gpu1"])
+
+    def test_remote_workers_need_a_host_they_can_reach(self):
+        for host in ("localhost", "127.0.0.1", "::1", "0.0.0.0"):
+            with redirect_stderr(io.StringIO()) as err, self.assertRaises(SystemExit):
+                vllm_bench.parse_args(["rate", "--workers", "c1:9100", "--worker-token", "t",
+                                       "--host", host])
+            self.assertIn("its own machine", err.getvalue())
+        args = vllm_bench.parse_args(["rate", "--processes", "2", "--host", "localhost"])
+        self.assertEqual(args.host, "localhost")
+
+    def test_remote_sharding_requires_a_shared_token(self):
+        with patch.dict(os.environ, {vllm_bench.TOKEN_ENV: ""}):
+            for argv in (["worker", "--listen", "9100"], ["load", "--workers", "c1:9100", "--host", "gpu1"]):
+                with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+                    vllm_bench.parse_args(argv)
+
+    def test_request_count_must_be_positive(self):
+        for argv in (["load"], ["rate"], ["slo", "--ttft-ms", "500"]):
+            with redirect_stderr(io.StringIO()) as err, self.assertRaises(SystemExit):
+                vllm_bench.parse_args(argv + ["-n", "0"])
+            self.assertIn("--requests must be at least 1", err.getvalue())
+
+    def test_slo_fills_mode_specific_bounds_and_requires_a_limit(self):
+        args = vllm_bench.parse_args(["slo", "--by", "rate", "--ttft-ms", "2000"])
+
+        self.assertEqual((args.low, args.high), (0.25, 64))
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            vllm_bench.parse_args(["slo", "--by", "rate"])
+
+
+if __name__ == "__main__":
+    unittest.main()
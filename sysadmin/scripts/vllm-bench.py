@@ -4,12 +4,67 @@
 Measures TTFT, reasoning speed, output speed, and total throughput.
 Reasoning models spend tokens on chain-of-thought before producing visible output,
 so we track both phases separately.
+
+Usage:
+    vllm-bench.py [run]                         # sequential single-stream tests
+    vllm-bench.py load -c 1,4,16 -n 64          # closed-loop concurrency sweep
+    vllm-bench.py rate -q 0.5,1,2 -n 64         # open-loop Poisson arrivals at target QPS
+    vllm-bench.py parser-bench                  # client-side SSE parsing cost per token
+    vllm-bench.py load --save runs/new.json     # persist run metadata + per-request metrics
+    vllm-bench.py compare runs/old.json runs/new.json --threshold 5
+    vllm-bench.py load --workload prefill-heavy.yaml --host gpu1 --model Qwen/Qwen3-8B
+    vllm-bench.py prefix-cache --prefix-tokens 4000 # cold vs warm shared-prefix TTFT
+    vllm-bench.py slo --ttft-ms 2000 --itl-ms 100   # max concurrency meeting p99 SLOs
+    vllm-bench.py slo --by rate --ttft-ms 2000      # ...or max request rate (open loop)
+    vllm-bench.py long-context -c 1,8               # TTFT/prefill/decode vs input length
+    vllm-bench.py load -c 64,256 --processes 8      # shard the load across client processes
+    vllm-bench.py worker --listen 0.0.0.0:9100      # on other client hosts (token in
+    vllm-bench.py load --workers c1:9100,c2:9100 --host gpu1
+                                                    #   $VLLM_BENCH_TOKEN), then shard to them
+
+See load_workload() for the workload file format (YAML, JSON or a JSONL dataset).
+
+Every mode accepts --timeline-out FILE to dump per-delta timestamps as JSONL for plotting.
+A background sampler polls the server's /metrics (--metrics-interval, 0 disables)
+and attributes each request's TTFT to queueing, preemption or prefill; --metrics-out
+writes the samples as JSONL on the same perf_counter clock as the timelines' sent_at.
+load and rate can shard each level across client processes (--processes) and worker
+hosts (--workers); shards reply with mergeable latency histograms instead of per-request
+results, so saved sharded runs carry "histograms" per step rather than "requests"
+(compare gates them on the threshold alone, as they cannot be tested for significance).
+Connections are pooled with keep-alive; TTFT is measured from request send, and
+--show-connect reports TCP connect time separately (--no-keepalive to disable reuse).
 """
 
+import argparse
+import contextlib
+import functools
+import hmac
+import ipaddress
 import http.client
+import itertools
 import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import threading
 import time
 import sys
+from array import array
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, TextIO
+
+try:
+    # Optional: orjson decodes SSE payloads several times faster than json.
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 HOST = "localhost"
 PORT = 8000
@@ -29,6 +84,338 @@ TESTS = [
                               "\n\nBe concise.", 2000),
 ]
 
+# Reuse keep-alive connections across requests (disable with --no-keepalive).
+KEEPALIVE = True
+
+
+class ConnectionPool:
+    """Thread-safe pool of keep-alive HTTP connections to one server.
+
+    Idle connections are handed out LIFO so the warmest socket is reused and
+    at most one connection per in-flight request is ever opened.
+    """
+
+    def __init__(self, host: str, port: int, keepalive: bool = True):
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self._idle: list[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def acquire(self, timeout: float,
+                fresh: bool = False) -> tuple[http.client.HTTPConnection, float | None]:
+        """Return (connection, connect seconds); connect time is None for a reused socket."""
+        conn = None
+        if not fresh:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+        if conn is not None:
+            conn.sock.settimeout(timeout)
+            return conn, None
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        start = time.perf_counter()
+        conn.connect()
+        connect_s = time.perf_counter() - start
+        with self._lock:
+            self.opened += 1
+        return conn, connect_s
+
+    def release(self, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse) -> None:
+        """Return a fully-read connection to the pool, or close it if it can't be reused."""
+        if not self.keepalive or resp.will_close or conn.sock is None:
+            conn.close()
+            return
+        with self._lock:
+            self._idle.append(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Shared pool for the current HOST/PORT, rebuilt if either changes."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or (_pool.host, _pool.port, _pool.keepalive) != (HOST, PORT, KEEPALIVE):
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(HOST, PORT, KEEPALIVE)
+        return _pool
+
+
+def _send(conn: http.client.HTTPConnection, body: str | None, method: str = "POST",
+          path: str = "/v1/chat/completions") -> tuple[http.client.HTTPResponse, float]:
+    sent = time.perf_counter()
+    try:
+        conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        return conn.getresponse(), sent
+    except BaseException:
+        conn.close()
+        raise
+
+
+def post_json(body: str, timeout: float) -> tuple[http.client.HTTPConnection, http.client.HTTPResponse,
+                                                   float | None, float]:
+    """POST a chat completion over a pooled connection.
+
+    Returns (connection, response, connect seconds or None if reused, send time).
+    """
+    pool = get_pool()
+    conn, connect_s = pool.acquire(timeout)
+    try:
+        resp, sent = _send(conn, body)
+        return conn, resp, connect_s, sent
+    except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+        if connect_s is not None:
+            raise
+    # The server dropped an idle keep-alive socket; retry once on a new one.
+    conn, connect_s = pool.acquire(timeout, fresh=True)
+    resp, sent = _send(conn, body)
+    return conn, resp, connect_s, sent
+
+
+def get_bytes(path: str, timeout: float = 10, pool: ConnectionPool | None = None) -> bytes | None:
+    """GET a server endpoint; None if it is missing or unreachable.
+
+    Uses a fresh socket from the shared pool unless a dedicated `pool` is given
+    (the metrics sampler keeps one keep-alive connection of its own).
+    """
+    fresh = pool is None
+    pool = pool or get_pool()
+    try:
+        conn, _ = pool.acquire(timeout, fresh=fresh)
+        resp, _ = _send(conn, None, method="GET", path=path)
+        raw = resp.read()
+    except (OSError, http.client.HTTPException):
+        return None
+    pool.release(conn, resp)
+    return raw if resp.status == 200 else None
+
+
+def get_json(path: str, timeout: float = 10) -> dict | None:
+    raw = get_bytes(path, timeout)
+    try:
+        return json.loads(raw) if raw is not None else None
+    except ValueError:
+        return None
+
+
+def parse_prometheus(text: str) -> dict[str, float]:
+    """Prometheus text exposition -> {metric name: value summed over label sets}."""
+    metrics: dict[str, float] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        if "{" in line:
+            name = line[:line.index("{")]
+            fields = line[line.rindex("}") + 1:].split()
+        else:
+            name, *fields = line.split()
+        try:
+            metrics[name] = metrics.get(name, 0.0) + float(fields[0])
+        except (IndexError, ValueError):
+            continue
+    return metrics
+
+
+def scrape_metrics(timeout: float = 5, pool: ConnectionPool | None = None) -> dict[str, float] | None:
+    raw = get_bytes("/metrics", timeout, pool)
+    return parse_prometheus(raw.decode("utf-8", errors="replace")) if raw is not None else None
+
+
+PHASE_REASONING = 0
+PHASE_OUTPUT = 1
+
+
+def _interpolate(ordered: Sequence[float], pct: float) -> float:
+    rank = (len(ordered) - 1) * pct / 100
+    lo = int(rank)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+
+
+def percentile(values: Sequence[float], pct: float) -> float | None:
+    """Linear-interpolated percentile (pct in 0..100); None for no samples."""
+    if not values:
+        return None
+    return _interpolate(sorted(values), pct)
+
+
+def latency_stats(seconds: Sequence[float]) -> dict | None:
+    """p50/p90/p99/max in milliseconds for a set of gaps measured in seconds."""
+    if not seconds:
+        return None
+    ordered = sorted(seconds)
+    stats = {f"p{pct}": round(_interpolate(ordered, pct) * 1000, 2) for pct in (50, 90, 99)}
+    stats["max"] = round(ordered[-1] * 1000, 2)
+    return stats
+
+
+def itl_gaps(timeline: Sequence[float], phases: Sequence[int]) -> tuple[array, array]:
+    """Split inter-token gaps by the phase of the delta that closed each gap."""
+    reasoning = array("d")
+    output = array("d")
+    for i in range(1, len(timeline)):
+        gap = timeline[i] - timeline[i - 1]
+        (output if phases[i] == PHASE_OUTPUT else reasoning).append(gap)
+    return reasoning, output
+
+
+def write_timelines(out: TextIO, label: str, results: Sequence[dict]) -> None:
+    """Append one JSON line per request with its raw per-delta timeline."""
+    for index, r in enumerate(results):
+        record = {
+            "label": label,
+            "index": index,
+            "sent_s": r.get("sent_s"),
+            "sent_at": r.get("sent_at"),
+            "t": [round(t, 6) for t in r["timeline"]],
+            "phase": list(r["timeline_phase"]),
+        }
+        out.write(json.dumps(record) + "\n")
+
+
+@functools.lru_cache(maxsize=None)
+def load_tokenizer(model: str):
+    """Tokenizer for `model` from the local HF cache, or None if unavailable.
+
+    Optional: needs `huggingface_hub` and `tokenizers`, and never hits the network.
+    """
+    try:
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+    except ImportError:
+        return None
+    try:
+        return Tokenizer.from_file(hf_hub_download(model, "tokenizer.json", local_files_only=True))
+    except (OSError, ValueError):
+        return None
+
+
+def count_tokens(text: str) -> int | None:
+    tokenizer = load_tokenizer(MODEL)
+    if tokenizer is None:
+        return None
+    return len(tokenizer.encode(text, add_special_tokens=False).ids) if text else 0
+
+
+def reconcile_tokens(reasoning_chunks: int, output_chunks: int, reasoning_text: str,
+                     output_text: str, usage: dict | None) -> tuple[int, int, str]:
+    """True (reasoning, output) token counts and where they came from.
+
+    SSE chunks can carry several tokens (speculative decoding, stream intervals),
+    so chunk counts are only the last resort. Preference order: the server's
+    usage block, a locally cached tokenizer, then chunk counts.
+    """
+    if usage and usage.get("completion_tokens") is not None:
+        completion = usage["completion_tokens"]
+        details = usage.get("completion_tokens_details") or {}
+        if details.get("reasoning_tokens") is not None:
+            reasoning = details["reasoning_tokens"]
+        elif not reasoning_chunks or not output_chunks:
+            reasoning = completion if reasoning_chunks else 0
+        else:
+            # Split the server total in proportion to the best per-phase estimate.
+            r_est = count_tokens(reasoning_text) or reasoning_chunks
+            o_est = count_tokens(output_text) or output_chunks
+            reasoning = round(completion * r_est / (r_est + o_est))
+        return reasoning, completion - reasoning, "usage"
+
+    r_count = count_tokens(reasoning_text)
+    o_count = count_tokens(output_text)
+    if r_count is not None and o_count is not None:
+        return r_count, o_count, "tokenizer"
+    return reasoning_chunks, output_chunks, "chunks"
+
+
+class SSEParser:
+    """Incremental bytes-level parser yielding the payload of each `data:` line.
+
+    Complete lines are sliced straight out of a bytearray; only the unfinished
+    tail is kept, and it is never rescanned for newlines on the next feed.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._scanned = 0
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        buf = self._buf
+        buf += chunk
+        payloads = []
+        line_start = 0
+        newline = buf.find(b"\n", self._scanned)
+        while newline >= 0:
+            # Cheap prefix check: skip comments, ids and blank separators undecoded.
+            if buf.startswith(b"data:", line_start):
+                payload = bytes(buf[line_start + 5:newline]).strip()
+                if payload and payload != b"[DONE]":
+                    payloads.append(payload)
+            line_start = newline + 1
+            newline = buf.find(b"\n", line_start)
+        del buf[:line_start]
+        self._scanned = len(buf)
+        return payloads
+
+
+class StreamState:
+    """Per-request accumulator for decoded chat-completion chunks."""
+
+    def __init__(self, start: float):
+        self.start = start
+        self.reasoning_chunks = 0
+        self.output_chunks = 0
+        self.usage = None
+        self.first_any_time = None       # first token of any kind
+        self.first_output_time = None    # first visible content token
+        self.reasoning_parts = []
+        self.output_parts = []
+        # One entry per SSE delta: seconds since start and which phase it belonged to.
+        self.timeline = array("d")
+        self.timeline_phase = array("b")
+
+    def add(self, payload: bytes, now: float) -> None:
+        if payload[:1] != b"{":
+            return
+        try:
+            obj = json_loads(payload)
+            if obj.get("usage"):
+                self.usage = obj["usage"]
+            if not obj.get("choices"):
+                return
+            delta = obj["choices"][0].get("delta", {})
+        except (ValueError, KeyError, IndexError, AttributeError):
+            return
+
+        reasoning = delta.get("reasoning_content") or delta.get("reasoning") or ""
+        content = delta.get("content") or ""
+        if not (reasoning or content):
+            return
+        if self.first_any_time is None:
+            self.first_any_time = now
+        self.timeline.append(now - self.start)
+        self.timeline_phase.append(PHASE_OUTPUT if content else PHASE_REASONING)
+
+        # Reasoning tokens
+        if reasoning:
+            self.reasoning_chunks += 1
+            self.reasoning_parts.append(reasoning)
+
+        # Visible output tokens
+        if content:
+            if self.first_output_time is None:
+                self.first_output_time = now
+            self.output_chunks += 1
+            self.output_parts.append(content)
+
 
 def stream_request(prompt: str, max_tokens: int) -> dict:
     """Stream a chat completion, tracking reasoning and output phases."""
@@ -37,63 +424,39 @@ def stream_request(prompt: str, max_tokens: int) -> dict:
         "messages": [{"role": "user", "content": prompt}],
         "max_tokens": max_tokens,
         "stream": True,
+        "stream_options": {"include_usage": True},
         "temperature": 0.7,
     })
 
-    conn = http.client.HTTPConnection(HOST, PORT, timeout=300)
-    conn.request("POST", "/v1/chat/completions", body=body,
-                 headers={"Content-Type": "application/json"})
-    resp = conn.getresponse()
-
-    reasoning_tokens = 0
-    output_tokens = 0
-    first_any_time = None       # first token of any kind
-    first_output_time = None    # first visible content token
-    reasoning_parts = []
-    output_parts = []
-    start = time.perf_counter()
-
-    remainder = ""
+    conn, resp, connect_s, start = post_json(body, timeout=300)
+    if resp.status != 200:
+        # e.g. 400 for a prompt longer than the context; read it so the connection is reusable.
+        detail = resp.read()
+        get_pool().release(conn, resp)
+        raise http.client.HTTPException(f"HTTP {resp.status}: {detail[:200].decode(errors='replace')}")
+    parser = SSEParser()
+    stream = StreamState(start)
     while True:
-        chunk = resp.read(8192)
+        try:
+            chunk = resp.read1(65536)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            raise
         if not chunk:
             break
-        remainder += chunk.decode("utf-8", errors="replace")
-        lines = remainder.split("\n")
-        remainder = lines[-1]
-        for line in lines[:-1]:
-            line = line.strip()
-            if not line.startswith("data: "):
-                continue
-            payload = line[6:]
-            if payload == "[DONE]":
-                continue
-            try:
-                obj = json.loads(payload)
-                delta = obj["choices"][0].get("delta", {})
-
-                # Reasoning tokens
-                reasoning = delta.get("reasoning_content") or delta.get("reasoning") or ""
-                if reasoning:
-                    if first_any_time is None:
-                        first_any_time = time.perf_counter()
-                    reasoning_tokens += 1
-                    reasoning_parts.append(reasoning)
-
-                # Visible output tokens
-                content = delta.get("content") or ""
-                if content:
-                    if first_any_time is None:
-                        first_any_time = time.perf_counter()
-                    if first_output_time is None:
-                        first_output_time = time.perf_counter()
-                    output_tokens += 1
-                    output_parts.append(content)
-            except (json.JSONDecodeError, KeyError, IndexError):
-                pass
+        for payload in parser.feed(chunk):
+            stream.add(payload, time.perf_counter())
 
     end = time.perf_counter()
-    conn.close()
+    get_pool().release(conn, resp)
+
+    usage = stream.usage
+    first_any_time = stream.first_any_time
+    first_output_time = stream.first_output_time
+    reasoning_chunks = stream.reasoning_chunks
+    output_chunks = stream.output_chunks
+    timeline = stream.timeline
+    timeline_phase = stream.timeline_phase
 
     total = end - start
     ttft = (first_any_time - start) if first_any_time else total
@@ -101,17 +464,30 @@ def stream_request(prompt: str, max_tokens: int) -> dict:
     reasoning_time = (first_output_time - first_any_time) if (first_any_time and first_output_time) else None
     output_time = (end - first_output_time) if first_output_time else None
 
+    reasoning_text = "".join(stream.reasoning_parts)
+    output_text = "".join(stream.output_parts)
+    reasoning_tokens, output_tokens, token_source = reconcile_tokens(
+        reasoning_chunks, output_chunks, reasoning_text, output_text, usage)
     total_tokens = reasoning_tokens + output_tokens
     total_decode = total - ttft
+    tpot = total_decode / (total_tokens - 1) if total_tokens > 1 else None
     overall_tps = total_tokens / total_decode if total_decode > 0.001 else 0
     output_tps = output_tokens / output_time if (output_time and output_time > 0.001) else 0
     reasoning_tps = reasoning_tokens / reasoning_time if (reasoning_time and reasoning_time > 0.001) else 0
+    reasoning_gaps, output_gaps = itl_gaps(timeline, timeline_phase)
 
     return {
         "prompt_chars": len(prompt),
+        "sent_at": start,  # perf_counter clock, shared with MetricsSampler samples
+        "connect_ms": round(connect_s * 1000, 2) if connect_s is not None else None,
         "reasoning_tokens": reasoning_tokens,
         "output_tokens": output_tokens,
         "total_tokens": total_tokens,
+        "prompt_tokens": usage.get("prompt_tokens") if usage else None,
+        # Only reported when vLLM runs with --enable-prompt-tokens-details.
+        "cached_tokens": ((usage or {}).get("prompt_tokens_details") or {}).get("cached_tokens"),
+        "chunk_count": reasoning_chunks + output_chunks,
+        "token_source": token_source,
         "ttft_ms": round(ttft * 1000, 1),
         "time_to_output_ms": round(time_to_output * 1000, 1) if time_to_output else None,
         "reasoning_time_s": round(reasoning_time, 2) if reasoning_time else None,
@@ -120,8 +496,13 @@ def stream_request(prompt: str, max_tokens: int) -> dict:
         "reasoning_tps": round(reasoning_tps, 1),
         "output_tps": round(output_tps, 1),
         "overall_tps": round(overall_tps, 1),
-        "reasoning_preview": "".join(reasoning_parts)[:80],
-        "output_preview": "".join(output_parts)[:120],
+        "tpot_ms": round(tpot * 1000, 2) if tpot is not None else None,
+        "reasoning_itl_ms": latency_stats(reasoning_gaps),
+        "output_itl_ms": latency_stats(output_gaps),
+        "timeline": timeline,
+        "timeline_phase": timeline_phase,
+        "reasoning_preview": reasoning_text[:80],
+        "output_preview": output_text[:120],
     }
 
 
@@ -135,14 +516,15 @@ def non_streaming_request(prompt: str, max_tokens: int) -> dict:
         "temperature": 0,
     })
 
-    conn = http.client.HTTPConnection(HOST, PORT, timeout=120)
-    start = time.perf_counter()
-    conn.request("POST", "/v1/chat/completions", body=body,
-                 headers={"Content-Type": "application/json"})
-    resp = conn.getresponse()
-    data = json.loads(resp.read())
+    conn, resp, connect_s, start = post_json(body, timeout=120)
+    try:
+        raw = resp.read()
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        raise
     end = time.perf_counter()
-    conn.close()
+    get_pool().release(conn, resp)
+    data = json.loads(raw)
 
     usage = data.get("usage", {})
     msg = data["choices"][0]["message"]
@@ -151,6 +533,7 @@ def non_streaming_request(prompt: str, max_tokens: int) -> dict:
 
     return {
         "total_s": round(end - start, 2),
+        "connect_ms": round(connect_s * 1000, 2) if connect_s is not None else None,
         "prompt_tok": usage.get("prompt_tokens"),
         "completion_tok": usage.get("completion_tokens"),
         "reasoning": reasoning,
@@ -159,7 +542,211 @@ def non_streaming_request(prompt: str, max_tokens: int) -> dict:
     }
 
 
-def main():
+# Filler vocabulary for synthetic prompts; shuffled per prompt so no two share a prefix.
+FILLER_WORDS = (
+    "system latency request server cache memory token batch model queue kernel "
+    "network storage replica shard index vector context window stream buffer "
+    "scheduler thread process cluster node region failover consensus quorum "
+    "throughput bandwidth packet socket protocol gateway router balancer proxy "
+    "database table column schema query planner optimizer transaction commit "
+    "journal snapshot backup restore metric alert dashboard trace span log"
+).split()
+TOKENS_PER_WORD = 1.3  # rough BPE average for the filler words without a tokenizer
+
+
+def sample_length(spec, rng: random.Random) -> int:
+    """Draw a token count from an int or {dist: fixed|uniform|normal|lognormal, ...}."""
+    if isinstance(spec, int):
+        return spec
+    dist = spec.get("dist", "fixed")
+    if dist == "fixed":
+        value = spec["value"]
+    elif dist == "uniform":
+        value = rng.randint(spec["min"], spec["max"])
+    elif dist == "normal":
+        value = rng.gauss(spec["mean"], spec["stddev"])
+    elif dist == "lognormal":
+        # Parameterised by the desired mean/stddev of the lengths themselves.
+        mean, stddev = spec["mean"], spec["stddev"]
+        sigma = math.sqrt(math.log(1 + (stddev / mean) ** 2))
+        value = rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+    else:
+        raise ValueError(f"unknown length distribution {dist!r}")
+    return max(1, spec.get("min", 1), min(round(value), spec.get("max", sys.maxsize)))
+
+
+def synthetic_prompt(tokens: int, rng: random.Random) -> str:
+    """Filler text of roughly `tokens` tokens (exact when a local tokenizer is cached)."""
+    words = [rng.choice(FILLER_WORDS) for _ in range(int(tokens / TOKENS_PER_WORD) + 8)]
+    text = "Summarize the following notes:\n\n" + " ".join(words)
+    tokenizer = load_tokenizer(MODEL)
+    if tokenizer is None:
+        return text
+    ids = tokenizer.encode(text, add_special_tokens=False).ids
+    while len(ids) < tokens:
+        # Top up by this tokenizer's measured rate (plus slack) rather than a fixed step,
+        # so even 100k-token prompts take a couple of encodes, not thousands.
+        per_word = max(len(ids) / len(words), 0.1)
+        more = [rng.choice(FILLER_WORDS) for _ in range(int((tokens - len(ids)) / per_word * 1.1) + 8)]
+        words += more
+        text += " " + " ".join(more)
+        ids = tokenizer.encode(text, add_special_tokens=False).ids
+    return tokenizer.decode(ids[:tokens])
+
+
+def _dataset_prompt(record: dict, field: str) -> str | None:
+    value = record.get(field)
+    if isinstance(value, list):
+        # Chat-style records: use the first user turn.
+        for message in value:
+            if message.get("role", message.get("from")) in ("user", "human"):
+                return message.get("content", message.get("value"))
+        return None
+    return value
+
+
+class Workload:
+    """Endless, lazily generated stream of (name, prompt, max_tokens) jobs.
+
+    Jobs are drawn from weighted sources; dataset files are re-read line by
+    line on every pass rather than held in memory.
+    """
+
+    def __init__(self, sources: Sequence[dict], max_tokens=1000, seed: int | None = None,
+                 name: str = "workload"):
+        if not sources:
+            raise ValueError("workload needs at least one source")
+        self.name = name
+        self.rng = random.Random(seed)
+        self.max_tokens = max_tokens
+        self._streams = [self._source_jobs(source) for source in sources]
+        self._weights = [source.get("weight", 1) for source in sources]
+
+    @classmethod
+    def from_tests(cls) -> "Workload":
+        return cls([{"prompts": [{"name": n, "prompt": p, "max_tokens": m} for n, p, m in TESTS]}],
+                   name="builtin")
+
+    def take(self, count: int) -> list[tuple[str, str, int]]:
+        return list(itertools.islice(self, count))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> tuple[str, str, int]:
+        if len(self._streams) == 1:
+            return next(self._streams[0])
+        return next(self.rng.choices(self._streams, self._weights)[0])
+
+    def _source_jobs(self, source: dict):
+        budget = source.get("max_tokens", self.max_tokens)
+        if "prompts" in source:
+            prompts = source["prompts"]
+            for i in itertools.count():
+                item = prompts[i % len(prompts)]
+                yield (item.get("name", f"prompt-{i % len(prompts)}"), item["prompt"],
+                       item.get("max_tokens") or sample_length(budget, self.rng))
+        elif "dataset" in source:
+            yield from self._dataset_jobs(source["dataset"], budget)
+        elif "synthetic" in source:
+            spec = source["synthetic"]
+            while True:
+                tokens = sample_length(spec["input_tokens"], self.rng)
+                yield (f"synthetic-{tokens}tok", synthetic_prompt(tokens, self.rng),
+                       sample_length(budget, self.rng))
+        else:
+            raise ValueError(f"unknown workload source: {sorted(source)}")
+
+    def _dataset_jobs(self, spec: dict, budget):
+        path = Path(spec["path"]).expanduser()
+        field = spec.get("field", "prompt")
+        limit = spec.get("limit")
+        plain_text = path.suffix not in (".jsonl", ".json")
+        while True:
+            produced = 0
+            with path.open(encoding="utf-8") as f:
+                for lineno, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    if plain_text:
+                        prompt, max_tok = line, None
+                    else:
+                        record = json.loads(line)
+                        prompt, max_tok = _dataset_prompt(record, field), record.get("max_tokens")
+                    if not prompt:
+                        continue
+                    yield f"{path.stem}:{lineno}", prompt, max_tok or sample_length(budget, self.rng)
+                    produced += 1
+                    if limit and produced >= limit:
+                        break
+            if not produced:
+                raise ValueError(f"dataset {path} has no usable prompts")
+
+
+def load_workload(path: Path) -> Workload:
+    """Load a workload file.
+
+    A ``.jsonl`` or ``.txt`` file is a dataset: one prompt per line (JSONL records
+    use their "prompt" key and optional "max_tokens"). A ``.yaml``/``.yml`` (needs
+    PyYAML) or ``.json`` file is a spec::
+
+        name: prefill-heavy
+        seed: 7
+        max_tokens: {dist: uniform, min: 64, max: 256}   # default output budget
+        sources:
+          - synthetic: {input_tokens: {dist: lognormal, mean: 4000, stddev: 2000, max: 16000}}
+            weight: 3
+          - dataset: {path: ~/datasets/sharegpt.jsonl, field: conversations, limit: 5000}
+          - prompts:
+              - {name: Haiku, prompt: Write a haiku about the ocean., max_tokens: 1000}
+
+    Lengths are an int or {dist: fixed|uniform|normal|lognormal} with value,
+    min/max or mean/stddev as appropriate.
+    """
+    if path.suffix in (".jsonl", ".txt"):
+        return Workload([{"dataset": {"path": str(path)}}], name=path.stem)
+    if path.suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise SystemExit("YAML workloads need PyYAML; install it or use a .json spec")
+        spec = yaml.safe_load(path.read_text())
+    else:
+        spec = json.loads(path.read_text())
+    return Workload(spec["sources"], spec.get("max_tokens", 1000), spec.get("seed"),
+                    spec.get("name", path.stem))
+
+
+def _fmt_itl(stats: dict | None) -> str:
+    if stats is None:
+        return "-"
+    return (f"p50 {stats['p50']:.1f} / p90 {stats['p90']:.1f} / "
+            f"p99 {stats['p99']:.1f} / max {stats['max']:.1f} ms")
+
+
+def connect_summary(results: Sequence[dict]) -> dict:
+    """How many requests paid for a new TCP connection, and what it cost."""
+    connects = [r["connect_ms"] for r in results if r["connect_ms"] is not None]
+    p50 = percentile(connects, 50)
+    p99 = percentile(connects, 99)
+    return {
+        "new_connections": len(connects),
+        "connect_p50_ms": round(p50, 2) if p50 is not None else None,
+        "connect_p99_ms": round(p99, 2) if p99 is not None else None,
+    }
+
+
+def _print_connect(summary: dict) -> None:
+    reused = summary["requests"] - summary["new_connections"]
+    line = f"  Connections: {summary['new_connections']} new, {reused} reused"
+    if summary["connect_p50_ms"] is not None:
+        line += f" | connect p50 {summary['connect_p50_ms']:.2f} ms / p99 {summary['connect_p99_ms']:.2f} ms"
+    print(line)
+
+
+def run_sequential(*, timeline_out: TextIO | None = None, show_connect: bool = False,
+                   jobs: Sequence[tuple[str, str, int]] = TESTS) -> list[dict]:
     print(f"\n{'=' * 65}")
     print(f"  vLLM Benchmark — {MODEL}")
     print(f"  (Reasoning model: tracks thinking + output phases)")
@@ -178,13 +765,16 @@ def main():
 
     # Streaming tests
     results = []
-    for name, prompt, max_tok in TESTS:
+    for name, prompt, max_tok in jobs:
         print(f"── {name} (max {max_tok} tok) ──")
         sys.stdout.flush()
         r = stream_request(prompt, max_tok)
         results.append((name, r))
 
         print(f"  TTFT (first token):    {r['ttft_ms']:,.0f} ms")
+        if show_connect:
+            connect = f"{r['connect_ms']:.2f} ms (new)" if r["connect_ms"] is not None else "reused"
+            print(f"  Connect:               {connect}")
         if r["time_to_output_ms"] is not None:
             print(f"  Time to output:        {r['time_to_output_ms']:,.0f} ms")
         if r["reasoning_time_s"] is not None:
@@ -195,6 +785,15 @@ def main():
                   f"({r['output_tokens']} tok @ {r['output_tps']} tok/s)")
         print(f"  Total:                 {r['total_s']}s "
               f"({r['total_tokens']} tok @ {r['overall_tps']} tok/s)")
+        if r["chunk_count"] != r["total_tokens"]:
+            print(f"  Token count:           {r['total_tokens']} tok ({r['token_source']}) "
+                  f"vs {r['chunk_count']} SSE chunks")
+        if r["reasoning_itl_ms"] is not None:
+            print(f"  Reasoning ITL:         {_fmt_itl(r['reasoning_itl_ms'])}")
+        if r["output_itl_ms"] is not None:
+            print(f"  Output ITL:            {_fmt_itl(r['output_itl_ms'])}")
+        if timeline_out is not None:
+            write_timelines(timeline_out, name, [r])
         if r["reasoning_preview"]:
             print(f"  Thinking:  {r['reasoning_preview']}...")
         if r["output_preview"]:
@@ -231,7 +830,1800 @@ def main():
         print(f"  Avg TTFT:             {avg_ttft:,.0f} ms")
 
     print()
+    return [{"label": name, "summary": None, "requests": [r]} for name, r in results]
+
+
+def run_load(concurrency: int, total_requests: int,
+             workload: Workload | None = None) -> tuple[list[dict], int, float]:
+    """Keep `concurrency` streams in flight until `total_requests` have finished.
+
+    Prompts come from `workload` (default: cycle through TESTS).
+    Returns (results, error_count, wall seconds).
+    """
+    jobs = (workload or Workload.from_tests()).take(total_requests)
+    results = []
+    errors = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(stream_request, prompt, max_tok) for _, prompt, max_tok in jobs]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except (OSError, http.client.HTTPException):
+                errors += 1
+    return results, errors, time.perf_counter() - start
+
+
+def summarize_load(concurrency: int, results: list[dict], errors: int, wall_s: float) -> dict:
+    """Aggregate throughput plus TTFT / per-token latency percentiles for one level."""
+    ttfts = [r["ttft_ms"] for r in results]
+    tpots = [r["tpot_ms"] for r in results if r["tpot_ms"] is not None]
+    gaps = array("d")
+    for r in results:
+        reasoning_gaps, output_gaps = itl_gaps(r["timeline"], r["timeline_phase"])
+        gaps.extend(reasoning_gaps)
+        gaps.extend(output_gaps)
+    itl = latency_stats(gaps) or {}
+    total_tokens = sum(r["total_tokens"] for r in results)
+    total_chunks = sum(r["chunk_count"] for r in results)
+    summary = {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": errors,
+        "wall_s": round(wall_s, 2),
+        "req_per_s": round(len(results) / wall_s, 2) if wall_s > 0 else 0,
+        "tok_per_s": round(total_tokens / wall_s, 1) if wall_s > 0 else 0,
+        "tokens_per_chunk": round(total_tokens / total_chunks, 2) if total_chunks else None,
+        **connect_summary(results),
+    }
+    for pct in (50, 90, 99):
+        ttft = percentile(ttfts, pct)
+        tpot = percentile(tpots, pct)
+        summary[f"ttft_p{pct}_ms"] = round(ttft, 1) if ttft is not None else None
+        summary[f"tpot_p{pct}_ms"] = round(tpot, 2) if tpot is not None else None
+        summary[f"itl_p{pct}_ms"] = itl.get(f"p{pct}")
+    summary["itl_max_ms"] = itl.get("max")
+    return summary
+
+
+def _fmt_ms(value: float | None) -> str:
+    return f"{value:,.0f}" if value is not None else "-"
+
+
+def print_load_table(summaries: list[dict]) -> None:
+    print(f"{'=' * 93}")
+    print(f"  {'Conc':>4} {'Reqs':>5} {'Err':>4} {'Req/s':>6} {'Tok/s':>8} "
+          f"{'TTFT p50':>9} {'p90':>7} {'p99':>7} {'ITL p50':>8} {'p90':>6} {'p99':>6} {'max':>6}")
+    print(f"  {'-' * 4} {'-' * 5} {'-' * 4} {'-' * 6} {'-' * 8} "
+          f"{'-' * 9} {'-' * 7} {'-' * 7} {'-' * 8} {'-' * 6} {'-' * 6} {'-' * 6}")
+    for s in summaries:
+        print(f"  {s['concurrency']:>4} {s['requests']:>5} {s['errors']:>4} "
+              f"{s['req_per_s']:>6.2f} {s['tok_per_s']:>8.1f} "
+              f"{_fmt_ms(s['ttft_p50_ms']):>7}ms {_fmt_ms(s['ttft_p90_ms']):>7} "
+              f"{_fmt_ms(s['ttft_p99_ms']):>7} "
+              f"{s['itl_p50_ms'] or 0:>6.1f}ms {s['itl_p90_ms'] or 0:>6.1f} "
+              f"{s['itl_p99_ms'] or 0:>6.1f} {s['itl_max_ms'] or 0:>6.1f}")
+    print()
+
+
+def _shard_note(shards: Sequence["ShardChannel"]) -> str:
+    return f", sharded across {len(shards)} client processes" if shards else ""
+
+
+def run_load_sweep(levels: Sequence[int], total_requests: int, *,
+                   timeline_out: TextIO | None = None, show_connect: bool = False,
+                   workload: Workload | None = None,
+                   shards: Sequence["ShardChannel"] = ()) -> list[dict]:
+    workload = workload or Workload.from_tests()
+    print(f"\n{'=' * 65}")
+    print(f"  vLLM Load Sweep — {MODEL}")
+    print(f"  (closed loop: {total_requests} '{workload.name}' requests per concurrency level"
+          f"{_shard_note(shards)})")
+    print(f"{'=' * 65}\n")
+
+    steps = []
+    for concurrency in levels:
+        print(f"── Concurrency {concurrency} ──")
+        sys.stdout.flush()
+        if shards:
+            replies, wall_s = run_sharded(shards, "load", concurrency, total_requests,
+                                          workload=workload)
+            summary, hists = summarize_sharded("load", concurrency, replies, wall_s)
+            steps.append({"label": f"concurrency={concurrency}", "summary": summary, "requests": [],
+                          "histograms": {name: hist.to_dict() for name, hist in hists.items()}})
+        else:
+            results, errors, wall_s = run_load(concurrency, total_requests, workload)
+            summary = summarize_load(concurrency, results, errors, wall_s)
+            steps.append({"label": f"concurrency={concurrency}", "summary": summary, "requests": results})
+            if timeline_out is not None:
+                write_timelines(timeline_out, f"concurrency={concurrency}", results)
+        print(f"  {summary['requests']} ok / {summary['errors']} failed in {summary['wall_s']}s | "
+              f"{summary['req_per_s']} req/s | {summary['tok_per_s']} tok/s")
+        if summary["tokens_per_chunk"] not in (None, 1.0):
+            print(f"  Server coalesced {summary['tokens_per_chunk']} tokens per SSE chunk")
+        if show_connect:
+            _print_connect(summary)
+        print()
+
+    print_load_table([step["summary"] for step in steps])
+    return steps
+
+
+def arrival_offsets(qps: float, count: int, arrival: str, rng: random.Random) -> list[float]:
+    """Seconds after start at which each request is due ("fixed" or "poisson")."""
+    if arrival == "fixed":
+        return [i / qps for i in range(count)]
+    offsets = []
+    elapsed = 0.0
+    for _ in range(count):
+        offsets.append(elapsed)
+        elapsed += rng.expovariate(qps)
+    return offsets
+
+
+def _scheduled_request(prompt: str, max_tokens: int, due: float, origin: float) -> dict:
+    sent = time.perf_counter()
+    r = stream_request(prompt, max_tokens)
+    done = time.perf_counter()
+    lag_ms = (sent - due) * 1000
+    r["sent_s"] = sent - origin
+    r["done_s"] = done - origin
+    r["dispatch_lag_ms"] = round(lag_ms, 1)
+    # Arrival -> first token covers server queueing plus prefill; the rest is decode.
+    r["wait_ms"] = round(lag_ms + r["ttft_ms"], 1)
+    r["decode_s"] = round((done - sent) - r["ttft_ms"] / 1000, 3)
+    r["e2e_ms"] = round((done - due) * 1000, 1)
+    return r
+
+
+def run_open_loop(qps: float, total_requests: int, arrival: str, seed: int | None = None,
+                  workload: Workload | None = None) -> tuple[list[dict], int, float]:
+    """Fire requests on an arrival schedule regardless of how many are in flight.
+
+    Returns (results, error_count, wall seconds).
+    """
+    if total_requests < 1:
+        return [], 0, 0.0
+    jobs = (workload or Workload.from_tests()).take(total_requests)
+    offsets = arrival_offsets(qps, total_requests, arrival, random.Random(seed))
+    results = []
+    errors = 0
+    start = time.perf_counter()
+    # One worker per request so a slow server can never hold back the schedule.
+    with ThreadPoolExecutor(max_workers=total_requests) as pool:
+        futures = []
+        for (_, prompt, max_tok), offset in zip(jobs, offsets):
+            due = start + offset
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(_scheduled_request, prompt, max_tok, due, start))
+        for future in futures:
+            try:
+                results.append(future.result())
+            except (OSError, http.client.HTTPException):
+                errors += 1
+    return results, errors, time.perf_counter() - start
+
+
+def peak_in_flight(results: list[dict]) -> int:
+    events = sorted([(r["sent_s"], 1) for r in results] + [(r["done_s"], -1) for r in results])
+    peak = current = 0
+    for _, step in events:
+        current += step
+        peak = max(peak, current)
+    return peak
+
+
+def summarize_open_loop(qps: float, results: list[dict], errors: int, wall_s: float) -> dict:
+    """Queueing (arrival -> first token) versus decode latency for one target rate."""
+    total_tokens = sum(r["total_tokens"] for r in results)
+    last_sent = max((r["sent_s"] for r in results), default=0)
+    summary = {
+        "target_qps": qps,
+        "achieved_qps": round((len(results) - 1) / last_sent, 2) if last_sent > 0 else 0,
+        "requests": len(results),
+        "errors": errors,
+        "wall_s": round(wall_s, 2),
+        "tok_per_s": round(total_tokens / wall_s, 1) if wall_s > 0 else 0,
+        "peak_in_flight": peak_in_flight(results),
+        "max_dispatch_lag_ms": max((r["dispatch_lag_ms"] for r in results), default=0),
+        **connect_summary(results),
+    }
+    for name, unit, digits in (("wait", "ms", 1), ("decode", "s", 3), ("e2e", "ms", 1)):
+        values = [r[f"{name}_{unit}"] for r in results]
+        for pct in (50, 90, 99):
+            value = percentile(values, pct)
+            summary[f"{name}_p{pct}_{unit}"] = round(value, digits) if value is not None else None
+    return summary
+
+
+def print_open_loop_table(summaries: list[dict]) -> None:
+    print(f"{'=' * 86}")
+    print(f"  {'QPS':>5} {'Got':>5} {'Reqs':>5} {'Err':>4} {'Peak':>5} {'Tok/s':>8} "
+          f"{'Wait p50':>9} {'p99':>7} {'Decode p50':>11} {'E2E p99':>9}")
+    print(f"  {'-' * 5} {'-' * 5} {'-' * 5} {'-' * 4} {'-' * 5} {'-' * 8} "
+          f"{'-' * 9} {'-' * 7} {'-' * 11} {'-' * 9}")
+    for s in summaries:
+        print(f"  {s['target_qps']:>5g} {s['achieved_qps']:>5.2f} {s['requests']:>5} "
+              f"{s['errors']:>4} {s['peak_in_flight']:>5} {s['tok_per_s']:>8.1f} "
+              f"{_fmt_ms(s['wait_p50_ms']):>7}ms {_fmt_ms(s['wait_p99_ms']):>7} "
+              f"{s['decode_p50_s'] or 0:>10.2f}s {_fmt_ms(s['e2e_p99_ms']):>7}ms")
+    print()
+
+
+def run_rate_sweep(rates: Sequence[float], total_requests: int, arrival: str,
+                   seed: int | None, *, timeline_out: TextIO | None = None,
+                   show_connect: bool = False, workload: Workload | None = None,
+                   shards: Sequence["ShardChannel"] = ()) -> list[dict]:
+    workload = workload or Workload.from_tests()
+    print(f"\n{'=' * 65}")
+    print(f"  vLLM Open-Loop Sweep — {MODEL}")
+    print(f"  ({arrival} arrivals, {total_requests} '{workload.name}' requests per rate"
+          f"{_shard_note(shards)})")
+    print(f"{'=' * 65}\n")
+
+    steps = []
+    for qps in rates:
+        print(f"── Target {qps:g} req/s ──")
+        sys.stdout.flush()
+        if shards:
+            replies, wall_s = run_sharded(shards, "rate", qps, total_requests, arrival=arrival,
+                                          seed=seed, workload=workload)
+            summary, hists = summarize_sharded("rate", qps, replies, wall_s)
+            steps.append({"label": f"qps={qps:g}", "summary": summary, "requests": [],
+                          "histograms": {name: hist.to_dict() for name, hist in hists.items()}})
+        else:
+            results, errors, wall_s = run_open_loop(qps, total_requests, arrival, seed, workload)
+            summary = summarize_open_loop(qps, results, errors, wall_s)
+            steps.append({"label": f"qps={qps:g}", "summary": summary, "requests": results})
+            if timeline_out is not None:
+                write_timelines(timeline_out, f"qps={qps:g}", results)
+        print(f"  {summary['requests']} ok / {summary['errors']} failed in {summary['wall_s']}s | "
+              f"peak {summary['peak_in_flight']} in flight | "
+              f"max dispatch lag {summary['max_dispatch_lag_ms']:,.0f} ms")
+        if show_connect:
+            _print_connect(summary)
+        print()
+
+    print_open_loop_table([step["summary"] for step in steps])
+    return steps
+
+
+def search_max_load(probe: Callable[[float], bool], low: float, high: float, *,
+                    integer: bool, tolerance: float = 0.05) -> float | None:
+    """Highest load in [low, high] for which `probe(load)` passes, or None if `low` fails.
+
+    Doubles from `low` until a probe fails (or `high` passes), then bisects between the
+    last pass and the first failure. Assumes latency only gets worse as load grows.
+    Integer loads bisect down to adjacent values; fractional ones stop once the gap is
+    within `tolerance` of the passing load.
+    """
+    passed = failed = None
+    load = low
+    while failed is None:
+        if not probe(load):
+            failed = load
+        elif load >= high:
+            return load
+        else:
+            passed = load
+            load = min(load * 2, high)
+    if passed is None:
+        return None
+    while True:
+        if integer:
+            if failed - passed <= 1:
+                return passed
+            mid = (passed + failed) // 2
+        else:
+            if failed - passed <= tolerance * passed:
+                return passed
+            mid = round((passed + failed) / 2, 3)
+        if probe(mid):
+            passed = mid
+        else:
+            failed = mid
+
+
+def evaluate_slo(results: Sequence[dict], errors: int, wall_s: float, *,
+                 ttft_ms: float | None, itl_ms: float | None, pct: float,
+                 max_error_rate: float) -> dict:
+    """Check one probe against the SLO and count goodput (requests that met it themselves).
+
+    The SLO applies to the `pct` percentile of TTFT and of inter-token gaps across the
+    probe; a request counts toward goodput when its own TTFT and mean TPOT fit the limits.
+    """
+    ttft = percentile([r["ttft_ms"] for r in results], pct)
+    gaps = array("d")
+    for r in results:
+        reasoning_gaps, output_gaps = itl_gaps(r["timeline"], r["timeline_phase"])
+        gaps.extend(reasoning_gaps)
+        gaps.extend(output_gaps)
+    itl = percentile(gaps, pct)
+    itl = itl * 1000 if itl is not None else None
+    attempted = len(results) + errors
+    error_rate = errors / attempted if attempted else 0.0
+
+    violations = []
+    if ttft_ms is not None and (ttft is None or ttft > ttft_ms):
+        violations.append(f"TTFT p{pct:g} {_fmt_ms(ttft)} ms > {ttft_ms:g} ms")
+    if itl_ms is not None and (itl is None or itl > itl_ms):
+        violations.append(f"ITL p{pct:g} {itl or 0:.1f} ms > {itl_ms:g} ms")
+    if error_rate > max_error_rate:
+        violations.append(f"error rate {error_rate:.1%} > {max_error_rate:.1%}")
+
+    good = sum(
+        1 for r in results
+        if (ttft_ms is None or r["ttft_ms"] <= ttft_ms)
+        and (itl_ms is None or r["tpot_ms"] is None or r["tpot_ms"] <= itl_ms)
+    )
+    return {
+        "percentile": pct,
+        "ttft_ms": round(ttft, 1) if ttft is not None else None,
+        "itl_ms": round(itl, 2) if itl is not None else None,
+        "error_rate": round(error_rate, 4),
+        "attainment": round(good / attempted, 4) if attempted else 0.0,
+        "goodput_req_per_s": round(good / wall_s, 2) if wall_s > 0 else 0,
+        "violations": violations,
+        "passed": not violations,
+    }
+
+
+def print_slo_curve(steps: Sequence[dict], by: str, best: float | None) -> None:
+    pct = f"p{steps[0]['summary']['slo']['percentile']:g}" if steps else "p99"
+    print(f"{'=' * 84}")
+    print(f"  {'Load':>7} {'Reqs':>5} {'Err':>4} {'Req/s':>6} {'Tok/s':>8} "
+          f"{'TTFT ' + pct:>10} {'ITL ' + pct:>9} {'Goodput':>8} {'Attain':>7}  Status")
+    print(f"  {'-' * 7} {'-' * 5} {'-' * 4} {'-' * 6} {'-' * 8} "
+          f"{'-' * 10} {'-' * 9} {'-' * 8} {'-' * 7}  {'-' * 6}")
+    for step in steps:
+        s, slo = step["summary"], step["summary"]["slo"]
+        load = s["concurrency"] if by == "concurrency" else s["target_qps"]
+        req_per_s = s["req_per_s"] if by == "concurrency" else s["achieved_qps"]
+        status = "ok" if slo["passed"] else "miss"
+        if load == best:
+            status += "  <- max"
+        print(f"  {load:>7g} {s['requests']:>5} {s['errors']:>4} {req_per_s:>6.2f} "
+              f"{s['tok_per_s']:>8.1f} {_fmt_ms(slo['ttft_ms']):>8}ms "
+              f"{slo['itl_ms'] or 0:>7.1f}ms {slo['goodput_req_per_s']:>8.2f} "
+              f"{slo['attainment']:>7.0%}  {status}")
+    print()
+
+
+def run_slo_search(by: str, low: float, high: float, total_requests: int, *,
+                   ttft_ms: float | None, itl_ms: float | None, pct: float = 99,
+                   max_error_rate: float = 0.0, tolerance: float = 0.05,
+                   arrival: str = "poisson", seed: int | None = None, min_seconds: float = 10.0,
+                   timeline_out: TextIO | None = None, show_connect: bool = False,
+                   workload: Workload | None = None) -> list[dict]:
+    """Search concurrency (closed loop) or request rate (open loop) for max load within SLO.
+
+    Rate probes send at least `min_seconds` of arrivals, since a fixed count at a high
+    rate is over before any queue can build. Returns every probe as a step, sorted by
+    load, so the latency curve is saved too.
+    """
+    workload = workload or Workload.from_tests()
+    limits = [f"TTFT p{pct:g} <= {ttft_ms:g} ms" if ttft_ms is not None else None,
+              f"ITL p{pct:g} <= {itl_ms:g} ms" if itl_ms is not None else None]
+    print(f"\n{'=' * 65}")
+    print(f"  vLLM SLO Search — {MODEL}")
+    print(f"  (max {by} with {', '.join(filter(None, limits))}; "
+          f"'{workload.name}' requests, {low:g}..{high:g})")
+    print(f"{'=' * 65}\n")
+
+    probed = {}
+
+    def probe(load: float) -> bool:
+        if load in probed:
+            return probed[load]["summary"]["slo"]["passed"]
+        if by == "concurrency":
+            load = int(load)
+            label = f"concurrency={load}"
+            # Enough requests that the level is actually sustained, not just ramped into.
+            requests = max(total_requests, 2 * load)
+            print(f"── Concurrency {load} ──")
+            sys.stdout.flush()
+            results, errors, wall_s = run_load(load, requests, workload)
+            summary = summarize_load(load, results, errors, wall_s)
+        else:
+            label = f"qps={load:g}"
+            requests = max(total_requests, math.ceil(load * min_seconds))
+            print(f"── Target {load:g} req/s ──")
+            sys.stdout.flush()
+            results, errors, wall_s = run_open_loop(load, requests, arrival, seed, workload)
+            summary = summarize_open_loop(load, results, errors, wall_s)
+        summary["slo"] = evaluate_slo(results, errors, wall_s, ttft_ms=ttft_ms, itl_ms=itl_ms,
+                                      pct=pct, max_error_rate=max_error_rate)
+        probed[load] = {"label": label, "summary": summary, "requests": results}
+        if timeline_out is not None:
+            write_timelines(timeline_out, label, results)
+        slo = summary["slo"]
+        verdict = "meets SLO" if slo["passed"] else "misses SLO: " + "; ".join(slo["violations"])
+        print(f"  {summary['requests']} ok / {errors} failed | {summary['tok_per_s']} tok/s | "
+              f"goodput {slo['goodput_req_per_s']} req/s | {verdict}")
+        if show_connect:
+            _print_connect(summary)
+        print()
+        return slo["passed"]
+
+    best = search_max_load(probe, low, high, integer=by == "concurrency", tolerance=tolerance)
+    steps = [probed[load] for load in sorted(probed)]
+    print_slo_curve(steps, by, best)
+    if best is None:
+        print(f"  No load meets the SLO; even {by} {low:g} misses it.\n")
+    else:
+        s = probed[best]["summary"]
+        at_limit = " (search ceiling; raise --high to look further)" if best >= high else ""
+        print(f"  Max {by} within SLO: {best:g}{at_limit}")
+        print(f"  Goodput {s['slo']['goodput_req_per_s']} req/s, {s['tok_per_s']} tok/s\n")
+    return steps
+
+
+class LatencyHistogram:
+    """Log-bucketed (HDR-style) latency histogram that merges exactly across processes.
+
+    Each bucket spans a factor of 1 + 2 * precision, so percentiles come back within
+    `precision` of a recorded value while the whole distribution stays a few hundred
+    integers however many requests were recorded.
+    """
+
+    def __init__(self, precision: float = 0.005):
+        self.precision = precision
+        self._log_base = math.log1p(2 * precision)
+        self.counts: dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 0:
+            self.zeros += 1  # e.g. two deltas decoded from the same read
+            return
+        index = math.floor(math.log(value) / self._log_base)
+        self.counts[index] = self.counts.get(index, 0) + 1
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        if other.precision != self.precision:
+            raise ValueError(f"cannot merge histograms with precision {self.precision} and {other.precision}")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, pct: float) -> float | None:
+        """Nearest-rank percentile, reported as the bucket's geometric midpoint."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = self.zeros
+        if rank <= seen:
+            return max(self.min, 0.0)
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(math.exp((index + 0.5) * self._log_base), self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "precision": self.precision,
+            "count": self.count,
+            "zeros": self.zeros,
+            "sum": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "counts": {str(index): count for index, count in sorted(self.counts.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, doc: dict) -> "LatencyHistogram":
+        hist = cls(doc["precision"])
+        hist.counts = {int(index): count for index, count in doc["counts"].items()}
+        hist.zeros = doc["zeros"]
+        hist.count = doc["count"]
+        hist.total = doc["sum"]
+        if hist.count:
+            hist.min, hist.max = doc["min"], doc["max"]
+        return hist
+
+
+# Per-request latencies a shard reduces into histograms (all in ms).
+SHARD_METRICS = ("ttft_ms", "tpot_ms", "itl_ms", "connect_ms", "wait_ms", "decode_ms", "e2e_ms")
+
+
+def shard_histograms(results: Sequence[dict]) -> dict[str, LatencyHistogram]:
+    hists = {name: LatencyHistogram() for name in SHARD_METRICS}
+    for r in results:
+        for name in ("ttft_ms", "tpot_ms", "connect_ms", "wait_ms", "e2e_ms"):
+            if r.get(name) is not None:
+                hists[name].record(r[name])
+        if "decode_s" in r:
+            hists["decode_ms"].record(r["decode_s"] * 1000)
+        for gaps in itl_gaps(r["timeline"], r["timeline_phase"]):
+            for gap in gaps:
+                hists["itl_ms"].record(gap * 1000)
+    return hists
+
+
+def run_shard(job: dict, ready: Callable[[], None] = lambda: None) -> dict:
+    """Run one shard's share of a load level; reply with counters and histograms only.
+
+    `ready` is called once the shard is set up and blocks until the coordinator says go.
+    """
+    global HOST, PORT, MODEL, KEEPALIVE
+    HOST, PORT, MODEL, KEEPALIVE = job["host"], job["port"], job["model"], job["keepalive"]
+    prompts = [{"name": name, "prompt": prompt, "max_tokens": max_tok}
+               for name, prompt, max_tok in job["jobs"]]
+    workload = Workload([{"prompts": prompts}], name="shard")
+    ready()
+    if job["mode"] == "load":
+        results, errors, wall_s = run_load(job["concurrency"], len(prompts), workload)
+    else:
+        time.sleep(job["delay"])
+        results, errors, wall_s = run_open_loop(job["qps"], len(prompts), job["arrival"],
+                                                job["seed"], workload)
+    reply = {
+        "requests": len(results),
+        "errors": errors,
+        "wall_s": wall_s,
+        "total_tokens": sum(r["total_tokens"] for r in results),
+        "chunk_count": sum(r["chunk_count"] for r in results),
+        "new_connections": sum(r["connect_ms"] is not None for r in results),
+        "histograms": {name: hist.to_dict() for name, hist in shard_histograms(results).items()},
+    }
+    if job["mode"] == "rate":
+        reply["last_sent_s"] = job["delay"] + max((r["sent_s"] for r in results), default=0)
+        reply["peak_in_flight"] = peak_in_flight(results)
+        reply["max_dispatch_lag_ms"] = max((r["dispatch_lag_ms"] for r in results), default=0)
+    return reply
+
+
+class ShardChannel:
+    """Line-delimited JSON messages to one shard worker, over a socket or a child's pipes."""
+
+    def __init__(self, name: str, reader: BinaryIO, writer: BinaryIO,
+                 close: Callable[[], None] = lambda: None):
+        self.name = name
+        self.reader = reader
+        self.writer = writer
+        self._close = close
+
+    def send(self, message: dict) -> None:
+        self.writer.write(json.dumps(message).encode() + b"\n")
+        self.writer.flush()
+
+    def recv(self) -> dict:
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError(f"shard {self.name} closed the connection")
+        message = json.loads(line)
+        if "error" in message:
+            raise RuntimeError(f"shard {self.name} failed: {message['error']}")
+        return message
+
+    def close(self) -> None:
+        self._close()
+
+
+# Shared secret between a coordinator and `worker --listen` hosts.
+TOKEN_ENV = "VLLM_BENCH_TOKEN"
+
+
+def _worker_command() -> list[str]:
+    return [sys.executable, os.path.abspath(__file__), "worker", "--stdio"]
+
+
+def local_shard() -> ShardChannel:
+    child = subprocess.Popen(_worker_command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def close():
+        child.stdin.close()
+        try:
+            child.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            child.kill()
+            child.wait()
+        child.stdout.close()
+
+    return ShardChannel(f"pid {child.pid}", child.stdout, child.stdin, close)
+
+
+def remote_shard(address: tuple[str, int], token: str) -> ShardChannel:
+    sock = socket.create_connection(address)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    stream = sock.makefile("rwb")
+
+    def close():
+        stream.close()
+        sock.close()
+
+    channel = ShardChannel(f"{address[0]}:{address[1]}", stream, stream, close)
+    try:
+        channel.send({"token": token})
+        channel.recv()
+    except (OSError, RuntimeError):
+        channel.close()
+        raise
+    return channel
+
+
+def open_shards(processes: int, workers: Sequence[tuple[str, int]],
+                token: str | None = None) -> list[ShardChannel]:
+    shards = []
+    try:
+        shards.extend(remote_shard(address, token) for address in workers)
+        shards.extend(local_shard() for _ in range(processes))
+    except (OSError, RuntimeError):
+        close_shards(shards)
+        raise
+    return shards
+
+
+def close_shards(shards: Sequence[ShardChannel]) -> None:
+    for shard in shards:
+        shard.close()
+
+
+def serve_shard(channel: ShardChannel) -> None:
+    """Worker side: for each job, reply ready, wait for go, run it and send the result."""
+
+    def ready():
+        channel.send({"ready": True})
+        channel.recv()
+
+    while True:
+        try:
+            job = channel.recv()
+        except ConnectionError:
+            return
+        try:
+            result = run_shard(job, ready)
+        except (ConnectionError, BrokenPipeError):
+            return
+        except Exception as exc:  # report to the coordinator rather than hang it
+            result = {"error": f"{type(exc).__name__}: {exc}"}
+        channel.send(result)
+
+
+def _read_hello(conn: socket.socket, timeout: float = 5.0) -> dict | None:
+    """The coordinator's first line; it sends nothing more until we answer."""
+    conn.settimeout(timeout)
+    data = b""
+    try:
+        while not data.endswith(b"\n") and len(data) < 4096:
+            chunk = conn.recv(4096 - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        hello = json.loads(data)
+    except (OSError, ValueError):
+        return None
+    finally:
+        conn.settimeout(None)
+    return hello if isinstance(hello, dict) else None
+
+
+def serve_workers(server: socket.socket, token: str) -> None:
+    """Accept coordinator connections, handing each authenticated one to its own worker process.
+
+    Jobs name the server to load, so without the shared token anyone who can reach
+    this port could aim the worker at any host.
+    """
+    children = []
+    while True:
+        try:
+            conn, peer = server.accept()
+        except OSError:
+            return
+        with conn:
+            hello = _read_hello(conn)
+            offered = str((hello or {}).get("token", ""))
+            try:
+                if not hmac.compare_digest(offered.encode(), token.encode()):
+                    print(f"vllm-bench worker: rejected {peer[0]} (bad token)", file=sys.stderr)
+                    conn.sendall(json.dumps({"error": "bad token"}).encode() + b"\n")
+                    continue
+                conn.sendall(json.dumps({"ok": True}).encode() + b"\n")
+            except OSError:
+                continue
+            children.append(subprocess.Popen(_worker_command(), stdin=conn, stdout=conn))
+        children = [child for child in children if child.poll() is None]
+
+
+def run_worker(listen: tuple[str, int] | None, token: str | None = None) -> int:
+    if listen is None:
+        # The protocol owns stdout; anything else printed goes to stderr.
+        protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        serve_shard(ShardChannel("coordinator", sys.stdin.buffer, protocol_out))
+        return 0
+    with socket.create_server(listen) as server:
+        host, port = server.getsockname()[:2]
+        print(f"vllm-bench worker listening on {host}:{port} (one process per connection)",
+              file=sys.stderr)
+        try:
+            serve_workers(server, token)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+def _proportional(total: int, weights: Sequence[float]) -> list[int]:
+    """Split `total` into integer parts proportional to `weights`."""
+    scale = sum(weights)
+    bounds = [0] + [round(total * sum(weights[:i + 1]) / scale) for i in range(len(weights))]
+    return [bounds[i + 1] - bounds[i] for i in range(len(weights))]
+
+
+def run_sharded(shards: Sequence[ShardChannel], mode: str, level: float, total_requests: int, *,
+                arrival: str = "poisson", seed: int | None = None,
+                workload: Workload | None = None) -> tuple[list[dict], float]:
+    """Deal one level's prompts across shards, start them together, collect their replies.
+
+    Closed loop splits the concurrency; open loop gives each shard qps / shards, offsetting
+    fixed schedules so the combined arrivals stay evenly spaced (Poisson streams just add up).
+    Returns (shard replies, wall seconds from go to the last reply).
+    """
+    jobs = (workload or Workload.from_tests()).take(total_requests)
+    if mode == "load":
+        shares = [share for share in _proportional(int(level), [1] * len(shards)) if share]
+    else:
+        shares = [level / len(shards)] * len(shards)
+    counts = _proportional(total_requests, shares)
+    # A shard dealt no prompts (fewer requests than shards) sits the level out.
+    kept = [index for index, count in enumerate(counts) if count]
+    active = [shards[index] for index in kept]
+    counts = [counts[index] for index in kept]
+    if mode == "load":
+        shares = [shares[index] for index in kept]
+    else:
+        shares = [level / len(active)] * len(active)
+    offset = 0
+    for index, (shard, share, count) in enumerate(zip(active, shares, counts)):
+        shard.send({
+            "mode": mode, "host": HOST, "port": PORT, "model": MODEL, "keepalive": KEEPALIVE,
+            "jobs": jobs[offset:offset + count],
+            "concurrency": share, "qps": share, "arrival": arrival,
+            "seed": None if seed is None else seed + index,
+            "delay": index / level if mode == "rate" and arrival == "fixed" else 0,
+        })
+        offset += count
+    for shard in active:
+        shard.recv()
+    start = time.perf_counter()
+    for shard in active:
+        shard.send({"go": True})
+    replies = [shard.recv() for shard in active]
+    return replies, time.perf_counter() - start
+
+
+def merge_shard_replies(replies: Sequence[dict]) -> tuple[dict, dict[str, LatencyHistogram]]:
+    totals = {key: sum(reply[key] for reply in replies)
+              for key in ("requests", "errors", "total_tokens", "chunk_count", "new_connections")}
+    hists = {name: LatencyHistogram() for name in SHARD_METRICS}
+    for reply in replies:
+        for name, doc in reply["histograms"].items():
+            hists[name].merge(LatencyHistogram.from_dict(doc))
+    if "last_sent_s" in replies[0]:
+        totals["last_sent_s"] = max(reply["last_sent_s"] for reply in replies)
+        # Shards peak independently, so the sum is an upper bound on the true peak.
+        totals["peak_in_flight"] = sum(reply["peak_in_flight"] for reply in replies)
+        totals["max_dispatch_lag_ms"] = max(reply["max_dispatch_lag_ms"] for reply in replies)
+    return totals, hists
+
+
+def summarize_sharded(mode: str, level: float, replies: Sequence[dict],
+                      wall_s: float) -> tuple[dict, dict[str, LatencyHistogram]]:
+    """The same summary summarize_load / summarize_open_loop give, from merged histograms."""
+    totals, hists = merge_shard_replies(replies)
+
+    def pct_of(name, pct, digits, scale=1.0):
+        value = hists[name].percentile(pct)
+        return round(value * scale, digits) if value is not None else None
+
+    connect = {
+        "new_connections": totals["new_connections"],
+        "connect_p50_ms": pct_of("connect_ms", 50, 2),
+        "connect_p99_ms": pct_of("connect_ms", 99, 2),
+    }
+    summary = {
+        "requests": totals["requests"],
+        "errors": totals["errors"],
+        "wall_s": round(wall_s, 2),
+        "tok_per_s": round(totals["total_tokens"] / wall_s, 1) if wall_s > 0 else 0,
+        "shards": len(replies),
+    }
+    if mode == "load":
+        summary = {"concurrency": int(level), **summary,
+                   "req_per_s": round(totals["requests"] / wall_s, 2) if wall_s > 0 else 0,
+                   "tokens_per_chunk": (round(totals["total_tokens"] / totals["chunk_count"], 2)
+                                        if totals["chunk_count"] else None),
+                   **connect}
+        for pct in (50, 90, 99):
+            summary[f"ttft_p{pct}_ms"] = pct_of("ttft_ms", pct, 1)
+            summary[f"tpot_p{pct}_ms"] = pct_of("tpot_ms", pct, 2)
+            summary[f"itl_p{pct}_ms"] = pct_of("itl_ms", pct, 2)
+        summary["itl_max_ms"] = round(hists["itl_ms"].max, 2) if hists["itl_ms"].count else None
+        return summary, hists
+    last_sent = totals["last_sent_s"]
+    summary = {"target_qps": level,
+               "achieved_qps": round((totals["requests"] - 1) / last_sent, 2) if last_sent > 0 else 0,
+               **summary,
+               "peak_in_flight": totals["peak_in_flight"],
+               "max_dispatch_lag_ms": totals["max_dispatch_lag_ms"],
+               **connect}
+    for name, unit, digits, scale in (("wait", "ms", 1, 1.0), ("decode", "s", 3, 0.001),
+                                      ("e2e", "ms", 1, 1.0)):
+        for pct in (50, 90, 99):
+            summary[f"{name}_p{pct}_{unit}"] = pct_of(f"{name}_ms", pct, digits, scale)
+    return summary, hists
+
+
+# (hits, queries) counter pairs across vLLM versions, newest first; both count tokens.
+PREFIX_CACHE_COUNTERS = (
+    ("vllm:prefix_cache_hits_total", "vllm:prefix_cache_queries_total"),
+    ("vllm:prefix_cache_hits", "vllm:prefix_cache_queries"),
+    ("vllm:gpu_prefix_cache_hits_total", "vllm:gpu_prefix_cache_queries_total"),
+)
+
+
+def prefix_cache_delta(before: dict | None, after: dict | None) -> dict | None:
+    """Prefix-cache hit tokens, query tokens and hit rate between two scrapes."""
+    if not before or not after:
+        return None
+    for hits_name, queries_name in PREFIX_CACHE_COUNTERS:
+        if hits_name in after and queries_name in after:
+            hits = after[hits_name] - before.get(hits_name, 0)
+            queries = after[queries_name] - before.get(queries_name, 0)
+            return {
+                "hit_tokens": int(hits),
+                "query_tokens": int(queries),
+                "hit_rate": round(hits / queries, 3) if queries else None,
+            }
+    # Older releases only expose a running gauge.
+    if "vllm:gpu_prefix_cache_hit_rate" in after:
+        return {"hit_tokens": None, "query_tokens": None,
+                "hit_rate": round(after["vllm:gpu_prefix_cache_hit_rate"], 3)}
+    return None
+
+
+def summarize_ttft(results: Sequence[dict]) -> dict:
+    ttfts = [r["ttft_ms"] for r in results]
+    summary = {"requests": len(results)}
+    for pct in (50, 90):
+        value = percentile(ttfts, pct)
+        summary[f"ttft_p{pct}_ms"] = round(value, 1) if value is not None else None
+    summary["prompt_tokens"] = sum(r["prompt_tokens"] or 0 for r in results)
+    cached = [r["cached_tokens"] for r in results if r.get("cached_tokens") is not None]
+    summary["cached_tokens"] = sum(cached) if cached else None
+    return summary
+
+
+def prefix_families(families: int, variants: int, prefix_tokens: int, suffix_tokens: int,
+                    rng: random.Random) -> list[list[str]]:
+    """`families` groups of prompts sharing a long document prefix, differing in the question.
+
+    A per-run nonce heads every prefix so nothing is already cached from an earlier run.
+    """
+    nonce = f"{rng.getrandbits(64):016x}"
+    groups = []
+    for family in range(families):
+        prefix = f"[doc {nonce}-{family}]\n" + synthetic_prompt(prefix_tokens, rng)
+        groups.append([
+            f"{prefix}\n\nQuestion {variant}: "
+            + " ".join(rng.choice(FILLER_WORDS) for _ in range(max(1, int(suffix_tokens / TOKENS_PER_WORD))))
+            + "?"
+            for variant in range(variants)
+        ])
+    return groups
+
+
+def run_prefix_cache(families: int, variants: int, prefix_tokens: int, suffix_tokens: int,
+                     max_tokens: int, seed: int | None, *, timeline_out: TextIO | None = None,
+                     show_connect: bool = False) -> list[dict]:
+    """Cold pass (first request per prefix) then warm pass (the siblings), sequentially."""
+    print(f"\n{'=' * 65}")
+    print(f"  Prefix-cache benchmark — {MODEL}")
+    print(f"  ({families} families x {variants} variants, ~{prefix_tokens} tok shared prefix, "
+          f"~{suffix_tokens} tok suffix)")
+    print(f"{'=' * 65}\n")
+
+    groups = prefix_families(families, variants, prefix_tokens, suffix_tokens, random.Random(seed))
+    passes = (("cold", [group[0] for group in groups]),
+              ("warm", [prompt for group in groups for prompt in group[1:]]))
+    steps = []
+    for label, prompts in passes:
+        print(f"── {label.capitalize()} pass ({len(prompts)} requests) ──")
+        sys.stdout.flush()
+        before = scrape_metrics()
+        results = [stream_request(prompt, max_tokens) for prompt in prompts]
+        cache = prefix_cache_delta(before, scrape_metrics())
+        summary = summarize_ttft(results)
+        summary["prefix_cache"] = cache
+        steps.append({"label": label, "summary": summary, "requests": results})
+        if timeline_out is not None:
+            write_timelines(timeline_out, f"prefix-{label}", results)
+        print(f"  TTFT p50 {_fmt_ms(summary['ttft_p50_ms'])} ms / p90 {_fmt_ms(summary['ttft_p90_ms'])} ms"
+              f" | {summary['prompt_tokens']:,} prompt tok")
+        if cache is not None:
+            hit_rate = f"{cache['hit_rate']:.1%}" if cache["hit_rate"] is not None else "-"
+            print(f"  Server prefix-cache hit rate: {hit_rate}")
+        if show_connect:
+            _print_connect({**summary, **connect_summary(results)})
+        print()
+
+    cold, warm = steps[0]["summary"], steps[1]["summary"]
+    print(f"{'=' * 65}")
+    if cold["ttft_p50_ms"] and warm["ttft_p50_ms"]:
+        reduction = 1 - warm["ttft_p50_ms"] / cold["ttft_p50_ms"]
+        print(f"  TTFT p50 reduction (warm vs cold): {reduction:.1%}")
+    cache = warm["prefix_cache"]
+    if cache and cache["hit_tokens"] is not None:
+        print(f"  Prefill tokens saved:  {cache['hit_tokens']:,} of {cache['query_tokens']:,} "
+              f"(server counters)")
+    elif warm["cached_tokens"] is not None:
+        print(f"  Prefill tokens saved:  {warm['cached_tokens']:,} of {warm['prompt_tokens']:,} "
+              f"(usage.prompt_tokens_details)")
+    else:
+        print(f"  Prefill tokens saved:  ~{warm['requests'] * prefix_tokens:,} (estimated; "
+              f"server exposes neither /metrics counters nor cached_tokens)")
+    print()
+    return steps
+
+
+def context_limit() -> int | None:
+    """max_model_len the server reports for MODEL (or its only model), if any."""
+    models = (get_json("/v1/models") or {}).get("data", [])
+    for m in models:
+        if m.get("id") == MODEL and m.get("max_model_len"):
+            return int(m["max_model_len"])
+    if len(models) == 1 and models[0].get("max_model_len"):
+        return int(models[0]["max_model_len"])
+    return None
+
+
+def context_lengths(start: int, limit: int, max_tokens: int, factor: float = 2.0,
+                    exact: bool = False) -> list[int]:
+    """Geometric input lengths from `start` up to what still fits in `limit` with the output.
+
+    Leaves room for the chat template, plus 10% when lengths are only estimated
+    (no local tokenizer), and always ends with that top length.
+    """
+    top = int((limit - max_tokens - 64) * (1.0 if exact else 0.9))
+    lengths = []
+    length = start
+    while length < top:
+        lengths.append(int(length))
+        length *= factor
+    if top >= start and (not lengths or top > lengths[-1] * 1.1):
+        lengths.append(top)
+    return lengths
+
+
+def long_context_prompts(tokens: int, count: int, rng: random.Random) -> list[str]:
+    """Distinct prompts of ~`tokens` tokens; a unique head keeps prefix caching out of it."""
+    return [f"[{rng.getrandbits(64):016x}]\n" + synthetic_prompt(max(1, tokens - 16), rng)
+            for _ in range(count)]
+
+
+def summarize_context(tokens: int, concurrency: int, results: Sequence[dict], errors: int,
+                      wall_s: float) -> dict:
+    """TTFT, prefill and decode speed at one input length and concurrency level.
+
+    Refused prompts (too long for the context) and empty responses count as failed
+    rather than being timed.
+    """
+    ok = [r for r in results if r["total_tokens"]]
+    gaps = array("d")
+    for r in ok:
+        for phase_gaps in itl_gaps(r["timeline"], r["timeline_phase"]):
+            gaps.extend(phase_gaps)
+    itl = latency_stats(gaps) or {}
+    prompt_tokens = percentile([r["prompt_tokens"] or tokens for r in ok], 50)
+    prefill = [(r["prompt_tokens"] or tokens) / (r["ttft_ms"] / 1000) for r in ok if r["ttft_ms"] > 0]
+    summary = {
+        "input_tokens": tokens,
+        "prompt_tokens": round(prompt_tokens) if prompt_tokens is not None else None,
+        "concurrency": concurrency,
+        "requests": len(ok),
+        "failed": errors + len(results) - len(ok),
+        "wall_s": round(wall_s, 2),
+    }
+    for name, values, digits in (
+        ("ttft_p50_ms", percentile([r["ttft_ms"] for r in ok], 50), 1),
+        ("ttft_p99_ms", percentile([r["ttft_ms"] for r in ok], 99), 1),
+        ("prefill_tok_per_s", percentile(prefill, 50), 0),
+        ("decode_tok_per_s", percentile([r["overall_tps"] for r in ok if r["overall_tps"]], 50), 1),
+    ):
+        summary[name] = round(values, digits) if values is not None else None
+    summary["itl_p50_ms"] = itl.get("p50")
+    summary["itl_p99_ms"] = itl.get("p99")
+    return summary
+
+
+def flag_cliffs(summaries: Sequence[dict], threshold: float) -> None:
+    """Annotate one concurrency level's lengths with decode slowdown and cliffs.
+
+    Prefill tok/s should hold or improve as inputs grow (fixed costs amortize), and
+    decode should degrade gently; a step that loses more than `threshold` of either
+    relative to the previous length is where chunked prefill or KV-cache pressure bites.
+    """
+    base = next((s["decode_tok_per_s"] for s in summaries if s["decode_tok_per_s"]), None)
+    previous = None
+    for s in summaries:
+        s["decode_drop_pct"] = (round((1 - s["decode_tok_per_s"] / base) * 100, 1)
+                                if base and s["decode_tok_per_s"] else None)
+        cliffs = []
+        if s["failed"]:
+            cliffs.append(f"{s['failed']} failed")
+        if previous is not None:
+            for key, name in (("prefill_tok_per_s", "prefill"), ("decode_tok_per_s", "decode")):
+                before, now = previous[key], s[key]
+                if before and now and now < before * (1 - threshold):
+                    cliffs.append(f"{name} tok/s -{(1 - now / before):.0%}")
+        s["cliffs"] = cliffs
+        if s["requests"]:
+            previous = s
+
+
+def print_context_table(summaries: Sequence[dict]) -> None:
+    print(f"{'=' * 96}")
+    print(f"  {'Input':>7} {'Conc':>4} {'Reqs':>4} {'Err':>3} {'TTFT p50':>9} {'p99':>8} "
+          f"{'Prefill/s':>10} {'Decode/s':>9} {'Drop':>6} {'ITL p99':>8}  Cliff")
+    print(f"  {'-' * 7} {'-' * 4} {'-' * 4} {'-' * 3} {'-' * 9} {'-' * 8} "
+          f"{'-' * 10} {'-' * 9} {'-' * 6} {'-' * 8}  {'-' * 5}")
+    for s in summaries:
+        drop = f"{s['decode_drop_pct']:.0f}%" if s["decode_drop_pct"] is not None else "-"
+        prefill = f"{s['prefill_tok_per_s']:,.0f}" if s["prefill_tok_per_s"] is not None else "-"
+        decode = f"{s['decode_tok_per_s']:.1f}" if s["decode_tok_per_s"] is not None else "-"
+        itl = f"{s['itl_p99_ms']:.1f}ms" if s["itl_p99_ms"] is not None else "-"
+        print(f"  {s['prompt_tokens'] or s['input_tokens']:>7,} {s['concurrency']:>4} "
+              f"{s['requests']:>4} {s['failed']:>3} "
+              f"{_fmt_ms(s['ttft_p50_ms']):>7}ms {_fmt_ms(s['ttft_p99_ms']):>6}ms "
+              f"{prefill:>10} {decode:>9} {drop:>6} {itl:>8}  {'; '.join(s['cliffs'])}")
+    print()
+
+
+def run_long_context(start: int, max_input: int | None, factor: float, levels: Sequence[int],
+                     requests: int, max_tokens: int, threshold: float, seed: int | None, *,
+                     timeline_out: TextIO | None = None, show_connect: bool = False) -> list[dict]:
+    """Sweep input length geometrically up to the context limit at each concurrency level."""
+    limit = max_input or context_limit()
+    if limit is None:
+        raise SystemExit("Server does not report max_model_len; pass --max-input")
+    exact = load_tokenizer(MODEL) is not None
+    lengths = context_lengths(start, limit, max_tokens, factor, exact=exact)
+    if not lengths:
+        raise SystemExit(f"--min-tokens {start} does not fit in a {limit}-token context")
+    print(f"\n{'=' * 65}")
+    print(f"  Long-context sweep — {MODEL}")
+    print(f"  (inputs {lengths[0]:,}..{lengths[-1]:,} tok of a {limit:,} context, x{factor:g}; "
+          f"{max_tokens} output tok; concurrency {','.join(map(str, levels))})")
+    if not exact:
+        print("  (no local tokenizer: input lengths are estimates; prompt_tokens comes from usage)")
+    print(f"{'=' * 65}\n")
+
+    rng = random.Random(seed)
+    steps = []
+    for concurrency in levels:
+        series = []
+        for tokens in lengths:
+            count = max(requests, concurrency)
+            label = f"input={tokens},concurrency={concurrency}"
+            print(f"── {tokens:,} input tokens x {count} at concurrency {concurrency} ──")
+            sys.stdout.flush()
+            prompts = long_context_prompts(tokens, count, rng)
+            workload = Workload([{"prompts": [{"name": f"ctx-{tokens}", "prompt": p, "max_tokens": max_tokens}
+                                              for p in prompts]}], name="long-context")
+            results, errors, wall_s = run_load(concurrency, count, workload)
+            summary = summarize_context(tokens, concurrency, results, errors, wall_s)
+            series.append(summary)
+            steps.append({"label": label, "summary": summary, "requests": results})
+            if timeline_out is not None:
+                write_timelines(timeline_out, label, results)
+            print(f"  TTFT p50 {_fmt_ms(summary['ttft_p50_ms'])} ms | prefill "
+                  f"{summary['prefill_tok_per_s'] or 0:,.0f} tok/s | decode "
+                  f"{summary['decode_tok_per_s'] or 0:.1f} tok/s"
+                  + (f" | {summary['failed']} failed" if summary["failed"] else ""))
+            if show_connect:
+                _print_connect({**summary, **connect_summary(results)})
+            print()
+        flag_cliffs(series, threshold)
+
+    print_context_table([step["summary"] for step in steps])
+    flagged = [step["summary"] for step in steps if step["summary"]["cliffs"]]
+    for s in flagged:
+        print(f"  Cliff at {s['input_tokens']:,} tok, concurrency {s['concurrency']}: "
+              f"{'; '.join(s['cliffs'])}")
+    if flagged:
+        print("  (see the /metrics table for preemptions and KV-cache usage at those steps)")
+    print()
+    return steps
+
+
+# Server state we sample, by vLLM metric name (V1 names first, then V0 aliases).
+SERVER_GAUGES = {
+    "running": ("vllm:num_requests_running",),
+    "waiting": ("vllm:num_requests_waiting",),
+    "kv_usage": ("vllm:kv_cache_usage_perc", "vllm:gpu_cache_usage_perc"),
+}
+SERVER_COUNTERS = {
+    "preemptions": ("vllm:num_preemptions_total", "vllm:num_preemptions"),
+    "generation_tokens": ("vllm:generation_tokens_total", "vllm:generation_tokens"),
+    "prompt_tokens": ("vllm:prompt_tokens_total", "vllm:prompt_tokens"),
+}
+
+
+def _pick(metrics: dict[str, float], names: Sequence[str]) -> float | None:
+    for name in names:
+        if name in metrics:
+            return metrics[name]
+    return None
+
+
+class MetricsSampler:
+    """Background thread polling /metrics into a timeline of server-state samples.
+
+    Uses its own connection so scrapes never compete with benchmark requests
+    for pooled sockets. Samples are stamped with time.perf_counter(), the same
+    clock as each request's `sent_at`.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: list[dict] = []
+        self._pool = ConnectionPool(HOST, PORT)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-sampler", daemon=True)
+
+    def start(self) -> "MetricsSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+        self._pool.close()
+
+    def sample(self) -> None:
+        metrics = scrape_metrics(timeout=max(self.interval, 1), pool=self._pool)
+        if metrics is None:
+            return
+        sample = {"t": time.perf_counter()}
+        for key, names in (SERVER_GAUGES | SERVER_COUNTERS).items():
+            sample[key] = _pick(metrics, names)
+        self.samples.append(sample)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            self.sample()
+            self._stop.wait(max(0.0, self.interval - (time.perf_counter() - started)))
+
+
+def _window(samples: Sequence[dict], t0: float, t1: float) -> list[dict]:
+    """Samples inside [t0, t1] plus the nearest one on each side, so short windows aren't empty."""
+    before = [s for s in samples if s["t"] < t0][-1:]
+    inside = [s for s in samples if t0 <= s["t"] <= t1]
+    after = [s for s in samples if s["t"] > t1][:1]
+    return before + inside + after
+
+
+def _counter_delta(window: Sequence[dict], key: str) -> float | None:
+    values = [s[key] for s in window if s[key] is not None]
+    return values[-1] - values[0] if len(values) >= 2 else None
+
+
+def attribute_ttft(r: dict, samples: Sequence[dict]) -> str | None:
+    """Best guess at what dominated a request's TTFT: preemption, queueing or prefill."""
+    if r.get("sent_at") is None or r.get("ttft_ms") is None:
+        return None
+    window = _window(samples, r["sent_at"], r["sent_at"] + r["ttft_ms"] / 1000)
+    if len(window) < 2:
+        return None
+    if (_counter_delta(window, "preemptions") or 0) > 0:
+        return "preemption"
+    if max((s["waiting"] or 0) for s in window) > 0:
+        return "queueing"
+    return "prefill"
+
+
+def server_step_summary(requests: Sequence[dict], samples: Sequence[dict]) -> dict | None:
+    """Server-side state over one step, and per-request TTFT attribution (annotates requests)."""
+    requests = [r for r in requests if r.get("sent_at") is not None]
+    if not requests or not samples:
+        return None
+    t0 = min(r["sent_at"] for r in requests)
+    t1 = max(r["sent_at"] + r["total_s"] for r in requests)
+    window = _window(samples, t0, t1)
+    causes = {"queueing": 0, "preemption": 0, "prefill": 0}
+    for r in requests:
+        r["ttft_cause"] = attribute_ttft(r, samples)
+        if r["ttft_cause"]:
+            causes[r["ttft_cause"]] += 1
+
+    def peak(key):
+        values = [s[key] for s in window if s[key] is not None]
+        return max(values) if values else None
+
+    generated = _counter_delta(window, "generation_tokens")
+    span = window[-1]["t"] - window[0]["t"]
+    return {
+        "samples": len(window),
+        "running_max": peak("running"),
+        "waiting_max": peak("waiting"),
+        "kv_usage_max": peak("kv_usage"),
+        "preemptions": _counter_delta(window, "preemptions"),
+        "server_gen_tok_per_s": round(generated / span, 1) if generated is not None and span > 0 else None,
+        "ttft_causes": causes,
+    }
+
+
+def print_server_attribution(steps: Sequence[dict]) -> None:
+    rows = [(step["label"], step["server"]) for step in steps if step.get("server")]
+    if not rows:
+        return
+    print(f"{'=' * 86}")
+    print("  Server-side (/metrics) — TTFT attribution per step")
+    print(f"  {'Step':<20} {'Run max':>7} {'Wait max':>8} {'KV max':>7} {'Preempt':>7} "
+          f"{'Gen tok/s':>9}  {'Queue/Preempt/Prefill':>21}")
+    print(f"  {'-' * 20} {'-' * 7} {'-' * 8} {'-' * 7} {'-' * 7} {'-' * 9}  {'-' * 21}")
+
+    def num(value, fmt):
+        return format(value, fmt) if value is not None else "-"
+
+    for label, server in rows:
+        causes = server["ttft_causes"]
+        print(f"  {label:<20} {num(server['running_max'], '.0f'):>7} {num(server['waiting_max'], '.0f'):>8} "
+              f"{num(server['kv_usage_max'], '.1%'):>7} {num(server['preemptions'], '.0f'):>7} "
+              f"{num(server['server_gen_tok_per_s'], '.1f'):>9}  "
+              f"{causes['queueing']:>7}/{causes['preemption']}/{causes['prefill']}")
+    print()
+
+
+def synthetic_sse(events: int) -> bytes:
+    """A vLLM-shaped SSE body: half reasoning deltas, half content, then usage."""
+    lines = []
+    for i in range(events):
+        key = "reasoning_content" if i < events // 2 else "content"
+        chunk = {
+            "id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 0,
+            "model": MODEL,
+            "choices": [{"index": 0, "delta": {key: f" tok{i}"}, "logprobs": None,
+                         "finish_reason": None}],
+        }
+        lines.append(f"data: {json.dumps(chunk)}\n\n")
+    usage = {"choices": [], "usage": {"prompt_tokens": 16, "completion_tokens": events}}
+    lines.append(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n")
+    return "".join(lines).encode()
+
+
+def bench_parser(events: int, read_size: int) -> dict:
+    """Time SSEParser + StreamState over an in-memory stream fed in `read_size` slices."""
+    data = synthetic_sse(events)
+    start = time.perf_counter()
+    parser = SSEParser()
+    stream = StreamState(start)
+    for offset in range(0, len(data), read_size):
+        for payload in parser.feed(data[offset:offset + read_size]):
+            stream.add(payload, time.perf_counter())
+    elapsed = time.perf_counter() - start
+    parsed = stream.reasoning_chunks + stream.output_chunks
+    return {
+        "events": parsed,
+        "decoder": json_loads.__module__,
+        "read_size": read_size,
+        "elapsed_s": round(elapsed, 4),
+        "us_per_token": round(elapsed / parsed * 1e6, 2),
+        "max_tok_per_s": round(parsed / elapsed),
+    }
+
+
+def run_parser_bench(events: int, read_sizes: Sequence[int]) -> list[dict]:
+    print(f"\n{'=' * 65}")
+    print(f"  SSE client overhead — {events:,} synthetic deltas")
+    print(f"  (decoder: {json_loads.__module__}; one process, no network)")
+    print(f"{'=' * 65}\n")
+    print(f"  {'Read size':>10} {'µs/token':>9} {'Max tok/s':>11}")
+    print(f"  {'-' * 10} {'-' * 9} {'-' * 11}")
+    results = []
+    for read_size in read_sizes:
+        r = bench_parser(events, read_size)
+        results.append(r)
+        print(f"  {read_size:>9}B {r['us_per_token']:>9.2f} {r['max_tok_per_s']:>11,}")
+    print("\n  If a load sweep's aggregate tok/s approaches Max tok/s, the client is the bottleneck.\n")
+    return results
+
+
+# Per-request fields that are bulky or textual and stay out of saved results.
+UNSAVED_FIELDS = ("timeline", "timeline_phase", "reasoning_preview", "output_preview")
+
+
+def host_info() -> dict:
+    return {
+        "hostname": socket.gethostname(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def server_info() -> dict:
+    """What the server reports about itself (vLLM serves /version and /v1/models)."""
+    version = get_json("/version") or {}
+    models = (get_json("/v1/models") or {}).get("data", [])
+    return {
+        "host": HOST,
+        "port": PORT,
+        "version": version.get("version"),
+        "models": [
+            {key: m.get(key) for key in ("id", "root", "max_model_len")} for m in models
+        ],
+    }
+
+
+def save_run(path: Path, args: argparse.Namespace, steps: Sequence[dict]) -> None:
+    """Write one run (metadata + per-step summaries + per-request metrics) as JSON."""
+    doc = {
+        "format": 1,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "mode": args.command,
+        "model": MODEL,
+        "args": {k: v for k, v in vars(args).items() if k not in ("save", "timeline_out")},
+        "server": server_info(),
+        "client": host_info(),
+        "steps": [
+            {
+                "label": step["label"],
+                "summary": step["summary"],
+                "server": step.get("server"),
+                "histograms": step.get("histograms"),
+                "requests": [
+                    {k: v for k, v in r.items() if k not in UNSAVED_FIELDS} for r in step["requests"]
+                ],
+            }
+            for step in steps
+        ],
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w") as f:
+        json.dump(doc, f, indent=1, default=str)
+        f.write("\n")
+    print(f"  Saved results to {path}\n")
+
+
+def mann_whitney_p(a: Sequence[float], b: Sequence[float]) -> float | None:
+    """Two-sided Mann-Whitney U p-value (normal approximation, tie-corrected).
+
+    Distribution-free, so it is safe for skewed latency samples. None when
+    either side has fewer than two samples.
+    """
+    n1, n2 = len(a), len(b)
+    if n1 < 2 or n2 < 2:
+        return None
+    pooled = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    n = n1 + n2
+    rank_sum_a = 0.0
+    tie_term = 0
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        avg_rank = (i + j) / 2 + 1
+        rank_sum_a += avg_rank * sum(1 for k in range(i, j + 1) if pooled[k][1] == 0)
+        ties = j - i + 1
+        tie_term += ties ** 3 - ties
+        i = j + 1
+    u = rank_sum_a - n1 * (n1 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (abs(u - mean) - 0.5) / math.sqrt(variance)
+    return min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
+
+
+# (per-request field, label, True if lower is better)
+COMPARE_METRICS = (("ttft_ms", "TTFT ms", True), ("overall_tps", "tok/s", False))
+# What a sharded step's merged histograms can stand in for (no per-request tok/s there).
+HISTOGRAM_COMPARE_METRICS = (("ttft_ms", "TTFT ms", True), ("tpot_ms", "TPOT ms", True),
+                             ("e2e_ms", "E2E ms", True))
+
+
+def _step_median(step: dict, key: str) -> float | None:
+    """Median of a saved step's metric, from its requests or else its merged histogram."""
+    values = [r[key] for r in step["requests"] if r.get(key)]
+    if values:
+        return percentile(values, 50)
+    doc = (step.get("histograms") or {}).get(key)
+    return LatencyHistogram.from_dict(doc).percentile(50) if doc else None
+
+
+def compare_runs(baseline: dict, candidate: dict, threshold_pct: float, alpha: float) -> list[dict]:
+    """Per-step, per-metric median change between two saved runs.
+
+    A regression must be both worse than `threshold_pct` and significant at `alpha`.
+    Sharded steps carry histograms rather than requests; their medians come from those
+    and, with no samples to rank, crossing the threshold alone makes them a regression.
+    """
+    candidate_steps = {step["label"]: step for step in candidate["steps"]}
+    rows = []
+    for base_step in baseline["steps"]:
+        cand_step = candidate_steps.get(base_step["label"])
+        if cand_step is None:
+            continue
+        per_request = bool(base_step["requests"] and cand_step["requests"])
+        for key, name, lower_is_better in COMPARE_METRICS if per_request else HISTOGRAM_COMPARE_METRICS:
+            if per_request:
+                a = [r[key] for r in base_step["requests"] if r.get(key)]
+                b = [r[key] for r in cand_step["requests"] if r.get(key)]
+                if not a or not b:
+                    continue
+                base_median = percentile(a, 50)
+                cand_median = percentile(b, 50)
+                p_value = mann_whitney_p(a, b)
+            else:
+                base_median = _step_median(base_step, key)
+                cand_median = _step_median(cand_step, key)
+                if base_median is None or cand_median is None:
+                    continue
+                p_value = None
+            change = (cand_median - base_median) / base_median * 100 if base_median else 0.0
+            worse = change > threshold_pct if lower_is_better else change < -threshold_pct
+            better = change < -threshold_pct if lower_is_better else change > threshold_pct
+            significant = p_value is not None and p_value < alpha
+            status = "ok"
+            if not per_request:
+                # Without a test, a gate that only trusted significance would pass anything.
+                if worse:
+                    status = "REGRESSION (untested)"
+                elif better:
+                    status = "improved (untested)"
+            elif worse:
+                status = "REGRESSION" if significant else "worse (n.s.)"
+            elif better:
+                status = "improved" if significant else "better (n.s.)"
+            rows.append({
+                "step": base_step["label"],
+                "metric": name,
+                "baseline": round(base_median, 1),
+                "candidate": round(cand_median, 1),
+                "change_pct": round(change, 1),
+                "p_value": round(p_value, 4) if p_value is not None else None,
+                "regression": status.startswith("REGRESSION"),
+                "status": status,
+                "tested": per_request,
+            })
+    return rows
+
+
+def run_compare(baseline_path: Path, candidate_path: Path, threshold_pct: float, alpha: float) -> int:
+    baseline = json.loads(baseline_path.read_text())
+    candidate = json.loads(candidate_path.read_text())
+
+    print(f"\n{'=' * 80}")
+    print(f"  Compare {baseline_path.name} ({baseline['model']}, vLLM {baseline['server'].get('version')})")
+    print(f"       -> {candidate_path.name} ({candidate['model']}, vLLM {candidate['server'].get('version')})")
+    print(f"  (regression: > {threshold_pct:g}% worse median and Mann-Whitney p < {alpha:g})")
+    print(f"{'=' * 80}\n")
+    if baseline["mode"] != candidate["mode"]:
+        print(f"  warning: comparing a '{baseline['mode']}' run with a '{candidate['mode']}' run\n")
+
+    rows = compare_runs(baseline, candidate, threshold_pct, alpha)
+    if not rows:
+        print("  No common steps to compare.\n")
+        return 1
+    print(f"  {'Step':<24} {'Metric':<8} {'Base':>9} {'New':>9} {'Change':>8} {'p':>7}  Status")
+    print(f"  {'-' * 24} {'-' * 8} {'-' * 9} {'-' * 9} {'-' * 8} {'-' * 7}  {'-' * 12}")
+    for row in rows:
+        p_value = f"{row['p_value']:.3f}" if row["p_value"] is not None else "-"
+        print(f"  {row['step']:<24} {row['metric']:<8} {row['baseline']:>9,.1f} "
+              f"{row['candidate']:>9,.1f} {row['change_pct']:>+7.1f}% {p_value:>7}  {row['status']}")
+    regressions = sum(row["regression"] for row in rows)
+    if not all(row["tested"] for row in rows):
+        print("\n  Sharded runs carry histograms only: without per-request samples no significance")
+        print(f"  test is possible, so any median more than {threshold_pct:g}% worse counts as a regression.")
+    print(f"\n  {regressions} regression(s)\n")
+    return 1 if regressions else 0
+
+
+def float_list(value: str) -> list[float]:
+    try:
+        rates = [float(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated numbers, got {value!r}")
+    if not rates or any(rate <= 0 for rate in rates):
+        raise argparse.ArgumentTypeError("values must be positive")
+    return rates
+
+
+def int_list(value: str) -> list[int]:
+    try:
+        levels = [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {value!r}")
+    if not levels or any(level < 1 for level in levels):
+        raise argparse.ArgumentTypeError("values must be positive integers")
+    return levels
+
+
+def is_local_host(host: str) -> bool:
+    """True for names that mean "this machine", which differs on every worker host."""
+    if host.lower() == "localhost" or host.lower().endswith(".localhost"):
+        return True
+    try:
+        ip = ipaddress.ip_address(host.strip("[]"))
+    except ValueError:
+        return False
+    return ip.is_loopback or ip.is_unspecified
+
+
+def address(value: str, default_host: str | None = None) -> tuple[str, int]:
+    host, sep, port = value.rpartition(":")
+    if not sep and default_host is not None:
+        host = default_host
+    try:
+        if not host:
+            raise ValueError
+        return host, int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected HOST:PORT, got {value!r}")
+
+
+def address_list(value: str) -> list[tuple[str, int]]:
+    return [address(part.strip()) for part in value.split(",") if part.strip()]
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark a vLLM OpenAI-compatible server")
+    commands = parser.add_subparsers(dest="command")
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--host", default=HOST, help=f"server host (default: {HOST})")
+    common.add_argument("--port", type=int, default=PORT, help=f"server port (default: {PORT})")
+    common.add_argument("--model", default=MODEL, help=f"model name (default: {MODEL})")
+    common.add_argument("--workload", type=Path, default=None, metavar="FILE",
+                        help="workload spec (.yaml/.json) or prompt dataset (.jsonl/.txt)")
+    common.add_argument("--timeline-out", type=Path, default=None, metavar="FILE",
+                        help="write per-delta token timelines as JSONL for plotting")
+    common.add_argument("--show-connect", action="store_true",
+                        help="report TCP connect time separately from server time")
+    common.add_argument("--no-keepalive", action="store_true",
+                        help="open a new connection per request instead of pooling")
+    common.add_argument("--save", type=Path, default=None, metavar="FILE",
+                        help="save run metadata and per-request metrics as JSON")
+    common.add_argument("--metrics-interval", type=float, default=1.0, metavar="SEC",
+                        help="poll the server's /metrics this often during the run; 0 disables (default: 1)")
+    common.add_argument("--metrics-out", type=Path, default=None, metavar="FILE",
+                        help="write the /metrics samples as JSONL")
+
+    sharding = argparse.ArgumentParser(add_help=False)
+    sharding.add_argument("--processes", type=int, default=0, metavar="N",
+                          help="shard each level across N local client processes")
+    sharding.add_argument("--workers", type=address_list, default=[], metavar="HOST:PORT,...",
+                          help="also shard across `vllm-bench.py worker --listen` hosts "
+                               "(repeat an address for several processes there)")
+    sharding.add_argument("--worker-token", default=os.environ.get(TOKEN_ENV), metavar="TOKEN",
+                          help=f"shared secret the --workers expect (default: ${TOKEN_ENV})")
+
+    run = commands.add_parser("run", parents=[common], help="sequential single-stream tests (default)")
+    run.add_argument("-n", "--requests", type=int, default=None,
+                     help="prompts to run from --workload (default: 5)")
+
+    load = commands.add_parser("load", parents=[common, sharding], help="closed-loop concurrency sweep")
+    load.add_argument("-c", "--concurrency", type=int_list, default=[1, 2, 4, 8, 16],
+                      help="comma-separated in-flight stream counts (default: 1,2,4,8,16)")
+    load.add_argument("-n", "--requests", type=int, default=32,
+                      help="total requests per concurrency level (default: 32)")
+
+    rate = commands.add_parser("rate", parents=[common, sharding], help="open-loop arrival-rate sweep")
+    rate.add_argument("-q", "--qps", type=float_list, default=[0.5, 1, 2, 4],
+                      help="comma-separated target request rates (default: 0.5,1,2,4)")
+    rate.add_argument("-n", "--requests", type=int, default=32,
+                      help="requests fired per rate (default: 32)")
+    rate.add_argument("--arrival", choices=("poisson", "fixed"), default="poisson",
+                      help="inter-arrival distribution (default: poisson)")
+    rate.add_argument("--seed", type=int, default=None,
+                      help="seed for reproducible Poisson schedules")
+
+    slo = commands.add_parser("slo", parents=[common],
+                              help="search for the highest load that still meets latency SLOs")
+    slo.add_argument("--ttft-ms", type=float, default=None,
+                     help="TTFT limit at --percentile, in ms (e.g. 2000)")
+    slo.add_argument("--itl-ms", type=float, default=None,
+                     help="inter-token latency limit at --percentile, in ms (e.g. 100)")
+    slo.add_argument("--percentile", type=float, default=99,
+                     help="percentile the limits apply to (default: 99)")
+    slo.add_argument("--by", choices=("concurrency", "rate"), default="concurrency",
+                     help="search closed-loop concurrency or open-loop request rate (default: concurrency)")
+    slo.add_argument("--low", type=float, default=None,
+                     help="lowest load to probe (default: 1 stream / 0.25 req/s)")
+    slo.add_argument("--high", type=float, default=None,
+                     help="highest load to probe (default: 256 streams / 64 req/s)")
+    slo.add_argument("-n", "--requests", type=int, default=32,
+                     help="requests per probe; concurrency probes send at least 2x the level, "
+                          "rate probes at least --min-seconds of arrivals (default: 32)")
+    slo.add_argument("--min-seconds", type=float, default=10.0,
+                     help="shortest schedule a rate probe runs, in seconds (default: 10)")
+    slo.add_argument("--max-error-rate", type=float, default=0.0,
+                     help="fraction of failed requests a passing probe may have (default: 0)")
+    slo.add_argument("--tolerance", type=float, default=0.05,
+                     help="stop a rate search once the bracket is within this fraction (default: 0.05)")
+    slo.add_argument("--arrival", choices=("poisson", "fixed"), default="poisson",
+                     help="inter-arrival distribution for --by rate (default: poisson)")
+    slo.add_argument("--seed", type=int, default=None,
+                     help="seed for reproducible Poisson schedules")
+
+    parser_bench = commands.add_parser("parser-bench",
+                                       help="measure client-side SSE parsing overhead per token")
+    parser_bench.add_argument("-n", "--events", type=int, default=200_000,
+                              help="synthetic deltas to parse (default: 200000)")
+    parser_bench.add_argument("--read-sizes", type=int_list, default=[256, 4096, 65536],
+                              help="comma-separated socket read sizes in bytes (default: 256,4096,65536)")
+
+    prefix = commands.add_parser("prefix-cache", parents=[common],
+                                 help="measure automatic prefix caching (cold vs warm TTFT)")
+    prefix.add_argument("--families", type=int, default=4,
+                        help="distinct shared prefixes (default: 4)")
+    prefix.add_argument("--variants", type=int, default=5,
+                        help="requests per prefix; the first is cold (default: 5)")
+    prefix.add_argument("--prefix-tokens", type=int, default=2000,
+                        help="approximate shared prefix length (default: 2000)")
+    prefix.add_argument("--suffix-tokens", type=int, default=32,
+                        help="approximate per-request suffix length (default: 32)")
+    prefix.add_argument("--max-tokens", type=int, default=16,
+                        help="output budget; keep small to isolate prefill (default: 16)")
+    prefix.add_argument("--seed", type=int, default=None)
+
+    worker = commands.add_parser("worker", help="serve load shards for a coordinating load/rate run")
+    mode = worker.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--listen", type=functools.partial(address, default_host="127.0.0.1"),
+                      metavar="[HOST:]PORT",
+                      help="accept coordinators over TCP; binds 127.0.0.1 unless HOST is given")
+    mode.add_argument("--stdio", action="store_true", help="speak the shard protocol on stdin/stdout")
+    worker.add_argument("--token", default=os.environ.get(TOKEN_ENV),
+                        help=f"shared secret coordinators must present (default: ${TOKEN_ENV}); "
+                             "required with --listen")
+
+    context = commands.add_parser("long-context", parents=[common],
+                                  help="sweep input length up to the context limit (prefill scaling)")
+    context.add_argument("--min-tokens", type=int, default=1024,
+                         help="shortest input length (default: 1024)")
+    context.add_argument("--max-input", type=int, default=None,
+                         help="context size to sweep up to (default: the server's max_model_len)")
+    context.add_argument("--factor", type=float, default=2.0,
+                         help="growth factor between input lengths (default: 2)")
+    context.add_argument("-c", "--concurrency", type=int_list, default=[1],
+                         help="comma-separated concurrency levels to repeat the sweep at (default: 1)")
+    context.add_argument("-n", "--requests", type=int, default=3,
+                         help="requests per length and level, at least the concurrency (default: 3)")
+    context.add_argument("--max-tokens", type=int, default=128,
+                         help="output budget for measuring decode speed (default: 128)")
+    context.add_argument("--cliff", type=float, default=0.3,
+                         help="flag a length where prefill or decode tok/s falls by more than "
+                              "this fraction from the previous one (default: 0.3)")
+    context.add_argument("--seed", type=int, default=None)
+
+    compare = commands.add_parser("compare", help="diff two saved runs and flag regressions")
+    compare.add_argument("baseline", type=Path)
+    compare.add_argument("candidate", type=Path)
+    compare.add_argument("--threshold", type=float, default=5.0,
+                         help="percent change in median that counts as a regression (default: 5)")
+    compare.add_argument("--alpha", type=float, default=0.05,
+                         help="significance level for the Mann-Whitney U test (default: 0.05)")
+
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or (argv[0].startswith("-") and argv[0] not in ("-h", "--help")):
+        argv.insert(0, "run")
+    args = parser.parse_args(argv)
+    if args.command in ("load", "rate", "slo") and args.requests < 1:
+        commands.choices[args.command].error("--requests must be at least 1")
+    if args.command == "prefix-cache" and args.variants < 2:
+        prefix.error("--variants must be at least 2 (one cold request plus warm siblings)")
+    if getattr(args, "processes", 0) or getattr(args, "workers", None):
+        if args.processes < 0:
+            parser.error("--processes must not be negative")
+        if args.timeline_out:
+            parser.error("--timeline-out needs per-request results; it cannot be combined with sharding")
+        if args.workers and not args.worker_token:
+            parser.error(f"--workers needs --worker-token (or ${TOKEN_ENV})")
+        if args.workers and is_local_host(args.host):
+            parser.error(f"remote --workers connect to --host themselves, and {args.host!r} would "
+                         "point each at its own machine; give the server's address")
+    if args.command == "worker" and args.listen and not args.token:
+        worker.error(f"--listen needs a shared --token (or ${TOKEN_ENV}); jobs name the host to load")
+    if args.command == "long-context" and (args.factor <= 1 or args.min_tokens < 1):
+        context.error("need --factor > 1 and a positive --min-tokens")
+    if args.command == "slo":
+        if args.ttft_ms is None and args.itl_ms is None:
+            slo.error("give at least one of --ttft-ms or --itl-ms")
+        if not 0 < args.percentile <= 100:
+            slo.error("--percentile must be in (0, 100]")
+        concurrency = args.by == "concurrency"
+        if args.low is None:
+            args.low = 1 if concurrency else 0.25
+        if args.high is None:
+            args.high = 256 if concurrency else 64
+        if concurrency:
+            args.low, args.high = int(args.low), int(args.high)
+        if not 0 < args.low <= args.high:
+            slo.error("need 0 < --low <= --high (and at least 1 stream for --by concurrency)")
+    return args
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    global HOST, PORT, MODEL, KEEPALIVE
+    args = parse_args(argv)
+    if args.command == "parser-bench":
+        run_parser_bench(args.events, args.read_sizes)
+        return 0
+    if args.command == "compare":
+        return run_compare(args.baseline, args.candidate, args.threshold, args.alpha)
+    if args.command == "worker":
+        return run_worker(args.listen, args.token)
+    HOST, PORT, MODEL = args.host, args.port, args.model
+    KEEPALIVE = not args.no_keepalive
+    workload = load_workload(args.workload) if args.workload else None
+    reporting = {"show_connect": args.show_connect}
+    shards = []
+    if args.command in ("load", "rate"):
+        shards = open_shards(args.processes, args.workers, args.worker_token)
+    sampler = MetricsSampler(args.metrics_interval).start() if args.metrics_interval > 0 else None
+    with (args.timeline_out.open("w") if args.timeline_out else contextlib.nullcontext()) as timeline_out, \
+            contextlib.ExitStack() as cleanup:
+        cleanup.callback(close_shards, shards)
+        reporting["timeline_out"] = timeline_out
+        if args.command == "load":
+            steps = run_load_sweep(args.concurrency, args.requests, workload=workload,
+                                   shards=shards, **reporting)
+        elif args.command == "rate":
+            steps = run_rate_sweep(args.qps, args.requests, args.arrival, args.seed,
+                                   workload=workload, shards=shards, **reporting)
+        elif args.command == "slo":
+            steps = run_slo_search(args.by, args.low, args.high, args.requests,
+                                   ttft_ms=args.ttft_ms, itl_ms=args.itl_ms, pct=args.percentile,
+                                   max_error_rate=args.max_error_rate, tolerance=args.tolerance,
+                                   arrival=args.arrival, seed=args.seed,
+                                   min_seconds=args.min_seconds, workload=workload, **reporting)
+        elif args.command == "long-context":
+            steps = run_long_context(args.min_tokens, args.max_input, args.factor, args.concurrency,
+                                     args.requests, args.max_tokens, args.cliff, args.seed,
+                                     **reporting)
+        elif args.command == "prefix-cache":
+            steps = run_prefix_cache(args.families, args.variants, args.prefix_tokens,
+                                     args.suffix_tokens, args.max_tokens, args.seed, **reporting)
+        elif workload is not None:
+            steps = run_sequential(jobs=workload.take(args.requests or 5), **reporting)
+        else:
+            steps = run_sequential(jobs=TESTS[:args.requests], **reporting)
+    if sampler is not None:
+        sampler.stop()
+        for step in steps:
+            step["server"] = server_step_summary(step["requests"], sampler.samples)
+        print_server_attribution(steps)
+        if args.metrics_out:
+            with args.metrics_out.open("w") as f:
+                for sample in sampler.samples:
+                    f.write(json.dumps(sample) + "\n")
+    if args.save:
+        save_run(args.save, args, steps)
+    if args.command == "slo" and not any(step["summary"]["slo"]["passed"] for step in steps):
+        return 1
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+
+import argparse
+import http.client
+import io
+import json
+import math
+import struct
+import sys
+import threading
+import time
+import wave
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib import parse
+
+from run_server import ASR_MODEL, TTS_MODEL, multipart_body
+
+
+TTS_TEXTS = (
+    "Hello there.",
+    "The quick brown fox jumps over the lazy dog while the kettle comes to a boil.",
+    "Speech synthesis latency matters most for the first chunk of audio, because that is "
+    "when a listener decides whether the assistant is responsive or still thinking about it.",
+)
+ASR_SAMPLE_RATE = 16000
+FAKE_TTS_SAMPLE_RATE = 24000
+FAKE_SECONDS_PER_WORD = 0.3
+FAKE_CHUNK_SECONDS = 0.1
+
+
+def tone_wav(seconds: float, sample_rate: int = ASR_SAMPLE_RATE, frequency: float = 220.0) -> bytes:
+    frames = int(seconds * sample_rate)
+    samples = (
+        int(8000 * math.sin(2 * math.pi * frequency * index / sample_rate)) for index in range(frames)
+    )
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(struct.pack(f"<{frames}h", *samples))
+    return buffer.getvalue()
+
+
+def wav_duration(data: bytes) -> float | None:
+    """Seconds of PCM audio in a WAV byte string, counting the bytes actually present.
+
+    Streamed WAVs often carry placeholder sizes in their headers, so the
+    length comes from what follows the data chunk header rather than from it.
+    """
+    fmt = data.find(b"fmt ")
+    start = data.find(b"data")
+    if not data.startswith(b"RIFF") or fmt < 0 or start < 0:
+        return None
+    channels, sample_rate = struct.unpack_from("<HI", data, fmt + 10)
+    bits_per_sample = struct.unpack_from("<H", data, fmt + 22)[0]
+    bytes_per_second = sample_rate * channels * bits_per_sample // 8
+    return max(0, len(data) - (start + 8)) / bytes_per_second if bytes_per_second else None
+
+
+def audio_started(data: bytes) -> bool:
+    """Whether a response prefix holds samples, not just the WAV headers streamed ahead of them.
+
+    Bodies that are not WAV count as audio from their first byte.
+    """
+    if len(data) < 4:
+        return bool(data) and not b"RIFF".startswith(data)
+    if not data.startswith(b"RIFF"):
+        return True
+    start = data.find(b"data", 12)
+    return start >= 0 and len(data) > start + 8
+
+
+def synthesize(host: str, port: int, text: str, timeout: float) -> dict:
+    """POST one synthesis and time the first audio samples and the complete response."""
+    body = json.dumps({"model": TTS_MODEL, "input": text, "response_format": "wav"})
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        started = time.perf_counter()
+        connection.request("POST", "/v1/audio/speech", body, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        if response.status != 200:
+            raise RuntimeError(f"speech returned HTTP {response.status}: {response.read()[:200]!r}")
+        chunks = []
+        head = b""
+        first_audio_s = None
+        while chunk := response.read1(65536):
+            chunks.append(chunk)
+            if first_audio_s is None:
+                # Servers flush the WAV header up front; TTFA waits for samples behind it.
+                head += chunk
+                if audio_started(head):
+                    first_audio_s = time.perf_counter() - started
+        total_s = time.perf_counter() - started
+    finally:
+        connection.close()
+
+    audio = b"".join(chunks)
+    audio_s = wav_duration(audio)
+    return {
+        "text_chars": len(text),
+        "ttfa_s": first_audio_s,
+        "total_s": total_s,
+        "audio_bytes": len(audio),
+        "audio_s": audio_s,
+        "rtf": total_s / audio_s if audio_s else None,
+    }
+
+
+def transcribe(host: str, port: int, audio: bytes, timeout: float) -> dict:
+    body, content_type = multipart_body(
+        {"model": ASR_MODEL},
+        {"file": ("benchmark.wav", audio, "audio/wav")},
+    )
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        started = time.perf_counter()
+        connection.request("POST", "/v1/audio/transcriptions", body, {"Content-Type": content_type})
+        response = connection.getresponse()
+        payload = response.read()
+        latency_s = time.perf_counter() - started
+    finally:
+        connection.close()
+    if response.status != 200:
+        raise RuntimeError(f"transcription returned HTTP {response.status}: {payload[:200]!r}")
+
+    audio_s = wav_duration(audio)
+    return {
+        "audio_s": audio_s,
+        "latency_s": latency_s,
+        "rtf": latency_s / audio_s if audio_s else None,
+    }
+
+
+def run_level(
+    task: Callable[[int], dict], requests: int, concurrency: int
+) -> tuple[list[dict], list[str], float]:
+    """Run `requests` calls of task(index) with `concurrency` in flight; (results, errors, wall s)."""
+    results: list[dict] = []
+    errors: list[str] = []
+    lock = threading.Lock()
+
+    def one(index: int) -> None:
+        try:
+            result = task(index)
+        except (OSError, http.client.HTTPException, RuntimeError) as exc:
+            with lock:
+                errors.append(str(exc))
+            return
+        with lock:
+            results.append(result)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return results, errors, time.perf_counter() - started
+
+
+def percentile(values: Sequence[float], pct: float) -> float | None:
+    ordered = sorted(value for value in values if value is not None)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * pct / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize_tts(results: Sequence[dict], errors: Sequence[str], wall_s: float, concurrency: int) -> dict:
+    return {
+        "mode": "tts",
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(errors),
+        "ttfa_p50_ms": _ms(percentile([r["ttfa_s"] for r in results], 50)),
+        "ttfa_p90_ms": _ms(percentile([r["ttfa_s"] for r in results], 90)),
+        "rtf_p50": _round(percentile([r["rtf"] for r in results], 50), 3),
+        "rtf_p90": _round(percentile([r["rtf"] for r in results], 90), 3),
+        "audio_kb_per_s": round(sum(r["audio_bytes"] for r in results) / 1024 / wall_s, 1),
+        "audio_s_per_s": round(sum(r["audio_s"] or 0 for r in results) / wall_s, 2),
+    }
+
+
+def summarize_asr(results: Sequence[dict], errors: Sequence[str], wall_s: float, concurrency: int) -> dict:
+    by_duration: dict[float, list[dict]] = {}
+    for result in results:
+        by_duration.setdefault(round(result["audio_s"], 2), []).append(result)
+    return {
+        "mode": "asr",
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(errors),
+        "audio_s_per_s": round(sum(r["audio_s"] for r in results) / wall_s, 2),
+        "by_duration": [
+            {
+                "audio_s": audio_s,
+                "requests": len(group),
+                "latency_p50_ms": _ms(percentile([r["latency_s"] for r in group], 50)),
+                "latency_p90_ms": _ms(percentile([r["latency_s"] for r in group], 90)),
+                "rtf_p50": _round(percentile([r["rtf"] for r in group], 50), 3),
+            }
+            for audio_s, group in sorted(by_duration.items())
+        ],
+    }
+
+
+def _ms(seconds: float | None) -> float | None:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def _round(value: float | None, digits: int) -> float | None:
+    return round(value, digits) if value is not None else None
+
+
+def _cell(value, width: int) -> str:
+    return f"{'-' if value is None else value:>{width}}"
+
+
+def print_tts(summaries: Sequence[dict]) -> None:
+    print("TTS  (TTFA = time to first audio samples, RTF = synthesis time / audio duration)")
+    print(f"  {'Conc':>4} {'Reqs':>5} {'Err':>4} {'TTFA p50':>9} {'p90':>7} {'RTF p50':>8} "
+          f"{'p90':>6} {'Audio KB/s':>10} {'Audio s/s':>9}")
+    for s in summaries:
+        print(f"  {s['concurrency']:>4} {s['requests']:>5} {s['errors']:>4} {_cell(s['ttfa_p50_ms'], 7)}ms "
+              f"{_cell(s['ttfa_p90_ms'], 7)} {_cell(s['rtf_p50'], 8)} {_cell(s['rtf_p90'], 6)} "
+              f"{s['audio_kb_per_s']:>10} {s['audio_s_per_s']:>9}")
+    print()
+
+
+def print_asr(summaries: Sequence[dict]) -> None:
+    print("ASR  (latency vs audio duration; RTF = latency / audio duration)")
+    print(f"  {'Conc':>4} {'Audio s':>7} {'Reqs':>5} {'Latency p50':>11} {'p90':>7} {'RTF p50':>8}")
+    for s in summaries:
+        for row in s["by_duration"]:
+            print(f"  {s['concurrency']:>4} {row['audio_s']:>7} {row['requests']:>5} "
+                  f"{_cell(row['latency_p50_ms'], 9)}ms {_cell(row['latency_p90_ms'], 7)} "
+                  f"{_cell(row['rtf_p50'], 8)}")
+        if s["errors"]:
+            print(f"  {s['concurrency']:>4} {s['errors']} failed requests")
+    print()
+
+
+class FakeVibeVoiceHandler(BaseHTTPRequestHandler):
+    """Stands in for mlx_audio.server: paced WAV streaming and duration-proportional ASR."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_args):
+        pass
+
+    def do_GET(self):
+        self.send_json({"object": "list", "data": [{"id": TTS_MODEL}, {"id": ASR_MODEL}]})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = parse.urlsplit(self.path).path
+        if path == "/v1/audio/speech":
+            self.stream_speech(json.loads(body)["input"])
+        elif path == "/v1/audio/transcriptions":
+            audio = body[body.find(b"RIFF"):]
+            time.sleep((wav_duration(audio) or 0) * self.server.asr_rtf)
+            self.send_json({"text": "fake transcription"})
+        else:
+            self.send_json({"detail": "not found"}, status=404)
+
+    def stream_speech(self, text: str) -> None:
+        frames = int(len(text.split()) * FAKE_SECONDS_PER_WORD * FAKE_TTS_SAMPLE_RATE)
+        header = io.BytesIO()
+        with wave.open(header, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(FAKE_TTS_SAMPLE_RATE)
+            wav.writeframes(b"")
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        # Like the real server, the header goes out before any audio is generated.
+        self.write_chunk(header.getvalue())
+        chunk_frames = int(FAKE_CHUNK_SECONDS * FAKE_TTS_SAMPLE_RATE)
+        for offset in range(0, frames, chunk_frames):
+            count = min(chunk_frames, frames - offset)
+            time.sleep(count / FAKE_TTS_SAMPLE_RATE * self.server.tts_rtf)
+            self.write_chunk(b"\x00\x00" * count)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, payload: bytes) -> None:
+        self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+        self.wfile.flush()
+
+    def send_json(self, document: dict, status: int = 200) -> None:
+        payload = json.dumps(document).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_fake_server(tts_rtf: float, asr_rtf: float) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeVibeVoiceHandler)
+    server.daemon_threads = True
+    server.tts_rtf = tts_rtf
+    server.asr_rtf = asr_rtf
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    return server
+
+
+def benchmark(
+    host: str,
+    port: int,
+    *,
+    modes: Sequence[str],
+    concurrency: Sequence[int],
+    requests: int,
+    asr_seconds: Sequence[float],
+    timeout: float,
+) -> list[dict]:
+    summaries = []
+    clips = [tone_wav(seconds) for seconds in asr_seconds]
+    for level in concurrency:
+        if "tts" in modes:
+            results, errors, wall_s = run_level(
+                lambda index: synthesize(host, port, TTS_TEXTS[index % len(TTS_TEXTS)], timeout),
+                requests,
+                level,
+            )
+            summaries.append(summarize_tts(results, errors, wall_s, level))
+        if "asr" in modes:
+            results, errors, wall_s = run_level(
+                lambda index: transcribe(host, port, clips[index % len(clips)], timeout),
+                requests,
+                level,
+            )
+            summaries.append(summarize_asr(results, errors, wall_s, level))
+    return summaries
+
+
+def int_list(value: str) -> list[int]:
+    try:
+        values = [int(part) for part in value.split(",") if part]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {value!r}")
+    if not values or any(number < 1 for number in values):
+        raise argparse.ArgumentTypeError("values must be positive integers")
+    return values
+
+
+def float_list(value: str) -> list[float]:
+    try:
+        values = [float(part) for part in value.split(",") if part]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated numbers, got {value!r}")
+    if not values or any(not number > 0 for number in values):
+        raise argparse.ArgumentTypeError("values must be positive")
+    return values
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the local VibeVoice TTS/ASR API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7781)
+    parser.add_argument("--mode", choices=("tts", "asr", "both"), default="both")
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int_list,
+        default=[1, 4],
+        help="comma-separated requests in flight to sweep (default: 1,4)",
+    )
+    parser.add_argument(
+        "-n", "--requests", type=int, default=12, help="requests per concurrency level and mode"
+    )
+    parser.add_argument(
+        "--asr-seconds",
+        type=float_list,
+        default=[2.0, 5.0, 10.0],
+        help="comma-separated clip lengths to transcribe (default: 2,5,10)",
+    )
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--json", type=Path, help="also write the summaries as JSON")
+    parser.add_argument(
+        "--fake",
+        action="store_true",
+        help="benchmark an in-process fake server instead of --host/--port (for CI)",
+    )
+    parser.add_argument(
+        "--fake-rtf",
+        type=float,
+        default=0.1,
+        help="real-time factor the fake server simulates for both models (default: 0.1)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = parse_args(argv)
+    host, port = args.host, args.port
+    fake = None
+    if args.fake:
+        fake = start_fake_server(args.fake_rtf, args.fake_rtf)
+        host, port = "127.0.0.1", fake.server_port
+    try:
+        summaries = benchmark(
+            host,
+            port,
+            modes=("tts", "asr") if args.mode == "both" else (args.mode,),
+            concurrency=args.concurrency,
+            requests=args.requests,
+            asr_seconds=args.asr_seconds,
+            timeout=args.timeout,
+        )
+    finally:
+        if fake is not None:
+            fake.shutdown()
+            fake.server_close()
+
+    print(f"VibeVoice benchmark against {'fake server' if fake else f'{host}:{port}'}\n")
+    tts = [summary for summary in summaries if summary["mode"] == "tts"]
+    asr = [summary for summary in summaries if summary["mode"] == "asr"]
+    if tts:
+        print_tts(tts)
+    if asr:
+        print_asr(asr)
+    if args.json:
+        args.json.write_text(json.dumps(summaries, indent=2) + "\n")
+    failed = sum(summary["errors"] for summary in summaries)
+    if failed:
+        print(f"{failed} requests failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,653 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from urllib import parse
+
+
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "upgrade",
+}
+MAX_HEAD_BYTES = 64 * 1024
+RELAY_CHUNK_BYTES = 64 * 1024
+MULTIPART_MODEL = re.compile(rb'name="model"\r\n(?:[^\r\n]+\r\n)*\r\n([^\r\n]*)\r\n')
+SPEECH_PATH = "/v1/audio/speech"
+
+
+@dataclass(eq=False)
+class Backend:
+    host: str
+    port: int
+    models: tuple[str, ...]
+    outstanding: int = 0
+    served: int = 0
+    available: bool = True
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+
+@dataclass(frozen=True)
+class CachedClip:
+    content_type: str
+    audio: bytes | mmap.mmap
+
+
+class TtsCache:
+    """Synthesized audio keyed on the full speech request (model, text, voice, parameters).
+
+    A bounded in-memory LRU sits in front of an optional directory of clips
+    that are served memory-mapped; both tiers evict least recently used
+    entries by total size. Disk recency is kept in file mtimes, so it
+    survives restarts. A clip too big for memory is still served from
+    memory while its disk write is in flight.
+    """
+
+    def __init__(self, memory_bytes: int, disk_dir: Path | None = None, disk_bytes: int = 0):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self.memory: OrderedDict[str, CachedClip] = OrderedDict()
+        self.memory_used = 0
+        self.disk: OrderedDict[str, int] = OrderedDict()
+        self.disk_used = 0
+        self.pending: dict[str, CachedClip] = {}
+        self.counters = dict.fromkeys(
+            ("memory_hits", "disk_hits", "misses", "stores", "evictions"), 0
+        )
+        self.lock = threading.Lock()
+        if disk_dir is not None:
+            disk_dir.mkdir(parents=True, exist_ok=True)
+            # Writes cut short by a crash or a failed persist() never got renamed into place.
+            for stray in disk_dir.glob("*.tmp"):
+                stray.unlink(missing_ok=True)
+            clips = sorted(disk_dir.glob("*.audio"), key=lambda path: path.stat().st_mtime_ns)
+            for path in clips:
+                size = path.stat().st_size
+                self.disk[path.stem] = size
+                self.disk_used += size
+            self._evict_disk()
+
+    @staticmethod
+    def key(body: bytes) -> str | None:
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return None
+        if not isinstance(request, dict) or not isinstance(request.get("input"), str):
+            return None
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key: str) -> tuple[str, CachedClip] | None:
+        with self.lock:
+            clip = self.memory.get(key)
+            if clip is not None:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return "memory", clip
+            clip = self.pending.get(key)
+            if clip is not None:
+                self.counters["memory_hits"] += 1
+                return "memory", clip
+            if key in self.disk:
+                clip = self._read_disk(key)
+                if clip is not None:
+                    self.disk.move_to_end(key)
+                    self.counters["disk_hits"] += 1
+                    if len(clip.audio) <= self.memory_bytes:
+                        self._remember(key, CachedClip(clip.content_type, bytes(clip.audio)))
+                    return "disk", clip
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, key: str, content_type: str, audio: bytes) -> None:
+        self.remember(key, content_type, audio)
+        self.persist(key, content_type, audio)
+
+    def remember(self, key: str, content_type: str, audio: bytes) -> None:
+        """Make the clip servable at once; cheap enough for the event loop.
+
+        It goes in the memory tier, or, if that cannot hold it, stays pending
+        until persist() has it on disk.
+        """
+        if not audio:
+            return
+        clip = CachedClip(content_type, audio)
+        with self.lock:
+            if self._remember(key, clip):
+                self.counters["stores"] += 1
+            elif self._fits_disk(audio):
+                self.pending[key] = clip
+
+    def persist(self, key: str, content_type: str, audio: bytes) -> None:
+        """Write the clip to the disk tier; blocking file I/O, done outside the lock."""
+        if not audio or not self._fits_disk(audio):
+            return
+        path = self.disk_dir / f"{key}.audio"
+        temporary = path.with_name(f"{key}.{threading.get_ident()}.tmp")
+        try:
+            temporary.write_bytes(audio)
+            (self.disk_dir / f"{key}.type").write_text(content_type)
+            temporary.replace(path)
+        except OSError as exc:
+            # The client already has its audio; a full or read-only cache disk is not its problem.
+            temporary.unlink(missing_ok=True)
+            with self.lock:
+                self.pending.pop(key, None)
+            print(f"TTS cache: could not store {key[:12]}: {exc}", file=sys.stderr)
+            return
+        with self.lock:
+            # Only clips the memory tier refused are counted here, so none counts twice.
+            if self.pending.pop(key, None) is not None:
+                self.counters["stores"] += 1
+            self.disk_used += len(audio) - self.disk.pop(key, 0)
+            self.disk[key] = len(audio)
+            self._evict_disk()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                **self.counters,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_used,
+                "disk_entries": len(self.disk),
+                "disk_bytes": self.disk_used,
+            }
+
+    def _fits_disk(self, audio: bytes) -> bool:
+        return self.disk_dir is not None and len(audio) <= self.disk_bytes
+
+    def _remember(self, key: str, clip: CachedClip) -> bool:
+        size = len(clip.audio)
+        if size > self.memory_bytes:
+            return False
+        previous = self.memory.pop(key, None)
+        if previous is not None:
+            self.memory_used -= len(previous.audio)
+        self.memory[key] = clip
+        self.memory_used += size
+        while self.memory_used > self.memory_bytes:
+            _key, evicted = self.memory.popitem(last=False)
+            self.memory_used -= len(evicted.audio)
+            self.counters["evictions"] += 1
+        return True
+
+    def _read_disk(self, key: str) -> CachedClip | None:
+        path = self.disk_dir / f"{key}.audio"
+        try:
+            content_type = (self.disk_dir / f"{key}.type").read_text()
+            with path.open("rb") as file:
+                audio = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(path)
+        except (OSError, ValueError):
+            self._forget_disk(key)
+            return None
+        return CachedClip(content_type, audio)
+
+    def _evict_disk(self) -> None:
+        while self.disk_used > self.disk_bytes and self.disk:
+            key = next(iter(self.disk))
+            self._forget_disk(key)
+            self.counters["evictions"] += 1
+
+    def _forget_disk(self, key: str) -> None:
+        self.disk_used -= self.disk.pop(key, 0)
+        for suffix in (".audio", ".type"):
+            (self.disk_dir / f"{key}{suffix}").unlink(missing_ok=True)
+
+
+class ProxyError(Exception):
+    def __init__(self, status: int, reason: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+
+def header(headers: Sequence[tuple[str, str]], name: str) -> str | None:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+async def read_head(reader: asyncio.StreamReader) -> tuple[str, list[tuple[str, str]]] | None:
+    """Read a request or status line plus headers; None on a clean EOF between messages."""
+    try:
+        raw = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as exc:
+        if exc.partial:
+            raise ConnectionError("connection closed mid-headers") from exc
+        return None
+    except asyncio.LimitOverrunError as exc:
+        raise ProxyError(431, "Request Header Fields Too Large", "headers too large") from exc
+    start_line, *lines = raw.decode("latin-1").split("\r\n")
+    headers = []
+    for line in lines:
+        if line:
+            name, _, value = line.partition(":")
+            headers.append((name.strip(), value.strip()))
+    return start_line, headers
+
+
+def request_model(target: str, headers: Sequence[tuple[str, str]], body: bytes) -> str | None:
+    """The model a request is for: JSON or form `model`, or a `model_name` query (preloads)."""
+    query = parse.parse_qs(parse.urlsplit(target).query)
+    for name in ("model_name", "model"):
+        if query.get(name):
+            return query[name][0]
+    content_type = (header(headers, "content-type") or "").lower()
+    if content_type.startswith("application/json"):
+        try:
+            document = json.loads(body)
+        except ValueError:
+            return None
+        model = document.get("model") if isinstance(document, dict) else None
+        return model if isinstance(model, str) else None
+    if content_type.startswith("multipart/form-data"):
+        match = MULTIPART_MODEL.search(body)
+        return match.group(1).decode() if match else None
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        form = parse.parse_qs(body.decode("latin-1"))
+        return form["model"][0] if form.get("model") else None
+    return None
+
+
+def wants_keep_alive(version: str, headers: Sequence[tuple[str, str]]) -> bool:
+    connection = (header(headers, "connection") or "").lower()
+    if version == "HTTP/1.0":
+        return connection == "keep-alive"
+    return connection != "close"
+
+
+class FrontProxy:
+    """HTTP/1.1 reverse proxy: route by model, then to the backend with the fewest requests in flight."""
+
+    def __init__(self, backends: Sequence[Backend], cache: TtsCache | None = None):
+        self.backends = list(backends)
+        self.cache = cache
+
+    def choose(self, model: str | None) -> Backend:
+        available = [backend for backend in self.backends if backend.available]
+        serving = [backend for backend in available if model in backend.models]
+        # Models no worker preloaded can still be loaded on demand by any of them.
+        candidates = serving or available
+        if not candidates:
+            raise ProxyError(503, "Service Unavailable", f"no backend available for {model}")
+        return min(candidates, key=lambda backend: (backend.outstanding, backend.served))
+
+    def status(self) -> dict:
+        return {
+            "backends": [
+                {
+                    "address": backend.address,
+                    "models": list(backend.models),
+                    "available": backend.available,
+                    "outstanding": backend.outstanding,
+                    "served": backend.served,
+                }
+                for backend in self.backends
+            ],
+            "tts_cache": self.cache.stats() if self.cache else None,
+        }
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while await self.handle_one(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_one(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        try:
+            head = await read_head(reader)
+            if head is None:
+                return False
+            start_line, headers = head
+            method, target, version = start_line.split(" ", 2)
+            keep_alive = wants_keep_alive(version, headers)
+            if "chunked" in (header(headers, "transfer-encoding") or "").lower():
+                raise ProxyError(411, "Length Required", "chunked request bodies are not supported")
+            if (header(headers, "expect") or "").lower() == "100-continue":
+                # The body is buffered here, so the client gets its go-ahead from us.
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                await writer.drain()
+            body = await reader.readexactly(int(header(headers, "content-length") or 0))
+
+            if target == "/proxy/status":
+                await self.respond(writer, 200, "OK", self.status(), keep_alive)
+                return keep_alive
+
+            cache_key = None
+            if self.cache and method == "POST" and parse.urlsplit(target).path == SPEECH_PATH:
+                cache_key = TtsCache.key(body)
+            if cache_key:
+                cached = await asyncio.to_thread(self.cache.get, cache_key)
+                if cached:
+                    tier, clip = cached
+                    await self.send_clip(writer, clip, f"hit-{tier}", keep_alive)
+                    return keep_alive
+
+            backend = self.choose(request_model(target, headers, body))
+            backend.outstanding += 1
+            capture = {"chunks": []} if cache_key else None
+            try:
+                keep_alive = await self.forward(
+                    backend, method, target, headers, body, writer, keep_alive, capture
+                )
+            finally:
+                backend.outstanding -= 1
+                backend.served += 1
+            if capture and capture.get("status") == 200 and capture.get("complete"):
+                audio = b"".join(capture["chunks"])
+                # Remember before yielding to the loop: a repeat sent as soon as the
+                # client has this response must already find it.
+                self.cache.remember(cache_key, capture["content_type"], audio)
+                await asyncio.to_thread(self.cache.persist, cache_key, capture["content_type"], audio)
+            return keep_alive
+        except ProxyError as exc:
+            await self.respond(writer, exc.status, exc.reason, {"detail": str(exc)}, False)
+            return False
+        except ValueError:
+            await self.respond(writer, 400, "Bad Request", {"detail": "malformed request"}, False)
+            return False
+
+    async def send_clip(
+        self,
+        writer: asyncio.StreamWriter,
+        clip: CachedClip,
+        cache_status: str,
+        keep_alive: bool,
+    ) -> None:
+        writer.write(
+            "HTTP/1.1 200 OK\r\n"
+            f"Content-Type: {clip.content_type}\r\n"
+            f"Content-Length: {len(clip.audio)}\r\n"
+            f"X-Cache: {cache_status}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+        )
+        try:
+            for offset in range(0, len(clip.audio), RELAY_CHUNK_BYTES):
+                # Slicing copies: the transport may still hold a chunk after drain()
+                # returns, and a memoryview into the mmap would stop it closing.
+                writer.write(clip.audio[offset:offset + RELAY_CHUNK_BYTES])
+                await writer.drain()
+        finally:
+            if isinstance(clip.audio, mmap.mmap):
+                clip.audio.close()
+
+    async def respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        reason: str,
+        document: dict,
+        keep_alive: bool,
+    ) -> None:
+        payload = json.dumps(document).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+            + payload
+        )
+        await writer.drain()
+
+    async def forward(
+        self,
+        backend: Backend,
+        method: str,
+        target: str,
+        headers: Sequence[tuple[str, str]],
+        body: bytes,
+        writer: asyncio.StreamWriter,
+        keep_alive: bool,
+        capture: dict | None = None,
+    ) -> bool:
+        """Relay one request to a backend; `capture` collects the response body for caching."""
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(
+                backend.host, backend.port, limit=MAX_HEAD_BYTES
+            )
+        except OSError as exc:
+            raise ProxyError(502, "Bad Gateway", f"{backend.address}: {exc}") from exc
+
+        try:
+            forwarded = [
+                (name, value)
+                for name, value in headers
+                if name.lower() not in HOP_BY_HOP_HEADERS | {"content-length", "expect"}
+            ]
+            lines = [f"{method} {target} HTTP/1.1"]
+            lines += [f"{name}: {value}" for name, value in forwarded]
+            lines += [f"Content-Length: {len(body)}", "Connection: close", "", ""]
+            upstream_writer.write("\r\n".join(lines).encode("latin-1") + body)
+            await upstream_writer.drain()
+
+            while True:
+                head = await read_head(upstream_reader)
+                if head is None:
+                    raise ProxyError(502, "Bad Gateway", f"{backend.address} closed without a response")
+                status_line, response_headers = head
+                status = int(status_line.split(" ", 2)[1])
+                # Interim 1xx responses (e.g. 100 Continue) precede the real one.
+                if not 100 <= status < 200 or status == 101:
+                    break
+            chunked = "chunked" in (header(response_headers, "transfer-encoding") or "").lower()
+            length = header(response_headers, "content-length")
+            bodyless = method == "HEAD" or status in (204, 304) or 100 <= status < 200
+            if not (chunked or length is not None or bodyless):
+                keep_alive = False  # body ends at EOF, so the client connection must too
+
+            lines = [status_line]
+            lines += [
+                f"{name}: {value}"
+                for name, value in response_headers
+                if name.lower() not in HOP_BY_HOP_HEADERS
+            ]
+            if capture is not None:
+                lines.append("X-Cache: miss")
+                capture["status"] = status
+                capture["content_type"] = header(response_headers, "content-type") or "audio/wav"
+            lines += [f"Connection: {'keep-alive' if keep_alive else 'close'}", "", ""]
+            writer.write("\r\n".join(lines).encode("latin-1"))
+
+            sink = capture["chunks"] if capture is not None else None
+            if bodyless:
+                pass
+            elif chunked:
+                await relay_chunked(upstream_reader, writer, sink)
+            elif length is not None:
+                await relay_length(upstream_reader, writer, int(length), sink)
+            else:
+                await relay_until_eof(upstream_reader, writer, sink)
+            await writer.drain()
+            if capture is not None:
+                capture["complete"] = True
+            return keep_alive
+        finally:
+            upstream_writer.close()
+
+
+async def relay_chunked(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    sink: list[bytes] | None = None,
+) -> None:
+    # Chunks are passed on as they arrive so streamed audio keeps its timing.
+    while True:
+        size_line = await reader.readline()
+        if not size_line:
+            raise ConnectionError("backend closed mid-body")
+        writer.write(size_line)
+        size = int(size_line.split(b";", 1)[0], 16)
+        if size == 0:
+            while True:
+                trailer = await reader.readline()
+                writer.write(trailer)
+                if trailer in (b"\r\n", b""):
+                    return
+        data = await reader.readexactly(size + 2)
+        writer.write(data)
+        if sink is not None:
+            sink.append(data[:-2])
+        await writer.drain()
+
+
+async def relay_length(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    length: int,
+    sink: list[bytes] | None = None,
+) -> None:
+    while length:
+        data = await reader.read(min(length, RELAY_CHUNK_BYTES))
+        if not data:
+            raise ConnectionError("backend closed mid-body")
+        writer.write(data)
+        if sink is not None:
+            sink.append(data)
+        await writer.drain()
+        length -= len(data)
+
+
+async def relay_until_eof(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    sink: list[bytes] | None = None,
+) -> None:
+    while data := await reader.read(RELAY_CHUNK_BYTES):
+        writer.write(data)
+        if sink is not None:
+            sink.append(data)
+        await writer.drain()
+
+
+class ProxyServer:
+    """Runs a FrontProxy on its own event loop thread so a synchronous supervisor can own it."""
+
+    def __init__(self, proxy: FrontProxy, host: str, port: int):
+        self.proxy = proxy
+        self.host = host
+        self.port = port
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="front-proxy", daemon=True)
+        self.server: asyncio.Server | None = None
+
+    def start(self) -> "ProxyServer":
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.proxy.handle, self.host, self.port, limit=MAX_HEAD_BYTES),
+            self.loop,
+        ).result()
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    def stop(self) -> None:
+        async def close() -> None:
+            self.server.close()
+            await self.server.wait_closed()
+
+        if self.server is not None:
+            asyncio.run_coroutine_threadsafe(close(), self.loop).result(timeout=10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+def parse_backend(value: str) -> Backend:
+    address, _, models = value.partition("=")
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise argparse.ArgumentTypeError(f"expected HOST:PORT[=MODEL,...], got {value!r}")
+    return Backend(host, int(port), tuple(model for model in models.split(",") if model))
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--tts-cache-mb",
+        type=float,
+        default=0,
+        help="cache synthesized speech in memory up to this many MB (default: 0, off)",
+    )
+    parser.add_argument(
+        "--tts-cache-dir",
+        type=Path,
+        help="also keep synthesized speech on disk here, served memory-mapped",
+    )
+    parser.add_argument(
+        "--tts-cache-disk-mb",
+        type=float,
+        default=1024,
+        help="size limit for --tts-cache-dir (default: 1024)",
+    )
+
+
+def cache_from_args(args: argparse.Namespace) -> TtsCache | None:
+    if not args.tts_cache_mb and args.tts_cache_dir is None:
+        return None
+    return TtsCache(
+        int(args.tts_cache_mb * 1024 * 1024),
+        args.tts_cache_dir,
+        int(args.tts_cache_disk_mb * 1024 * 1024),
+    )
+
+
+def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Route VibeVoice API requests across local workers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7781)
+    parser.add_argument(
+        "--backend",
+        type=parse_backend,
+        action="append",
+        required=True,
+        help="worker as HOST:PORT[=MODEL,...]; repeat for each worker",
+    )
+    add_cache_arguments(parser)
+    return parser.parse_args(argv)
+
+
+async def serve(
+    host: str, port: int, backends: Sequence[Backend], cache: TtsCache | None = None
+) -> None:
+    proxy = FrontProxy(backends, cache)
+    server = await asyncio.start_server(proxy.handle, host, port, limit=MAX_HEAD_BYTES)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = parse_args(argv)
+    if args.host != "127.0.0.1":
+        print("Refusing non-loopback bind; use Tailscale Serve for remote access", file=sys.stderr)
+        return 2
+    try:
+        asyncio.run(serve(args.host, args.port, args.backend, cache_from_args(args)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
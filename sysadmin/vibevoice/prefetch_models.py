@@ -1,10 +1,19 @@
 #!/usr/bin/env python3
 
 import argparse
+import hashlib
+import json
+import os
+import sys
+import tarfile
+import threading
+import time
 from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
+from fnmatch import fnmatch
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO
 
 
 @dataclass(frozen=True)
@@ -46,49 +55,440 @@ MODELS = (
 )
 
 
+DEFAULT_JOBS = 2
+DEFAULT_RETRIES = 3
+RETRY_DELAY_SECONDS = 2.0
+MANIFEST_DIR = "vibevoice-manifests"
+BLOB_STORE_DIR = "vibevoice-blobs"
+HASH_JOBS = min(8, os.cpu_count() or 1)
+
+
+def repo_folder(repo_id: str) -> str:
+    return "models--" + repo_id.replace("/", "--")
+
+
+def snapshot_dir(cache_dir: Path, model: ModelSpec) -> Path:
+    return cache_dir / repo_folder(model.repo_id) / "snapshots" / model.sha
+
+
+def manifest_path(cache_dir: Path, model: ModelSpec) -> Path:
+    return cache_dir / MANIFEST_DIR / f"{repo_folder(model.repo_id)}@{model.sha}.json"
+
+
+def snapshot_files(snapshot_path: Path) -> dict[str, Path]:
+    return {
+        path.relative_to(snapshot_path).as_posix(): path
+        for path in sorted(snapshot_path.rglob("*"))
+        if path.is_file()
+    }
+
+
+def sha256_file(path: Path) -> str:
+    with path.open("rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def hash_files(paths: Sequence[Path]) -> list[str]:
+    # hashlib releases the GIL while digesting, so threads hash files in parallel.
+    with ThreadPoolExecutor(max_workers=HASH_JOBS) as pool:
+        return list(pool.map(sha256_file, paths))
+
+
+def write_manifest(cache_dir: Path, model: ModelSpec) -> dict[str, Any]:
+    files = snapshot_files(snapshot_dir(cache_dir, model))
+    paths = list(files.values())
+    entries = {}
+    for name, path, digest in zip(files, paths, hash_files(paths)):
+        stat = path.stat()
+        entries[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+    manifest = {"repo_id": model.repo_id, "sha": model.sha, "files": entries}
+    target = manifest_path(cache_dir, model)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temporary = target.with_suffix(".tmp")
+    temporary.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+    temporary.replace(target)
+    return manifest
+
+
+def verify_model(cache_dir: Path, model: ModelSpec, *, rehash: bool = False) -> list[str]:
+    """Compare a cached snapshot against its manifest without touching the network.
+
+    Files whose size and mtime still match the manifest are trusted unless
+    `rehash` is set; the rest are hashed again. Returns a list of problems.
+    """
+    try:
+        manifest = json.loads(manifest_path(cache_dir, model).read_text())
+    except (OSError, ValueError):
+        return ["no manifest"]
+    snapshot_path = snapshot_dir(cache_dir, model)
+    if not snapshot_path.is_dir():
+        return ["snapshot missing"]
+
+    expected = manifest["files"]
+    present = snapshot_files(snapshot_path)
+    problems = [f"missing {name}" for name in expected if name not in present]
+    problems += [f"unexpected {name}" for name in present if name not in expected]
+
+    to_hash = []
+    for name, path in present.items():
+        if name not in expected:
+            continue
+        stat = path.stat()
+        if stat.st_size != expected[name]["size"]:
+            problems.append(f"size mismatch {name}")
+        elif rehash or stat.st_mtime_ns != expected[name]["mtime_ns"]:
+            to_hash.append(name)
+    digests = hash_files([present[name] for name in to_hash])
+    for name, digest in zip(to_hash, digests):
+        if digest != expected[name]["sha256"]:
+            problems.append(f"checksum mismatch {name}")
+
+    if to_hash and not problems:
+        # Content is intact but timestamps moved; refresh them so the next run is fast again.
+        for name in to_hash:
+            expected[name]["mtime_ns"] = present[name].stat().st_mtime_ns
+        manifest_path(cache_dir, model).write_text(
+            json.dumps(manifest, indent=2, sort_keys=True) + "\n"
+        )
+    return problems
+
+
+def verify(
+    cache_dir: Path, models: Sequence[ModelSpec] = MODELS, *, rehash: bool = False
+) -> dict[str, list[str]]:
+    return {model.repo_id: verify_model(cache_dir, model, rehash=rehash) for model in models}
+
+
+def check_revisions(api: Any, models: Sequence[ModelSpec] = MODELS) -> dict[str, Any]:
+    """Resolve main for every model at once; returns each repo's info, with file metadata."""
+    with ThreadPoolExecutor(max_workers=len(models)) as pool:
+        infos = list(
+            pool.map(
+                lambda model: api.model_info(model.repo_id, revision="main", files_metadata=True),
+                models,
+            )
+        )
+    for model, info in zip(models, infos):
+        if info.sha != model.sha:
+            raise RuntimeError(
+                f"revision drift for {model.repo_id}: expected {model.sha}, got {info.sha}"
+            )
+    return {model.repo_id: info for model, info in zip(models, infos)}
+
+
+def expected_blobs(info: Any, model: ModelSpec) -> dict[str, int]:
+    """Blob names (the Hub's etags: LFS sha256 or git blob id) and sizes a download will need."""
+    blobs = {}
+    for sibling in getattr(info, "siblings", None) or ():
+        if model.allow_patterns and not any(
+            fnmatch(sibling.rfilename, pattern) for pattern in model.allow_patterns
+        ):
+            continue
+        lfs = getattr(sibling, "lfs", None)
+        if isinstance(lfs, dict):
+            etag, size = lfs.get("sha256"), lfs.get("size")
+        elif lfs is not None:
+            etag, size = lfs.sha256, lfs.size
+        else:
+            etag, size = sibling.blob_id, sibling.size
+        if etag:
+            blobs[etag] = size or 0
+    return blobs
+
+
+def blob_store(cache_dir: Path) -> Path:
+    return cache_dir / BLOB_STORE_DIR
+
+
+def link_known_blobs(cache_dir: Path, model: ModelSpec, blobs: dict[str, int]) -> int:
+    """Hardlink blobs already in the shared store into this repo; returns the bytes not downloaded.
+
+    huggingface_hub finds the blob already present and only creates the
+    snapshot symlink, so the file is never fetched.
+    """
+    repo_blobs = cache_dir / repo_folder(model.repo_id) / "blobs"
+    skipped = 0
+    for etag, size in blobs.items():
+        stored = blob_store(cache_dir) / etag
+        target = repo_blobs / etag
+        if target.exists() or not stored.exists():
+            continue
+        repo_blobs.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(stored, target)
+        except OSError:
+            continue
+        skipped += size
+    return skipped
+
+
+def deduplicate_blobs(cache_dir: Path, model: ModelSpec) -> int:
+    """Share this snapshot's blobs through the store; returns the bytes freed by hardlinking."""
+    store = blob_store(cache_dir)
+    store.mkdir(parents=True, exist_ok=True)
+    saved = 0
+    for path in snapshot_files(snapshot_dir(cache_dir, model)).values():
+        if not path.is_symlink():
+            continue
+        blob = Path(os.path.realpath(path))
+        stored = store / blob.name
+        try:
+            if not stored.exists():
+                os.link(blob, stored)
+                continue
+            if os.path.samefile(blob, stored) or blob.stat().st_size != stored.stat().st_size:
+                continue
+            temporary = blob.with_name(blob.name + ".dedup")
+            os.link(stored, temporary)
+            temporary.replace(blob)
+        except OSError:
+            continue  # e.g. the store is on another filesystem; keep the copy
+        saved += stored.stat().st_size
+    return saved
+
+
+def download_groups(models: Sequence[ModelSpec], blobs: dict[str, dict[str, int]]) -> list[list[ModelSpec]]:
+    """Chain models that share blobs so the second one finds them in the store instead of racing."""
+    groups: list[tuple[set[str], list[ModelSpec]]] = []
+    for model in models:
+        etags = set(blobs.get(model.repo_id, ()))
+        for group_etags, group in groups:
+            if group_etags & etags:
+                group_etags |= etags
+                group.append(model)
+                break
+        else:
+            groups.append((etags, [model]))
+    return [group for _etags, group in groups]
+
+
+def snapshot_size(snapshot_path: Path) -> int:
+    if not snapshot_path.is_dir():
+        return 0
+    return sum(path.stat().st_size for path in snapshot_path.rglob("*") if path.is_file())
+
+
+def download_model(
+    model: ModelSpec,
+    cache_dir: Path,
+    downloader: Callable[..., str],
+    *,
+    retries: int = DEFAULT_RETRIES,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Path:
+    download_options = {
+        "revision": "main",
+        "cache_dir": str(cache_dir),
+    }
+    if model.allow_patterns:
+        download_options["allow_patterns"] = model.allow_patterns
+    retries = max(1, retries)
+    # huggingface_hub keeps partial blobs as *.incomplete and resumes them, so
+    # retrying after a dropped connection continues rather than starting over.
+    for attempt in range(1, retries + 1):
+        try:
+            snapshot_path = Path(downloader(model.repo_id, **download_options))
+            break
+        except (OSError, TimeoutError) as error:
+            if attempt == retries:
+                raise
+            print(
+                f"Retrying {model.repo_id} ({attempt}/{retries - 1}) after error: {error}",
+                flush=True,
+            )
+            sleep(RETRY_DELAY_SECONDS * attempt)
+    if snapshot_path.name != model.sha:
+        raise RuntimeError(
+            f"downloaded unexpected snapshot for {model.repo_id}: {snapshot_path.name}"
+        )
+    return snapshot_path
+
+
 def prefetch(
     cache_dir: Path,
     *,
     api: Any = None,
     downloader: Callable[..., str] | None = None,
-) -> None:
+    jobs: int = DEFAULT_JOBS,
+    retries: int = DEFAULT_RETRIES,
+) -> dict[str, int]:
+    """Download whatever fails verification; returns bytes saved by the shared blob store."""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    missing = [model for model, problems in zip(MODELS, verify(cache_dir).values()) if problems]
+    if not missing:
+        print(f"All {len(MODELS)} models verified against local manifests", flush=True)
+        return {"skipped": 0, "deduplicated": 0}
+
     if api is None or downloader is None:
         from huggingface_hub import HfApi, snapshot_download
 
         api = api or HfApi()
         downloader = downloader or snapshot_download
 
+    infos = check_revisions(api, missing)
+    blobs = {model.repo_id: expected_blobs(infos[model.repo_id], model) for model in missing}
+    numbers = {model.repo_id: index for index, model in enumerate(missing, 1)}
+    savings = {"skipped": 0, "deduplicated": 0}
+    savings_lock = threading.Lock()
+
+    def fetch(model: ModelSpec) -> None:
+        index = numbers[model.repo_id]
+        started = time.monotonic()
+        skipped = link_known_blobs(cache_dir, model, blobs[model.repo_id])
+        print(f"[{index}/{len(missing)}] Downloading {model.repo_id}@{model.sha}", flush=True)
+        snapshot_path = download_model(model, cache_dir, downloader, retries=retries)
+        deduplicated = deduplicate_blobs(cache_dir, model)
+        write_manifest(cache_dir, model)
+        with savings_lock:
+            savings["skipped"] += skipped
+            savings["deduplicated"] += deduplicated
+        size_mb = snapshot_size(snapshot_path) / 1e6
+        elapsed = time.monotonic() - started
+        print(
+            f"[{index}/{len(missing)}] Finished {model.repo_id} ({size_mb:.1f} MB in {elapsed:.1f}s)",
+            flush=True,
+        )
+
+    def fetch_group(group: list[ModelSpec]) -> None:
+        for model in group:
+            fetch(model)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [pool.submit(fetch_group, group) for group in download_groups(missing, blobs)]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    saved = savings["skipped"] + savings["deduplicated"]
+    print(
+        f"Shared blob store saved {saved / 1e6:.1f} MB "
+        f"({savings['skipped'] / 1e6:.1f} MB of downloads skipped, "
+        f"{savings['deduplicated'] / 1e6:.1f} MB of duplicates hardlinked)",
+        flush=True,
+    )
+    return savings
+
+
+def bundle_members(cache_dir: Path, model: ModelSpec) -> list[Path]:
+    """Cache paths that make up one model: manifest, refs, snapshot links and their blobs."""
+    repo = cache_dir / repo_folder(model.repo_id)
+    members = [manifest_path(cache_dir, model)]
+    if (repo / "refs").is_dir():
+        members += sorted(path for path in (repo / "refs").rglob("*") if path.is_file())
+    blobs = []
+    for path in snapshot_files(snapshot_dir(cache_dir, model)).values():
+        members.append(path)
+        if path.is_symlink():
+            blobs.append(Path(os.path.normpath(path.parent / os.readlink(path))))
+    return members + sorted(set(blobs))
+
+
+def export_bundle(cache_dir: Path, output: BinaryIO, *, compress: bool = False) -> int:
+    """Stream the reviewed models' cache entries into a tar archive; returns the file count.
+
+    Snapshot symlinks are stored as links next to their blobs, so the archive
+    unpacks into a normal huggingface_hub cache. Each model's manifest travels
+    with it and supplies the per-file checksums checked on import.
+    """
+    problems = {repo_id: found for repo_id, found in verify(cache_dir).items() if found}
+    if problems:
+        raise RuntimeError(f"refusing to export unverified models: {', '.join(problems)}")
+
+    count = 0
+    with tarfile.open(fileobj=output, mode="w|gz" if compress else "w|") as archive:
+        for model in MODELS:
+            for path in bundle_members(cache_dir, model):
+                archive.add(path, arcname=path.relative_to(cache_dir).as_posix(), recursive=False)
+                count += 1
+            print(f"Bundled {model.repo_id}@{model.sha}", file=sys.stderr, flush=True)
+    return count
+
+
+def import_bundle(cache_dir: Path, source: BinaryIO) -> dict[str, list[str]]:
+    """Unpack a bundle (compressed or not) into the cache and re-hash every file."""
     cache_dir.mkdir(parents=True, exist_ok=True)
-    for model in MODELS:
-        resolved_sha = api.model_info(model.repo_id, revision="main").sha
-        if resolved_sha != model.sha:
-            raise RuntimeError(
-                f"revision drift for {model.repo_id}: expected {model.sha}, got {resolved_sha}"
-            )
+    with tarfile.open(fileobj=source, mode="r|*") as archive:
+        for member in archive:
+            archive.extract(member, cache_dir, filter="data")
+    return verify(cache_dir, rehash=True)
 
-        print(f"Downloading {model.repo_id}@{model.sha}", flush=True)
-        download_options = {
-            "revision": "main",
-            "cache_dir": str(cache_dir),
-        }
-        if model.allow_patterns:
-            download_options["allow_patterns"] = model.allow_patterns
-        snapshot_path = Path(downloader(model.repo_id, **download_options))
-        if snapshot_path.name != model.sha:
-            raise RuntimeError(
-                f"downloaded unexpected snapshot for {model.repo_id}: {snapshot_path.name}"
-            )
+
+def print_report(results: dict[str, list[str]]) -> bool:
+    failed = False
+    for repo_id, problems in results.items():
+        failed = failed or bool(problems)
+        print(f"{'FAIL' if problems else 'ok  '} {repo_id}", file=sys.stderr, flush=True)
+        for problem in problems:
+            print(f"     {problem}", file=sys.stderr, flush=True)
+    return failed
 
 
 def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Fetch reviewed VibeVoice model revisions")
     parser.add_argument("--cache-dir", type=Path, required=True)
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f"models to download at once (default: {DEFAULT_JOBS})",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--verify",
+        action="store_true",
+        help="check the cache against local manifests without network access, then exit",
+    )
+    mode.add_argument(
+        "--export-bundle",
+        metavar="FILE",
+        help="write the verified models as a tar bundle to FILE ('-' for stdout)",
+    )
+    mode.add_argument(
+        "--import-bundle",
+        metavar="FILE",
+        help="unpack a bundle from FILE ('-' for stdin) into the cache and verify it",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="gzip the exported bundle (imports detect compression automatically)",
+    )
+    parser.add_argument(
+        "--rehash",
+        action="store_true",
+        help="with --verify, hash every file even if its size and mtime are unchanged",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=DEFAULT_RETRIES,
+        help=f"attempts per model; partial files resume (default: {DEFAULT_RETRIES})",
+    )
     return parser.parse_args(argv)
 
 
 def main(argv: Sequence[str] | None = None) -> int:
     args = parse_args(argv)
-    prefetch(args.cache_dir)
+    if args.verify:
+        return 1 if print_report(verify(args.cache_dir, rehash=args.rehash)) else 0
+    if args.export_bundle:
+        if args.export_bundle == "-":
+            export_bundle(args.cache_dir, sys.stdout.buffer, compress=args.compress)
+        else:
+            with open(args.export_bundle, "wb") as output:
+                export_bundle(args.cache_dir, output, compress=args.compress)
+        return 0
+    if args.import_bundle:
+        if args.import_bundle == "-":
+            results = import_bundle(args.cache_dir, sys.stdin.buffer)
+        else:
+            with open(args.import_bundle, "rb") as source:
+                results = import_bundle(args.cache_dir, source)
+        return 1 if print_report(results) else 0
+    prefetch(args.cache_dir, jobs=args.jobs, retries=args.retries)
     return 0
 
 
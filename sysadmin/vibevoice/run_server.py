@@ -1,17 +1,36 @@
 #!/usr/bin/env python3
 
 import argparse
+import http.client
+import io
+import json
+import os
+import queue
+import random
 import signal
 import subprocess
 import sys
 import time
-from collections.abc import Sequence
-from urllib import error, parse, request
+import uuid
+import wave
+import threading
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from urllib import parse, request
+
+import front_proxy
 
 
 TTS_MODEL = "mlx-community/VibeVoice-Realtime-0.5B-fp16"
 ASR_MODEL = "mlx-community/VibeVoice-ASR-bf16"
 MODEL_IDS = (TTS_MODEL, ASR_MODEL)
+WARMUP_TEXT = "VibeVoice is warming up."
+WARMUP_SAMPLE_RATE = 16000
+HEALTH_CHECK_TEXT = "Ok."
 
 
 def build_command(host: str, port: int) -> list[str]:
@@ -28,23 +47,100 @@ def build_command(host: str, port: int) -> list[str]:
     ]
 
 
-def wait_until_ready(base_url: str, child: subprocess.Popen, timeout: float) -> None:
+def log_event(event: str, **fields) -> None:
+    print(json.dumps({"ts": round(time.time(), 3), "event": event, **fields}), flush=True)
+
+
+class StartupTimer:
+    """Startup breakdown: sequential phases via mark(), overlapping ones via measure()."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.started = self.last = clock()
+        self.phases: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def record(self, phase: str, seconds: float) -> None:
+        with self.lock:
+            self.phases[phase] = round(seconds, 3)
+        log_event("startup_phase", phase=phase, seconds=round(seconds, 3))
+
+    def mark(self, phase: str) -> None:
+        now = self.clock()
+        self.record(phase, now - self.last)
+        self.last = now
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        started = self.clock()
+        yield
+        self.record(phase, self.clock() - started)
+
+    def summary(self, **fields) -> dict:
+        return {
+            "total_seconds": round(self.clock() - self.started, 3),
+            "phases": dict(self.phases),
+            **fields,
+        }
+
+
+def backoff_delays(
+    initial: float = 0.05,
+    maximum: float = 2.0,
+    rng: random.Random | None = None,
+) -> Iterator[float]:
+    """Exponential backoff with jitter: each delay is drawn from [d/2, d], d doubling up to maximum."""
+    rng = rng or random.Random()
+    delay = initial
+    while True:
+        yield rng.uniform(delay / 2, delay)
+        delay = min(maximum, delay * 2)
+
+
+def wait_until_ready(
+    base_url: str,
+    child: subprocess.Popen,
+    timeout: float,
+    timer: StartupTimer | None = None,
+    *,
+    sleep: Callable[[float], None] = time.sleep,
+) -> None:
     deadline = time.monotonic() + timeout
     last_error: Exception | None = None
+    target = parse.urlsplit(base_url)
+    # One connection for every probe; it is only re-dialled after an error.
+    connection = http.client.HTTPConnection(target.hostname, target.port, timeout=5)
+    port_open = False
+    delays = backoff_delays()
 
-    while time.monotonic() < deadline:
-        return_code = child.poll()
-        if return_code is not None:
-            raise RuntimeError(f"MLX-Audio exited before readiness with code {return_code}")
+    try:
+        while time.monotonic() < deadline:
+            return_code = child.poll()
+            if return_code is not None:
+                raise RuntimeError(f"MLX-Audio exited before readiness with code {return_code}")
 
-        try:
-            with request.urlopen(f"{base_url}/v1/models", timeout=5) as response:
+            try:
+                if connection.sock is None:
+                    connection.connect()
+                if not port_open:
+                    port_open = True
+                    if timer:
+                        timer.mark("port_open")
+                connection.request("GET", "/v1/models")
+                response = connection.getresponse()
+                response.read()
                 if response.status == 200:
+                    if timer:
+                        timer.mark("http_ready")
                     return
-        except (error.URLError, TimeoutError) as exc:
-            last_error = exc
+                last_error = RuntimeError(f"HTTP {response.status}")
+            except (OSError, http.client.HTTPException) as exc:
+                last_error = exc
+                connection.close()
 
-        time.sleep(0.5)
+            sleep(min(next(delays), max(0.0, deadline - time.monotonic())))
+    finally:
+        connection.close()
 
     detail = f": {last_error}" if last_error else ""
     raise TimeoutError(f"MLX-Audio did not become ready within {timeout:g}s{detail}")
@@ -63,6 +159,175 @@ def preload_model(base_url: str, model_name: str, timeout: float) -> None:
             )
 
 
+READAHEAD_SEGMENT_BYTES = 64 * 1024 * 1024
+READAHEAD_BUFFER_BYTES = 4 * 1024 * 1024
+
+
+def hub_cache_dir() -> Path:
+    if os.environ.get("HF_HUB_CACHE"):
+        return Path(os.environ["HF_HUB_CACHE"]).expanduser()
+    hf_home = os.environ.get("HF_HOME") or Path.home() / ".cache" / "huggingface"
+    return Path(hf_home).expanduser() / "hub"
+
+
+def snapshot_paths(cache_dir: Path, repo_id: str) -> list[Path]:
+    """Files of the snapshot refs/main points at, i.e. what an offline load will read."""
+    repo = cache_dir / ("models--" + repo_id.replace("/", "--"))
+    try:
+        revision = (repo / "refs" / "main").read_text().strip()
+    except OSError:
+        return []
+    return sorted(path.resolve() for path in (repo / "snapshots" / revision).rglob("*") if path.is_file())
+
+
+def read_segment(path: Path, offset: int, length: int, stop: threading.Event) -> int:
+    buffer = memoryview(bytearray(min(READAHEAD_BUFFER_BYTES, length) or 1))
+    done = 0
+    with path.open("rb", buffering=0) as file:
+        file.seek(offset)
+        while done < length and not stop.is_set():
+            count = file.readinto(buffer[: min(len(buffer), length - done)])
+            if not count:
+                break
+            done += count
+    return done
+
+
+def readahead(paths: Sequence[Path], jobs: int, stop: threading.Event | None = None) -> dict:
+    """Read files through once so they land in the OS page cache.
+
+    Files are split into segments so one multi-GB safetensors shard is read by
+    several threads; `jobs` caps how many reads are in flight. Files that are
+    hardlinks of each other (shared blobs) are only read once.
+    """
+    stop = stop or threading.Event()
+    started = time.monotonic()
+    seen: set[tuple[int, int]] = set()
+    segments = []
+    for path in paths:
+        info = path.stat()
+        if (info.st_dev, info.st_ino) in seen:
+            continue
+        seen.add((info.st_dev, info.st_ino))
+        segments.extend(
+            (path, offset, min(READAHEAD_SEGMENT_BYTES, info.st_size - offset))
+            for offset in range(0, info.st_size, READAHEAD_SEGMENT_BYTES)
+        )
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        total = sum(pool.map(lambda segment: read_segment(*segment, stop), segments))
+    return {
+        "files": len(seen),
+        "bytes": total,
+        "seconds": round(time.monotonic() - started, 3),
+        "cancelled": stop.is_set(),
+    }
+
+
+class Readahead:
+    """Page model weights into the OS page cache on a background thread during startup."""
+
+    def __init__(self, models: Sequence[str], jobs: int, cache_dir: Path | None = None):
+        self.models = models
+        self.jobs = jobs
+        self.cache_dir = cache_dir
+        self.stopping = threading.Event()
+        self.result: dict | None = None
+        self.thread = threading.Thread(target=self._run, name="readahead", daemon=True)
+
+    def start(self) -> "Readahead":
+        self.thread.start()
+        return self
+
+    def _run(self) -> None:
+        cache_dir = self.cache_dir or hub_cache_dir()
+        paths = [path for model in self.models for path in snapshot_paths(cache_dir, model)]
+        try:
+            self.result = readahead(paths, self.jobs, self.stopping)
+        except OSError as exc:
+            self.result = {"error": str(exc)}
+            log_event("readahead_failed", error=str(exc))
+            return
+        log_event("readahead", **self.result)
+        print(
+            f"Paged {self.result['bytes'] / 1024 / 1024:.0f} MB of model weights "
+            f"into the page cache in {self.result['seconds']:.1f}s",
+            flush=True,
+        )
+
+    def finish(self) -> dict | None:
+        """Stop reading (the models are loaded by now, or startup failed) and return the stats."""
+        self.stopping.set()
+        self.thread.join()
+        return self.result
+
+
+def silent_wav(seconds: float = 1.0, sample_rate: int = WARMUP_SAMPLE_RATE) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b"\x00\x00" * int(seconds * sample_rate))
+    return buffer.getvalue()
+
+
+def multipart_body(fields: dict[str, str], files: dict[str, tuple[str, bytes, str]]) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, (filename, content, content_type) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n".encode()
+            + content
+            + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def post_for_warmup(url: str, body: bytes, content_type: str, timeout: float) -> bytes:
+    warmup_request = request.Request(
+        url,
+        data=body,
+        headers={"Content-Type": content_type},
+        method="POST",
+    )
+    with request.urlopen(warmup_request, timeout=timeout) as response:
+        if response.status != 200:
+            raise RuntimeError(f"warmup request to {url} returned HTTP {response.status}")
+        return response.read()
+
+
+def warm_up_tts(base_url: str, timeout: float) -> None:
+    body = json.dumps({"model": TTS_MODEL, "input": WARMUP_TEXT, "response_format": "wav"})
+    audio = post_for_warmup(f"{base_url}/v1/audio/speech", body.encode(), "application/json", timeout)
+    if not audio:
+        raise RuntimeError("warmup synthesis returned no audio")
+
+
+def warm_up_asr(base_url: str, timeout: float) -> None:
+    body, content_type = multipart_body(
+        {"model": ASR_MODEL},
+        {"file": ("warmup.wav", silent_wav(), "audio/wav")},
+    )
+    post_for_warmup(f"{base_url}/v1/audio/transcriptions", body, content_type, timeout)
+
+
+WARMUPS = {TTS_MODEL: warm_up_tts, ASR_MODEL: warm_up_asr}
+
+
+def run_concurrently(tasks: dict[str, Callable[[], None]]) -> None:
+    """Run each task on its own thread; re-raise the first failure once all have finished."""
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        futures = [pool.submit(task) for task in tasks.values()]
+    for future in futures:
+        future.result()
+
+
 def forward_signal(child: subprocess.Popen, signum: int) -> None:
     if child.poll() is None:
         child.send_signal(signum)
@@ -80,24 +345,317 @@ def stop_child(child: subprocess.Popen) -> None:
         child.wait(timeout=10)
 
 
-def run(host: str, port: int, startup_timeout: float) -> int:
-    child = subprocess.Popen(build_command(host, port))
+def write_metrics(path: Path, metrics: dict) -> None:
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_text(json.dumps(metrics, indent=2) + "\n")
+    temporary.replace(path)
+
+
+@dataclass(frozen=True)
+class WatchdogConfig:
+    interval: float
+    timeout: float = 60
+    max_latency: float = 20
+    max_rss_mb: float | None = None
+    max_failures: int = 3
+
+
+def check_health(base_url: str, timeout: float, models: Sequence[str] = MODEL_IDS) -> float:
+    """List models, then run a tiny inference on one; returns the round trip in seconds."""
+    started = time.monotonic()
+    with request.urlopen(f"{base_url}/v1/models", timeout=timeout) as response:
+        response.read()
+    if TTS_MODEL in models:
+        body = json.dumps({"model": TTS_MODEL, "input": HEALTH_CHECK_TEXT, "response_format": "wav"})
+        post_for_warmup(f"{base_url}/v1/audio/speech", body.encode(), "application/json", timeout)
+    else:
+        body, content_type = multipart_body(
+            {"model": ASR_MODEL},
+            {"file": ("health.wav", silent_wav(0.25), "audio/wav")},
+        )
+        post_for_warmup(f"{base_url}/v1/audio/transcriptions", body, content_type, timeout)
+    return time.monotonic() - started
+
+
+def child_rss_mb(pid: int) -> float | None:
+    result = subprocess.run(
+        ["ps", "-o", "rss=", "-p", str(pid)],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    try:
+        return int(result.stdout.strip()) / 1024
+    except ValueError:
+        return None
+
+
+def watch(
+    base_url: str,
+    child: subprocess.Popen,
+    config: WatchdogConfig,
+    stopping: threading.Event,
+    *,
+    check: Callable[[str, float], float] = check_health,
+    rss: Callable[[int], float | None] = child_rss_mb,
+) -> str | None:
+    """Health-check a ready server until it exits (None) or needs a restart (the reason)."""
+    failures = 0
+    next_check = time.monotonic() + config.interval
+    while not stopping.wait(max(0.0, min(1.0, next_check - time.monotonic()))):
+        if child.poll() is not None:
+            return None
+        if time.monotonic() < next_check:
+            continue
+        next_check = time.monotonic() + config.interval
+
+        memory = rss(child.pid)
+        try:
+            latency = check(base_url, config.timeout)
+        except Exception as exc:
+            latency = None
+            problem = f"health check failed: {exc}"
+        else:
+            problem = (
+                f"health check took {latency:.1f}s" if latency > config.max_latency else None
+            )
+        log_event(
+            "health",
+            port=parse.urlsplit(base_url).port,
+            latency_seconds=round(latency, 3) if latency is not None else None,
+            rss_mb=round(memory, 1) if memory is not None else None,
+            problem=problem,
+        )
+
+        if config.max_rss_mb and memory is not None and memory > config.max_rss_mb:
+            return f"RSS {memory:.0f} MB over {config.max_rss_mb:g} MB"
+        failures = failures + 1 if problem else 0
+        if failures >= config.max_failures:
+            return f"{failures} consecutive unhealthy checks ({problem})"
+    return None
+
+
+class StartupError(RuntimeError):
+    def __init__(self, message: str, summary: dict):
+        super().__init__(message)
+        self.summary = summary
+
+
+@dataclass(frozen=True)
+class WorkerSpec:
+    port: int
+    models: tuple[str, ...] = MODEL_IDS
+
+
+def worker_specs(
+    port: int, workers: int, split_models: bool = False, proxied: bool = False
+) -> list[WorkerSpec]:
+    """One worker on the public port, or workers on the ports after it behind the front proxy."""
+    if workers <= 1 and not proxied:
+        return [WorkerSpec(port)]
+    return [
+        WorkerSpec(
+            port + 1 + index,
+            (MODEL_IDS[index % len(MODEL_IDS)],) if split_models else MODEL_IDS,
+        )
+        for index in range(max(1, workers))
+    ]
+
+
+def start_worker(
+    host: str,
+    spec: WorkerSpec,
+    startup_timeout: float,
+    warmup: bool,
+    children: dict[int, subprocess.Popen],
+    restarts: int = 0,
+    readahead_jobs: int = 0,
+) -> tuple[subprocess.Popen, dict]:
+    """Spawn one mlx_audio.server and wait until its models are loaded (and warmed).
+
+    With `readahead_jobs`, the model weights are paged in alongside the child's
+    own startup. Returns the child and its startup summary. On failure the child
+    is stopped and a StartupError carrying the partial summary is raised.
+    """
+    timer = StartupTimer()
+    child = subprocess.Popen(build_command(host, spec.port))
+    children[spec.port] = child
+    timer.mark("spawn")
+    page_in = Readahead(spec.models, readahead_jobs).start() if readahead_jobs else None
+    base_url = f"http://{host}:{spec.port}"
+
+    def readahead_fields() -> dict:
+        if page_in is None:
+            return {}
+        stats = page_in.finish()
+        if stats and "seconds" in stats:
+            timer.record("readahead", stats["seconds"])
+        return {"readahead": stats}
+    try:
+        wait_until_ready(base_url, child, startup_timeout, timer)
+
+        def preload(model_name: str) -> None:
+            with timer.measure(f"preload:{model_name}"):
+                preload_model(base_url, model_name, startup_timeout)
+
+        def warm_up(model_name: str) -> None:
+            with timer.measure(f"warmup:{model_name}"):
+                WARMUPS[model_name](base_url, startup_timeout)
+
+        print(f"Preloading {', '.join(spec.models)}", flush=True)
+        run_concurrently({name: lambda name=name: preload(name) for name in spec.models})
+        if warmup:
+            print("Warming up synthesis and transcription", flush=True)
+            run_concurrently({name: lambda name=name: warm_up(name) for name in spec.models})
+    except Exception as exc:
+        summary = timer.summary(
+            ok=False, error=str(exc), port=spec.port, restarts=restarts, **readahead_fields()
+        )
+        log_event("startup_failed", **summary)
+        stop_child(child)
+        raise StartupError(str(exc), summary) from exc
+    summary = timer.summary(ok=True, port=spec.port, restarts=restarts, **readahead_fields())
+    log_event("startup_complete", **summary)
+    return child, summary
+
+
+def run(
+    host: str,
+    port: int,
+    startup_timeout: float,
+    warmup: bool = False,
+    metrics_file: Path | None = None,
+    watchdog: WatchdogConfig | None = None,
+    workers: int = 1,
+    split_models: bool = False,
+    tts_cache: front_proxy.TtsCache | None = None,
+    readahead_jobs: int = 0,
+) -> int:
+    stopping = threading.Event()
+    children: dict[int, subprocess.Popen] = {}
+
+    def handle_signal(received: int, _frame) -> None:
+        stopping.set()
+        for child in list(children.values()):
+            forward_signal(child, received)
 
     for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
-        signal.signal(signum, lambda received, _frame, process=child: forward_signal(process, received))
+        signal.signal(signum, handle_signal)
+
+    specs = worker_specs(port, workers, split_models, proxied=tts_cache is not None)
+    if specs[0].port != port:
+        return run_workers(host, port, specs, startup_timeout, warmup, metrics_file, watchdog,
+                           children, stopping, tts_cache, readahead_jobs)
 
     base_url = f"http://{host}:{port}"
-    try:
-        wait_until_ready(base_url, child, startup_timeout)
-        for model_name in MODEL_IDS:
-            print(f"Preloading {model_name}", flush=True)
-            preload_model(base_url, model_name, startup_timeout)
+    restarts = 0
+    while True:
+        try:
+            child, summary = start_worker(
+                host, specs[0], startup_timeout, warmup, children, restarts, readahead_jobs
+            )
+        except StartupError as exc:
+            print(f"VibeVoice startup failed: {exc}", file=sys.stderr, flush=True)
+            if metrics_file:
+                write_metrics(metrics_file, exc.summary)
+            return 1
+        if metrics_file:
+            write_metrics(metrics_file, summary)
         print(f"VibeVoice ready on {base_url}", flush=True)
-        return child.wait()
-    except Exception as exc:
-        print(f"VibeVoice startup failed: {exc}", file=sys.stderr, flush=True)
+
+        reason = watch(base_url, child, watchdog, stopping) if watchdog else None
+        if reason is None:
+            return child.wait()
+        restarts += 1
+        log_event("watchdog_restart", reason=reason, restarts=restarts)
         stop_child(child)
+
+
+def run_workers(
+    host: str,
+    port: int,
+    specs: Sequence[WorkerSpec],
+    startup_timeout: float,
+    warmup: bool,
+    metrics_file: Path | None,
+    watchdog: WatchdogConfig | None,
+    children: dict[int, subprocess.Popen],
+    stopping: threading.Event,
+    tts_cache: front_proxy.TtsCache | None = None,
+    readahead_jobs: int = 0,
+) -> int:
+    """Start every worker, put the front proxy on the public port, and keep workers alive.
+
+    Each worker gets its own supervising thread that runs the watchdog and
+    restarts it in place; the proxy stops routing to a worker while it
+    restarts. The first worker to exit on its own ends the service.
+    """
+    backends = {spec.port: front_proxy.Backend(host, spec.port, spec.models) for spec in specs}
+    summaries: dict[int, dict] = {}
+
+    def start(spec: WorkerSpec, restarts: int = 0) -> subprocess.Popen:
+        child, summaries[spec.port] = start_worker(
+            host, spec, startup_timeout, warmup, children, restarts, readahead_jobs
+        )
+        return child
+
+    try:
+        run_concurrently({str(spec.port): lambda spec=spec: start(spec) for spec in specs})
+    except StartupError as exc:
+        print(f"VibeVoice startup failed: {exc}", file=sys.stderr, flush=True)
+        for child in children.values():
+            stop_child(child)
+        if metrics_file:
+            write_metrics(
+                metrics_file, {"ok": False, "workers": [*summaries.values(), exc.summary]}
+            )
         return 1
+    if metrics_file:
+        write_metrics(metrics_file, {"ok": True, "workers": list(summaries.values())})
+
+    proxy = front_proxy.ProxyServer(
+        front_proxy.FrontProxy(list(backends.values()), tts_cache), host, port
+    )
+    proxy.start()
+    print(f"VibeVoice ready on http://{host}:{port} ({len(specs)} worker{'s' if len(specs) > 1 else ''})", flush=True)
+
+    exits: queue.Queue[int] = queue.Queue()
+
+    def supervise(spec: WorkerSpec) -> None:
+        base_url = f"http://{host}:{spec.port}"
+        check = partial(check_health, models=spec.models)
+        restarts = 0
+        while True:
+            child = children[spec.port]
+            reason = watch(base_url, child, watchdog, stopping, check=check) if watchdog else None
+            if reason is None:
+                exits.put(child.wait())
+                return
+            restarts += 1
+            log_event("watchdog_restart", reason=reason, port=spec.port, restarts=restarts)
+            backends[spec.port].available = False
+            stop_child(child)
+            try:
+                start(spec, restarts)
+            except StartupError:
+                exits.put(1)
+                return
+            backends[spec.port].available = True
+
+    threads = [
+        threading.Thread(target=supervise, args=(spec,), name=f"worker-{spec.port}", daemon=True)
+        for spec in specs
+    ]
+    for thread in threads:
+        thread.start()
+    return_code = exits.get()
+    stopping.set()
+    for child in list(children.values()):
+        stop_child(child)
+    for thread in threads:
+        thread.join()
+    proxy.stop()
+    return return_code
 
 
 def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
@@ -105,6 +663,64 @@ def parse_args(argv: Sequence[str] | None = None) -> argparse.Namespace:
     parser.add_argument("--host", default="127.0.0.1")
     parser.add_argument("--port", type=int, default=7781)
     parser.add_argument("--startup-timeout", type=float, default=1800)
+    parser.add_argument(
+        "--metrics-file",
+        type=Path,
+        help="write the startup phase breakdown to this JSON file",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="server processes to run; more than one puts a routing proxy on --port",
+    )
+    parser.add_argument(
+        "--split-models",
+        action="store_true",
+        help="with --workers, load one model per worker instead of both on every worker",
+    )
+    front_proxy.add_cache_arguments(parser)
+    parser.add_argument(
+        "--health-interval",
+        type=float,
+        default=0,
+        help="seconds between watchdog health checks once ready; 0 disables the watchdog",
+    )
+    parser.add_argument(
+        "--health-timeout",
+        type=float,
+        default=60,
+        help="timeout for each health check request (default: 60)",
+    )
+    parser.add_argument(
+        "--max-latency",
+        type=float,
+        default=20,
+        help="a health check slower than this many seconds counts as a failure (default: 20)",
+    )
+    parser.add_argument(
+        "--max-failures",
+        type=int,
+        default=3,
+        help="restart after this many consecutive unhealthy checks (default: 3)",
+    )
+    parser.add_argument(
+        "--max-rss-mb",
+        type=float,
+        help="restart when the server's resident memory exceeds this many MB",
+    )
+    parser.add_argument(
+        "--readahead-jobs",
+        type=int,
+        default=0,
+        help="page model weights into the OS page cache with this many parallel reads "
+        "while the server starts; 0 disables (default: 0)",
+    )
+    parser.add_argument(
+        "--warmup",
+        action="store_true",
+        help="send a short synthesis and transcription through each model before reporting ready",
+    )
     return parser.parse_args(argv)
 
 
@@ -113,7 +729,26 @@ def main(argv: Sequence[str] | None = None) -> int:
     if args.host != "127.0.0.1":
         print("Refusing non-loopback bind; use Tailscale Serve for remote access", file=sys.stderr)
         return 2
-    return run(args.host, args.port, args.startup_timeout)
+    return run(
+        args.host,
+        args.port,
+        args.startup_timeout,
+        warmup=args.warmup,
+        metrics_file=args.metrics_file,
+        watchdog=WatchdogConfig(
+            interval=args.health_interval,
+            timeout=args.health_timeout,
+            max_latency=args.max_latency,
+            max_rss_mb=args.max_rss_mb,
+            max_failures=args.max_failures,
+        )
+        if args.health_interval > 0
+        else None,
+        workers=args.workers,
+        split_models=args.split_models,
+        tts_cache=front_proxy.cache_from_args(args),
+        readahead_jobs=args.readahead_jobs,
+    )
 
 
 if __name__ == "__main__":
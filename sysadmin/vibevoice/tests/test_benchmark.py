@@ -0,0 +1,116 @@
+import importlib.util
+import io
+import json
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+
+ROOT = Path(__file__).parents[1]
+for name in ("front_proxy", "run_server", "benchmark"):
+    spec = importlib.util.spec_from_file_location(name, ROOT / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+benchmark = sys.modules["benchmark"]
+
+
+class WavTests(unittest.TestCase):
+    def test_duration_counts_bytes_present_not_header_sizes(self):
+        audio = benchmark.tone_wav(1.5, sample_rate=8000)
+
+        self.assertAlmostEqual(benchmark.wav_duration(audio), 1.5)
+        self.assertAlmostEqual(benchmark.wav_duration(audio[: len(audio) // 2]), 0.75, places=2)
+        self.assertIsNone(benchmark.wav_duration(b"not audio"))
+
+    def test_audio_starts_after_the_data_chunk_header(self):
+        audio = benchmark.tone_wav(0.1, sample_rate=8000)
+        header = audio.find(b"data") + 8
+
+        self.assertFalse(benchmark.audio_started(audio[:2]))
+        self.assertFalse(benchmark.audio_started(audio[:header]))
+        self.assertTrue(benchmark.audio_started(audio[: header + 1]))
+        self.assertTrue(benchmark.audio_started(b"ID3 mp3 bytes"))
+
+
+class FakeServerBenchmarkTests(unittest.TestCase):
+    def setUp(self):
+        self.server = benchmark.start_fake_server(tts_rtf=0.1, asr_rtf=0.1)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.port = self.server.server_port
+
+    def test_tts_reports_first_chunk_before_completion_and_rtf(self):
+        text = benchmark.TTS_TEXTS[1]
+
+        result = benchmark.synthesize("127.0.0.1", self.port, text, timeout=10)
+
+        self.assertLess(result["ttfa_s"], result["total_s"] / 2)
+        # The header is flushed at once; the first samples take a paced chunk longer.
+        self.assertGreaterEqual(result["ttfa_s"], benchmark.FAKE_CHUNK_SECONDS * 0.1)
+        self.assertAlmostEqual(
+            result["audio_s"], len(text.split()) * benchmark.FAKE_SECONDS_PER_WORD, places=2
+        )
+        self.assertGreater(result["rtf"], 0.09)
+        self.assertLess(result["rtf"], 0.3)
+
+    def test_asr_latency_grows_with_audio_duration(self):
+        summaries = benchmark.benchmark(
+            "127.0.0.1",
+            self.port,
+            modes=("asr",),
+            concurrency=[2],
+            requests=4,
+            asr_seconds=[1.0, 3.0],
+            timeout=10,
+        )
+
+        short, long = summaries[0]["by_duration"]
+        self.assertEqual((short["audio_s"], long["audio_s"]), (1.0, 3.0))
+        self.assertLess(short["latency_p50_ms"], long["latency_p50_ms"])
+        self.assertGreater(long["latency_p50_ms"], 300)
+
+    def test_concurrency_sweep_summarizes_each_level(self):
+        summaries = benchmark.benchmark(
+            "127.0.0.1",
+            self.port,
+            modes=("tts",),
+            concurrency=[1, 3],
+            requests=3,
+            asr_seconds=[1.0],
+            timeout=10,
+        )
+
+        self.assertEqual([s["concurrency"] for s in summaries], [1, 3])
+        self.assertTrue(all(s["requests"] == 3 and s["errors"] == 0 for s in summaries))
+        self.assertGreater(summaries[1]["audio_s_per_s"], summaries[0]["audio_s_per_s"])
+
+
+class CliTests(unittest.TestCase):
+    def test_fake_mode_runs_end_to_end_and_writes_json(self):
+        with tempfile.TemporaryDirectory() as temp_dir, redirect_stdout(io.StringIO()) as out:
+            output = Path(temp_dir) / "bench.json"
+            status = benchmark.main(
+                ["--fake", "--fake-rtf", "0.02", "-c", "2", "-n", "3",
+                 "--asr-seconds", "1", "--json", str(output)]
+            )
+            summaries = json.loads(output.read_text())
+
+        self.assertEqual(status, 0)
+        self.assertEqual([s["mode"] for s in summaries], ["tts", "asr"])
+        self.assertIn("TTFA", out.getvalue())
+        self.assertIn("Latency p50", out.getvalue())
+
+    def test_sweeps_reject_values_that_are_not_positive(self):
+        for argv in (["-c", "0"], ["-c", "1,-2"], ["-c", "x"], ["--asr-seconds", "0"]):
+            with redirect_stderr(io.StringIO()) as err, self.assertRaises(SystemExit):
+                benchmark.parse_args(argv)
+            self.assertIn("error:", err.getvalue())
+
+        self.assertEqual(benchmark.parse_args(["-c", "1,8"]).concurrency, [1, 8])
+
+
+if __name__ == "__main__":
+    unittest.main()
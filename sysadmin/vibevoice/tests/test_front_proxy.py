@@ -0,0 +1,384 @@
+import errno
+import http.client
+import importlib.util
+import io
+import json
+import mmap
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stderr
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+
+MODULE_PATH = Path(__file__).parents[1] / "front_proxy.py"
+SPEC = importlib.util.spec_from_file_location("front_proxy", MODULE_PATH)
+front_proxy = importlib.util.module_from_spec(SPEC)
+sys.modules[SPEC.name] = front_proxy
+SPEC.loader.exec_module(front_proxy)
+
+
+class WorkerHandler(BaseHTTPRequestHandler):
+    """Fake mlx_audio worker: echoes which worker answered; /slow and /stream block on events."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_args):
+        pass
+
+    def do_GET(self):
+        self.reply({"worker": self.server.name, "path": self.path})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests.append(body)
+        if self.path == "/slow":
+            self.server.release.wait(5)
+        if self.path == "/stream" or b'"stream": true' in body:
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/wav")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for index in range(2):
+                chunk = f"{self.server.name}-part{index}".encode()
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+                if index == 0:
+                    self.server.release.wait(5)
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        self.reply({"worker": self.server.name, "bytes": len(body)})
+
+    def reply(self, document):
+        payload = json.dumps(document).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FrontProxyTests(unittest.TestCase):
+    def setUp(self):
+        self.workers = {}
+        backends = []
+        for name, models in (("tts", ("tts-model",)), ("asr", ("asr-model",)), ("both", ("tts-model", "asr-model"))):
+            server = ThreadingHTTPServer(("127.0.0.1", 0), WorkerHandler)
+            server.name = name
+            server.requests = []
+            server.release = threading.Event()
+            thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+            thread.start()
+            self.addCleanup(thread.join)
+            self.addCleanup(server.server_close)
+            self.addCleanup(server.shutdown)
+            self.addCleanup(server.release.set)
+            self.workers[name] = server
+            backends.append(front_proxy.Backend("127.0.0.1", server.server_port, models))
+        self.backends = {backend.port: backend for backend in backends}
+        self.proxy = front_proxy.ProxyServer(front_proxy.FrontProxy(backends), "127.0.0.1", 0).start()
+        self.addCleanup(self.proxy.stop)
+
+    def connect(self):
+        connection = http.client.HTTPConnection("127.0.0.1", self.proxy.port, timeout=5)
+        self.addCleanup(connection.close)
+        return connection
+
+    def post(self, path, document, connection=None):
+        connection = connection or self.connect()
+        connection.request("POST", path, json.dumps(document), {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_routes_json_requests_by_model(self):
+        _status, reply = self.post("/v1/audio/speech", {"model": "asr-model", "input": "hi"})
+
+        self.assertIn(reply["worker"], {"asr", "both"})
+
+    def test_routes_multipart_uploads_by_model_field(self):
+        body = (
+            b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.wav"\r\n'
+            b"Content-Type: audio/wav\r\n\r\nRIFF....\r\n"
+            b'--b\r\nContent-Disposition: form-data; name="model"\r\n\r\ntts-model\r\n--b--\r\n'
+        )
+        connection = self.connect()
+        connection.request("POST", "/v1/audio/transcriptions", body,
+                           {"Content-Type": "multipart/form-data; boundary=b"})
+
+        reply = json.loads(connection.getresponse().read())
+
+        self.assertIn(reply["worker"], {"tts", "both"})
+
+    def test_least_outstanding_backend_wins_among_replicas(self):
+        slow = threading.Thread(
+            target=self.post, args=("/slow", {"model": "tts-model"}), daemon=True
+        )
+        slow.start()
+        # The worker's own record, not the proxy's counter: the latter is bumped before
+        # the request reaches a worker, so it cannot tell us which one is busy.
+        for _ in range(500):
+            if self.workers["tts"].requests or self.workers["both"].requests:
+                break
+            time.sleep(0.01)
+        busy_name = "tts" if self.workers["tts"].requests else "both"
+        idle_name = "both" if busy_name == "tts" else "tts"
+
+        _status, reply = self.post("/v1/audio/speech", {"model": "tts-model"})
+
+        self.assertEqual(reply["worker"], idle_name)
+        self.workers[busy_name].release.set()
+        slow.join(5)
+
+    def test_streams_chunks_through_before_the_response_finishes(self):
+        connection = self.connect()
+        connection.request("POST", "/stream", json.dumps({"model": "asr-model"}),
+                           {"Content-Type": "application/json"})
+        response = connection.getresponse()
+
+        first = response.read1(64)
+        for server in self.workers.values():
+            server.release.set()
+        rest = response.read()
+
+        self.assertTrue(first.endswith(b"-part0"))
+        self.assertTrue(rest.endswith(b"-part1"))
+
+    def test_expect_continue_gets_interim_reply_then_final_response(self):
+        body = json.dumps({"model": "asr-model", "input": "x" * 2048}).encode()
+        with socket.create_connection(("127.0.0.1", self.proxy.port), timeout=5) as client:
+            client.sendall(
+                b"POST /v1/audio/transcriptions HTTP/1.1\r\nHost: proxy\r\n"
+                b"Content-Type: application/json\r\nExpect: 100-continue\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode()
+            )
+            interim = client.recv(1024)
+            client.sendall(body)
+            response = http.client.HTTPResponse(client)
+            response.begin()
+            reply = json.loads(response.read())
+
+        self.assertEqual(interim, b"HTTP/1.1 100 Continue\r\n\r\n")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(reply["bytes"], len(body))
+        backend_requests = self.workers["asr"].requests + self.workers["both"].requests
+        self.assertEqual(backend_requests, [body])
+
+    def test_interim_backend_responses_are_skipped(self):
+        server = socket.create_server(("127.0.0.1", 0))
+        self.addCleanup(server.close)
+
+        def answer():
+            conn, _ = server.accept()
+            with conn:
+                conn.recv(65536)
+                conn.sendall(b"HTTP/1.1 100 Continue\r\n\r\n"
+                             b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+
+        threading.Thread(target=answer, daemon=True).start()
+        proxy = front_proxy.ProxyServer(
+            front_proxy.FrontProxy([front_proxy.Backend("127.0.0.1", server.getsockname()[1], ("m",))]),
+            "127.0.0.1", 0,
+        ).start()
+        self.addCleanup(proxy.stop)
+        connection = http.client.HTTPConnection("127.0.0.1", proxy.port, timeout=5)
+        self.addCleanup(connection.close)
+        connection.request("POST", "/x", json.dumps({"model": "m"}), {"Content-Type": "application/json"})
+        response = connection.getresponse()
+
+        self.assertEqual((response.status, response.read()), (200, b"ok"))
+
+    def test_keeps_client_connection_alive_across_requests(self):
+        connection = self.connect()
+
+        first = self.post("/v1/audio/speech", {"model": "tts-model"}, connection)
+        second = self.post("/v1/audio/speech", {"model": "asr-model"}, connection)
+
+        self.assertEqual((first[0], second[0]), (200, 200))
+
+    def test_unavailable_backends_are_skipped_and_503_when_none_left(self):
+        for backend in self.backends.values():
+            backend.available = backend.port == self.workers["both"].server_port
+
+        self.assertEqual(self.post("/x", {"model": "tts-model"})[1]["worker"], "both")
+
+        self.backends[self.workers["both"].server_port].available = False
+        status, reply = self.post("/x", {"model": "tts-model"})
+        self.assertEqual(status, 503)
+        self.assertIn("no backend available", reply["detail"])
+
+    def test_status_reports_backend_counters(self):
+        self.post("/v1/audio/speech", {"model": "asr-model"})
+        connection = self.connect()
+        connection.request("GET", "/proxy/status")
+
+        status = json.loads(connection.getresponse().read())
+
+        self.assertEqual(sum(backend["served"] for backend in status["backends"]), 1)
+        self.assertEqual({backend["outstanding"] for backend in status["backends"]}, {0})
+
+
+class TtsCacheTests(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.disk = Path(temp_dir.name)
+
+    def test_key_ignores_field_order_but_not_voice(self):
+        key = front_proxy.TtsCache.key
+
+        self.assertEqual(key(b'{"input": "hi", "model": "m"}'), key(b'{"model": "m", "input": "hi"}'))
+        self.assertNotEqual(key(b'{"input": "hi"}'), key(b'{"input": "hi", "voice": "b"}'))
+        self.assertIsNone(key(b"not json"))
+
+    def test_memory_tier_evicts_least_recently_used_by_size(self):
+        cache = front_proxy.TtsCache(memory_bytes=10)
+        cache.put("a", "audio/wav", b"aaaa")
+        cache.put("b", "audio/wav", b"bbbb")
+        cache.get("a")
+        cache.put("c", "audio/wav", b"cccc")
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a")[1].audio, b"aaaa")
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["memory_bytes"], 8)
+
+    def test_disk_tier_survives_restart_and_serves_memory_mapped(self):
+        front_proxy.TtsCache(0, self.disk, disk_bytes=100).put("a", "audio/mpeg", b"clip")
+
+        cache = front_proxy.TtsCache(0, self.disk, disk_bytes=100)
+        tier, clip = cache.get("a")
+
+        self.assertEqual((tier, clip.content_type, clip.audio[:]), ("disk", "audio/mpeg", b"clip"))
+        self.assertIsInstance(clip.audio, mmap.mmap)
+        clip.audio.close()
+        self.assertEqual(cache.stats()["disk_hits"], 1)
+
+    def test_disk_tier_evicts_oldest_clips_over_size_limit(self):
+        cache = front_proxy.TtsCache(0, self.disk, disk_bytes=10)
+        for key in "abc":
+            cache.put(key, "audio/wav", key.encode() * 4)
+
+        self.assertEqual(sorted(path.stem for path in self.disk.glob("*.audio")), ["b", "c"])
+        self.assertEqual(cache.stats()["disk_bytes"], 8)
+
+    def test_disk_only_clip_is_served_while_its_write_is_in_flight(self):
+        cache = front_proxy.TtsCache(0, self.disk, disk_bytes=100)
+        cache.remember("a", "audio/wav", b"clip")
+
+        self.assertEqual(cache.get("a")[0], "memory")
+        self.assertEqual(cache.stats()["stores"], 0)
+        cache.persist("a", "audio/wav", b"clip")
+        tier, clip = cache.get("a")
+        clip.audio.close()
+
+        self.assertEqual(tier, "disk")
+        self.assertEqual(cache.pending, {})
+        self.assertEqual(cache.stats()["stores"], 1)
+
+    def test_failed_disk_write_is_logged_and_cleaned_up(self):
+        cache = front_proxy.TtsCache(0, self.disk, disk_bytes=100)
+        full = OSError(errno.ENOSPC, "No space left on device")
+        with patch.object(Path, "replace", side_effect=full), redirect_stderr(io.StringIO()) as err:
+            cache.put("a", "audio/wav", b"clip")
+
+        self.assertIn("No space left on device", err.getvalue())
+        self.assertEqual(list(self.disk.glob("*.tmp")), [])
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["stores"], 0)
+
+    def test_opening_the_disk_tier_sweeps_unfinished_writes(self):
+        (self.disk / "a.1234.tmp").write_bytes(b"half a clip")
+
+        front_proxy.TtsCache(0, self.disk, disk_bytes=100)
+
+        self.assertEqual(list(self.disk.iterdir()), [])
+
+    def test_only_clips_a_tier_keeps_count_as_stores(self):
+        cache = front_proxy.TtsCache(4, self.disk, disk_bytes=8)
+        cache.put("small", "audio/wav", b"abcd")
+        cache.put("huge", "audio/wav", b"x" * 16)
+
+        self.assertIsNone(cache.get("huge"))
+        self.assertEqual(cache.stats()["stores"], 1)
+
+
+class CachingProxyTests(unittest.TestCase):
+    def setUp(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), WorkerHandler)
+        server.name = "tts"
+        server.requests = []
+        server.release = threading.Event()
+        server.release.set()
+        thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.worker = server
+        backend = front_proxy.Backend("127.0.0.1", server.server_port, ("tts-model",))
+        cache = front_proxy.TtsCache(memory_bytes=1024 * 1024)
+        self.proxy = front_proxy.ProxyServer(
+            front_proxy.FrontProxy([backend], cache), "127.0.0.1", 0
+        ).start()
+        self.addCleanup(self.proxy.stop)
+
+    def speak(self, document):
+        connection = http.client.HTTPConnection("127.0.0.1", self.proxy.port, timeout=5)
+        self.addCleanup(connection.close)
+        connection.request("POST", "/v1/audio/speech", json.dumps(document),
+                           {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.getheader("X-Cache"), response.getheader("Content-Type"), response.read()
+
+    def test_repeated_synthesis_is_served_from_cache(self):
+        request = {"model": "tts-model", "input": "You have mail", "voice": "a", "stream": True}
+
+        first = self.speak(request)
+        second = self.speak(dict(reversed(list(request.items()))))
+        other_voice = self.speak({**request, "voice": "b"})
+
+        self.assertEqual(first[0], "miss")
+        self.assertEqual(second, ("hit-memory", "audio/wav", first[2]))
+        self.assertEqual(other_voice[0], "miss")
+        self.assertEqual(len(self.worker.requests), 2)
+        connection = http.client.HTTPConnection("127.0.0.1", self.proxy.port, timeout=5)
+        self.addCleanup(connection.close)
+        connection.request("GET", "/proxy/status")
+        stats = json.loads(connection.getresponse().read())["tts_cache"]
+        self.assertEqual((stats["memory_hits"], stats["misses"], stats["stores"]), (1, 2, 2))
+
+    def test_disk_hits_reach_a_slow_reader_and_keep_the_connection(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        body = json.dumps({"model": "tts-model", "input": "A long story"})
+        audio = bytes(range(256)) * 8192  # 2 MiB, far past the transport's buffer
+        cache = front_proxy.TtsCache(0, Path(temp_dir.name), disk_bytes=len(audio))
+        cache.put(front_proxy.TtsCache.key(body.encode()), "audio/wav", audio)
+        proxy = front_proxy.ProxyServer(
+            front_proxy.FrontProxy([front_proxy.Backend("127.0.0.1", 1, ("tts-model",))], cache),
+            "127.0.0.1", 0,
+        ).start()
+        self.addCleanup(proxy.stop)
+        connection = http.client.HTTPConnection("127.0.0.1", proxy.port, timeout=5)
+        self.addCleanup(connection.close)
+
+        for _ in range(2):
+            connection.request("POST", "/v1/audio/speech", body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            received = b""
+            while chunk := response.read(256 * 1024):
+                received += chunk
+                time.sleep(0.02)
+
+            self.assertEqual(response.getheader("X-Cache"), "hit-disk")
+            self.assertEqual(received, audio)
+        self.assertEqual(cache.stats()["disk_hits"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
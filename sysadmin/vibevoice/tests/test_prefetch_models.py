@@ -1,10 +1,17 @@
+import hashlib
 import importlib.util
+import io
+import json
+import os
 import sys
 import tempfile
+import threading
+import time
 import unittest
+from contextlib import redirect_stderr, redirect_stdout
 from pathlib import Path
 from types import SimpleNamespace
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 
 MODULE_PATH = Path(__file__).parents[1] / "prefetch_models.py"
@@ -14,6 +21,59 @@ sys.modules[SPEC.name] = prefetch_models
 SPEC.loader.exec_module(prefetch_models)
 
 
+class FakeHub:
+    """Writes snapshots in the huggingface_hub cache layout: symlinks into blobs/.
+
+    Both Qwen tokenizers ship the same tokenizer.json, as on the real Hub.
+    """
+
+    def __init__(self):
+        self.shas = {model.repo_id: model.sha for model in prefetch_models.MODELS}
+        self.patterns = {model.repo_id: model.allow_patterns for model in prefetch_models.MODELS}
+        self.api = Mock()
+        self.api.model_info.side_effect = lambda repo_id, revision, **_kwargs: SimpleNamespace(
+            sha=self.shas[repo_id],
+            siblings=[
+                SimpleNamespace(
+                    rfilename=name,
+                    size=len(content),
+                    blob_id="0" * 40,
+                    lfs=SimpleNamespace(sha256=hashlib.sha256(content).hexdigest(), size=len(content)),
+                )
+                for name, content in self.files(repo_id).items()
+            ],
+        )
+        self.downloads = []
+        self.fetched_bytes = 0
+
+    def files(self, repo_id):
+        if self.patterns[repo_id]:
+            return {
+                "config.json": f"{repo_id}:config.json".encode() * 64,
+                "tokenizer.json": b"shared tokenizer" * 256,
+            }
+        return {
+            "config.json": f"{repo_id}:config.json".encode() * 64,
+            "weights/model.safetensors": f"{repo_id}:weights/model.safetensors".encode() * 64,
+        }
+
+    def download(self, repo_id, revision, cache_dir, allow_patterns=None, **_kwargs):
+        self.downloads.append(repo_id)
+        repo = Path(cache_dir) / f"models--{repo_id.replace('/', '--')}"
+        snapshot = repo / "snapshots" / self.shas[repo_id]
+        for name, content in self.files(repo_id).items():
+            blob = repo / "blobs" / hashlib.sha256(content).hexdigest()
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            if not blob.exists():
+                blob.write_bytes(content)
+                self.fetched_bytes += len(content)
+            link = snapshot / name
+            link.parent.mkdir(parents=True, exist_ok=True)
+            link.unlink(missing_ok=True)
+            link.symlink_to(os.path.relpath(blob, link.parent))
+        return str(snapshot)
+
+
 class PrefetchModelsTests(unittest.TestCase):
     def test_model_revisions_are_pinned(self):
         self.assertEqual(
@@ -51,7 +111,7 @@ class PrefetchModelsTests(unittest.TestCase):
     def test_downloads_main_after_verifying_revision(self):
         expected_shas = {model.repo_id: model.sha for model in prefetch_models.MODELS}
         api = Mock()
-        api.model_info.side_effect = lambda repo_id, revision: SimpleNamespace(
+        api.model_info.side_effect = lambda repo_id, revision, **_kwargs: SimpleNamespace(
             sha=expected_shas[repo_id]
         )
 
@@ -67,9 +127,239 @@ class PrefetchModelsTests(unittest.TestCase):
         self.assertEqual(downloader.call_count, 4)
         for call in downloader.call_args_list:
             self.assertEqual(call.kwargs["revision"], "main")
-        tokenizer_call = downloader.call_args_list[-1]
+        calls = {call.args[0]: call for call in downloader.call_args_list}
+        tokenizer_call = calls["Qwen/Qwen2.5-7B"]
         self.assertIn("tokenizer.json", tokenizer_call.kwargs["allow_patterns"])
 
+    def test_downloads_run_concurrently_up_to_jobs(self):
+        expected_shas = {model.repo_id: model.sha for model in prefetch_models.MODELS}
+        api = Mock()
+        api.model_info.side_effect = lambda repo_id, revision, **_kwargs: SimpleNamespace(
+            sha=expected_shas[repo_id]
+        )
+        lock = threading.Lock()
+        active = []
+        peak = []
+
+        def downloader(repo_id, **_kwargs):
+            with lock:
+                active.append(repo_id)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(repo_id)
+            return f"/tmp/cache/snapshots/{expected_shas[repo_id]}"
+
+        with tempfile.TemporaryDirectory() as temp_dir, redirect_stdout(io.StringIO()):
+            prefetch_models.prefetch(Path(temp_dir), api=api, downloader=downloader, jobs=2)
+
+        self.assertEqual(max(peak), 2)
+
+    def test_interrupted_download_is_retried(self):
+        model = prefetch_models.MODELS[0]
+        downloader = Mock(
+            side_effect=[ConnectionResetError("reset"), f"/tmp/cache/snapshots/{model.sha}"]
+        )
+        sleep = Mock()
+
+        with redirect_stdout(io.StringIO()):
+            path = prefetch_models.download_model(
+                model, Path("/tmp/cache"), downloader, retries=3, sleep=sleep
+            )
+
+        self.assertEqual(path.name, model.sha)
+        self.assertEqual(downloader.call_count, 2)
+        sleep.assert_called_once()
+
+
+class ManifestTests(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache = Path(temp_dir.name)
+        self.hub = FakeHub()
+        with redirect_stdout(io.StringIO()):
+            prefetch_models.prefetch(self.cache, api=self.hub.api, downloader=self.hub.download)
+
+    def test_complete_cache_skips_the_hub(self):
+        api = Mock()
+        downloader = Mock()
+
+        with redirect_stdout(io.StringIO()) as out:
+            prefetch_models.prefetch(self.cache, api=api, downloader=downloader)
+
+        api.model_info.assert_not_called()
+        downloader.assert_not_called()
+        self.assertIn("verified", out.getvalue())
+
+    def test_manifest_records_sizes_and_hashes(self):
+        model = prefetch_models.MODELS[0]
+        manifest = json.loads(prefetch_models.manifest_path(self.cache, model).read_text())
+
+        entry = manifest["files"]["weights/model.safetensors"]
+        content = (prefetch_models.snapshot_dir(self.cache, model) / "weights/model.safetensors").read_bytes()
+        self.assertEqual(entry["size"], len(content))
+        self.assertEqual(entry["sha256"], hashlib.sha256(content).hexdigest())
+
+    def test_verify_detects_modified_and_missing_files(self):
+        model = prefetch_models.MODELS[0]
+        snapshot = prefetch_models.snapshot_dir(self.cache, model)
+        config = snapshot / "config.json"
+        config.write_bytes(b"x" * config.stat().st_size)
+        (snapshot / "weights/model.safetensors").unlink()
+
+        problems = prefetch_models.verify(self.cache)
+
+        self.assertEqual(
+            sorted(problems[model.repo_id]),
+            ["checksum mismatch config.json", "missing weights/model.safetensors"],
+        )
+        self.assertEqual(problems["Qwen/Qwen2.5-7B"], [])
+
+    def test_rehash_catches_edits_that_preserve_mtime(self):
+        model = prefetch_models.MODELS[1]
+        config = prefetch_models.snapshot_dir(self.cache, model) / "config.json"
+        stat = config.stat()
+        config.write_bytes(b"x" * stat.st_size)
+        os.utime(config, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        self.assertEqual(prefetch_models.verify(self.cache)[model.repo_id], [])
+        self.assertEqual(
+            prefetch_models.verify(self.cache, rehash=True)[model.repo_id],
+            ["checksum mismatch config.json"],
+        )
+
+    def test_verify_flag_fails_without_network_when_cache_is_broken(self):
+        prefetch_models.manifest_path(self.cache, prefetch_models.MODELS[2]).unlink()
+
+        with redirect_stderr(io.StringIO()) as out:
+            status = prefetch_models.main(["--cache-dir", str(self.cache), "--verify"])
+
+        self.assertEqual(status, 1)
+        self.assertIn("no manifest", out.getvalue())
+        self.assertEqual(self.hub.api.model_info.call_count, 4)
+
+
+class BundleTests(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.source = Path(temp_dir.name) / "source"
+        self.target = Path(temp_dir.name) / "target"
+        with redirect_stdout(io.StringIO()):
+            prefetch_models.prefetch(self.source, api=FakeHub().api, downloader=FakeHub().download)
+
+    def export(self, **options):
+        bundle = io.BytesIO()
+        with redirect_stderr(io.StringIO()):
+            prefetch_models.export_bundle(self.source, bundle, **options)
+        return bundle.getvalue()
+
+    def test_round_trip_restores_a_cache_that_needs_no_hub(self):
+        bundle = self.export(compress=True)
+
+        results = prefetch_models.import_bundle(self.target, io.BytesIO(bundle))
+
+        self.assertEqual(set(map(tuple, results.values())), {()})
+        snapshot = prefetch_models.snapshot_dir(self.target, prefetch_models.MODELS[0])
+        self.assertTrue((snapshot / "config.json").is_symlink())
+        api = Mock()
+        with redirect_stdout(io.StringIO()):
+            prefetch_models.prefetch(self.target, api=api, downloader=Mock())
+        api.model_info.assert_not_called()
+
+    def test_corrupted_bundle_fails_verification(self):
+        repo_id = prefetch_models.MODELS[0].repo_id
+        content = f"{repo_id}:config.json".encode() * 64
+        bundle = self.export().replace(content, content[::-1])
+
+        results = prefetch_models.import_bundle(self.target, io.BytesIO(bundle))
+
+        self.assertEqual(results[repo_id], ["checksum mismatch config.json"])
+
+    def test_export_refuses_an_incomplete_cache(self):
+        prefetch_models.manifest_path(self.source, prefetch_models.MODELS[3]).unlink()
+
+        with self.assertRaisesRegex(RuntimeError, "Qwen/Qwen2.5-7B"):
+            self.export()
+
+    def test_cli_pipes_bundle_through_stdout_and_stdin(self):
+        stdout = SimpleNamespace(buffer=io.BytesIO())
+        with patch.object(sys, "stdout", stdout), redirect_stderr(io.StringIO()):
+            status = prefetch_models.main(["--cache-dir", str(self.source), "--export-bundle", "-"])
+        self.assertEqual(status, 0)
+
+        stdin = SimpleNamespace(buffer=io.BytesIO(stdout.buffer.getvalue()))
+        with patch.object(sys, "stdin", stdin), redirect_stderr(io.StringIO()) as report:
+            status = prefetch_models.main(["--cache-dir", str(self.target), "--import-bundle", "-"])
+
+        self.assertEqual(status, 0)
+        self.assertEqual(report.getvalue().count("ok  "), 4)
+
+
+class BlobStoreTests(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache = Path(temp_dir.name)
+        self.hub = FakeHub()
+
+    def tokenizer_blob(self, repo_id):
+        model = next(model for model in prefetch_models.MODELS if model.repo_id == repo_id)
+        return Path(os.path.realpath(prefetch_models.snapshot_dir(self.cache, model) / "tokenizer.json"))
+
+    def test_shared_tokenizer_is_downloaded_once_and_hardlinked(self):
+        with redirect_stdout(io.StringIO()) as out:
+            savings = prefetch_models.prefetch(
+                self.cache, api=self.hub.api, downloader=self.hub.download, jobs=4
+            )
+
+        shared = len(b"shared tokenizer" * 256)
+        total = sum(
+            len(content) for repo_id in self.hub.shas for content in self.hub.files(repo_id).values()
+        )
+        self.assertEqual(self.hub.fetched_bytes, total - shared)
+        self.assertEqual(savings, {"skipped": shared, "deduplicated": 0})
+        self.assertTrue(
+            os.path.samefile(
+                self.tokenizer_blob("Qwen/Qwen2.5-0.5B"), self.tokenizer_blob("Qwen/Qwen2.5-7B")
+            )
+        )
+        self.assertIn("saved 0.0 MB", out.getvalue())
+        self.assertEqual(set(map(tuple, prefetch_models.verify(self.cache).values())), {()})
+
+    def test_existing_duplicates_are_replaced_with_hardlinks(self):
+        for model in prefetch_models.MODELS:
+            self.hub.download(model.repo_id, "main", str(self.cache), model.allow_patterns)
+
+        saved = sum(prefetch_models.deduplicate_blobs(self.cache, model) for model in prefetch_models.MODELS)
+
+        self.assertEqual(saved, len(b"shared tokenizer" * 256))
+        self.assertTrue(
+            os.path.samefile(
+                self.tokenizer_blob("Qwen/Qwen2.5-0.5B"), self.tokenizer_blob("Qwen/Qwen2.5-7B")
+            )
+        )
+
+    def test_models_sharing_blobs_download_in_sequence(self):
+        blobs = {
+            model.repo_id: prefetch_models.expected_blobs(
+                self.hub.api.model_info(model.repo_id, revision="main"), model
+            )
+            for model in prefetch_models.MODELS
+        }
+
+        groups = prefetch_models.download_groups(prefetch_models.MODELS, blobs)
+
+        self.assertEqual(
+            [[model.repo_id for model in group] for group in groups],
+            [
+                ["mlx-community/VibeVoice-Realtime-0.5B-fp16"],
+                ["mlx-community/VibeVoice-ASR-bf16"],
+                ["Qwen/Qwen2.5-0.5B", "Qwen/Qwen2.5-7B"],
+            ],
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,11 +1,26 @@
 import importlib.util
+import io
+import json
+import random
 import signal
 import sys
+import tempfile
+import threading
+import time
 import unittest
+import wave
+from contextlib import redirect_stderr, redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from unittest.mock import Mock, patch
 
 
+PROXY_PATH = Path(__file__).parents[1] / "front_proxy.py"
+PROXY_SPEC = importlib.util.spec_from_file_location("front_proxy", PROXY_PATH)
+front_proxy = importlib.util.module_from_spec(PROXY_SPEC)
+sys.modules[PROXY_SPEC.name] = front_proxy
+PROXY_SPEC.loader.exec_module(front_proxy)
+
 MODULE_PATH = Path(__file__).parents[1] / "run_server.py"
 SPEC = importlib.util.spec_from_file_location("run_server", MODULE_PATH)
 run_server = importlib.util.module_from_spec(SPEC)
@@ -13,6 +28,56 @@ sys.modules[SPEC.name] = run_server
 SPEC.loader.exec_module(run_server)
 
 
+class WarmingUpHandler(BaseHTTPRequestHandler):
+    """Answers /v1/models with 503 until `ready_after` probes have been seen."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_args):
+        pass
+
+    def do_GET(self):
+        self.server.probes.append(self.client_address)
+        status = 200 if len(self.server.probes) > self.server.ready_after else 503
+        payload = b'{"data": []}'
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class SpeechHandler(WarmingUpHandler):
+    """Ready immediately; synthesis hangs past the client's timeout once `wedged` is set."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        if self.server.wedged:
+            time.sleep(0.5)
+        payload = run_server.silent_wav(0.1)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/wav")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except ConnectionError:
+            pass  # the client already gave up on a wedged request
+
+
+def serve(test, handler, **attributes):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.probes = []
+    server.ready_after = 0
+    for name, value in attributes.items():
+        setattr(server, name, value)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    test.addCleanup(thread.join)
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    return server
+
+
 class ServerSupervisorTests(unittest.TestCase):
     def test_build_command_binds_loopback_and_one_port(self):
         command = run_server.build_command("127.0.0.1", 7781)
@@ -57,12 +122,75 @@ class ServerSupervisorTests(unittest.TestCase):
             exit_code = run_server.run("127.0.0.1", 7781, startup_timeout=60)
 
         self.assertEqual(exit_code, 0)
-        self.assertEqual(
+        self.assertCountEqual(
             [call.args[1] for call in preload.call_args_list],
-            list(run_server.MODEL_IDS),
+            run_server.MODEL_IDS,
         )
         child.wait.assert_called_once_with()
 
+    def test_preloads_are_issued_concurrently(self):
+        child = Mock()
+        child.poll.return_value = None
+        child.wait.return_value = 0
+        both_started = threading.Barrier(len(run_server.MODEL_IDS), timeout=5)
+
+        with (
+            patch.object(run_server.subprocess, "Popen", return_value=child),
+            patch.object(run_server, "wait_until_ready"),
+            patch.object(run_server, "preload_model", side_effect=lambda *_args: both_started.wait()),
+            patch.object(run_server.signal, "signal"),
+            redirect_stdout(io.StringIO()),
+        ):
+            exit_code = run_server.run("127.0.0.1", 7781, startup_timeout=60)
+
+        self.assertEqual(exit_code, 0)
+
+    def test_warmup_runs_after_preload_and_before_ready(self):
+        child = Mock()
+        child.poll.return_value = None
+        child.wait.return_value = 0
+        events = []
+        warmups = {
+            model_name: Mock(side_effect=lambda *_args, name=model_name: events.append(("warm", name)))
+            for model_name in run_server.MODEL_IDS
+        }
+
+        with (
+            patch.object(run_server.subprocess, "Popen", return_value=child),
+            patch.object(run_server, "wait_until_ready"),
+            patch.object(
+                run_server,
+                "preload_model",
+                side_effect=lambda _url, name, _timeout: events.append(("preload", name)),
+            ),
+            patch.dict(run_server.WARMUPS, warmups),
+            patch.object(run_server.signal, "signal"),
+            redirect_stdout(io.StringIO()) as out,
+        ):
+            exit_code = run_server.run("127.0.0.1", 7781, startup_timeout=60, warmup=True)
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual([kind for kind, _name in events], ["preload", "preload", "warm", "warm"])
+        self.assertLess(out.getvalue().index("Warming up"), out.getvalue().index("VibeVoice ready"))
+
+    def test_asr_warmup_uploads_a_silent_wav_as_multipart(self):
+        response = Mock(status=200)
+        response.read.return_value = b'{"text": ""}'
+        response.__enter__ = Mock(return_value=response)
+        response.__exit__ = Mock(return_value=False)
+
+        with patch.object(run_server.request, "urlopen", return_value=response) as urlopen:
+            run_server.warm_up_asr("http://127.0.0.1:7781", timeout=30)
+
+        sent_request = urlopen.call_args.args[0]
+        self.assertEqual(sent_request.full_url, "http://127.0.0.1:7781/v1/audio/transcriptions")
+        self.assertIn("multipart/form-data; boundary=", sent_request.get_header("Content-type"))
+        self.assertIn(run_server.ASR_MODEL.encode(), sent_request.data)
+        wav_start = sent_request.data.index(b"RIFF")
+        with wave.open(io.BytesIO(sent_request.data[wav_start:]), "rb") as wav:
+            self.assertEqual(wav.getframerate(), run_server.WARMUP_SAMPLE_RATE)
+            self.assertEqual(wav.getnframes(), run_server.WARMUP_SAMPLE_RATE)
+
     def test_run_terminates_child_when_preload_fails(self):
         child = Mock()
         child.poll.return_value = None
@@ -80,6 +208,63 @@ class ServerSupervisorTests(unittest.TestCase):
         child.terminate.assert_called_once_with()
         child.wait.assert_called_once_with(timeout=30)
 
+    def test_readiness_probe_reuses_one_connection_with_backoff(self):
+        server = serve(self, WarmingUpHandler, ready_after=3)
+        child = Mock()
+        child.poll.return_value = None
+        sleeps = []
+        timer = run_server.StartupTimer()
+
+        with redirect_stdout(io.StringIO()) as out:
+            run_server.wait_until_ready(
+                f"http://127.0.0.1:{server.server_port}", child, 10, timer, sleep=sleeps.append
+            )
+
+        self.assertEqual(len(server.probes), 4)
+        self.assertEqual(len(set(server.probes)), 1)
+        self.assertEqual(len(sleeps), 3)
+        self.assertLess(sleeps[0], sleeps[2])
+        self.assertEqual(list(timer.phases), ["port_open", "http_ready"])
+        events = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([event["phase"] for event in events], ["port_open", "http_ready"])
+
+    def test_backoff_doubles_with_jitter_up_to_a_cap(self):
+        delays = run_server.backoff_delays(0.1, 0.8, random.Random(1))
+        samples = [next(delays) for _ in range(6)]
+
+        for sample, ceiling in zip(samples, [0.1, 0.2, 0.4, 0.8, 0.8, 0.8]):
+            self.assertGreaterEqual(sample, ceiling / 2)
+            self.assertLessEqual(sample, ceiling)
+
+    def test_run_writes_startup_breakdown_to_metrics_file(self):
+        child = Mock()
+        child.poll.return_value = None
+        child.wait.return_value = 0
+
+        def ready(_url, _child, _timeout, timer):
+            timer.mark("port_open")
+            timer.mark("http_ready")
+
+        with (
+            tempfile.TemporaryDirectory() as temp_dir,
+            patch.object(run_server.subprocess, "Popen", return_value=child),
+            patch.object(run_server, "wait_until_ready", side_effect=ready),
+            patch.object(run_server, "preload_model"),
+            patch.object(run_server.signal, "signal"),
+            redirect_stdout(io.StringIO()),
+        ):
+            metrics_file = Path(temp_dir) / "startup.json"
+            run_server.run("127.0.0.1", 7781, startup_timeout=60, metrics_file=metrics_file)
+            metrics = json.loads(metrics_file.read_text())
+
+        self.assertTrue(metrics["ok"])
+        self.assertEqual(
+            set(metrics["phases"]),
+            {"spawn", "port_open", "http_ready"}
+            | {f"preload:{name}" for name in run_server.MODEL_IDS},
+        )
+        self.assertGreaterEqual(metrics["total_seconds"], 0)
+
     def test_forwarded_signal_reaches_server_process(self):
         child = Mock()
         child.poll.return_value = None
@@ -89,5 +274,277 @@ class ServerSupervisorTests(unittest.TestCase):
         child.send_signal.assert_called_once_with(signal.SIGTERM)
 
 
+class WatchdogTests(unittest.TestCase):
+    config = run_server.WatchdogConfig(interval=0.05, timeout=0.2, max_latency=0.15, max_failures=2)
+
+    def test_wedged_server_is_reported_after_consecutive_failures(self):
+        server = serve(self, SpeechHandler, wedged=True)
+        child = Mock(pid=123)
+        child.poll.return_value = None
+
+        with redirect_stdout(io.StringIO()) as out:
+            reason = run_server.watch(
+                f"http://127.0.0.1:{server.server_port}",
+                child,
+                self.config,
+                threading.Event(),
+                rss=lambda _pid: 512.0,
+            )
+
+        self.assertIn("2 consecutive unhealthy checks", reason)
+        checks = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(checks), 2)
+        self.assertEqual(checks[0]["rss_mb"], 512.0)
+
+    def test_healthy_server_is_watched_until_it_exits(self):
+        server = serve(self, SpeechHandler, wedged=False)
+        child = Mock(pid=123)
+        child.poll.side_effect = [None] * 4 + [0]
+
+        with redirect_stdout(io.StringIO()) as out:
+            reason = run_server.watch(
+                f"http://127.0.0.1:{server.server_port}",
+                child,
+                self.config,
+                threading.Event(),
+                rss=lambda _pid: None,
+            )
+
+        self.assertIsNone(reason)
+        checks = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertTrue(checks)
+        self.assertTrue(all(check["problem"] is None for check in checks))
+
+    def test_memory_over_limit_triggers_restart(self):
+        child = Mock(pid=123)
+        child.poll.return_value = None
+        config = run_server.WatchdogConfig(interval=0.01, max_rss_mb=4096)
+
+        with redirect_stdout(io.StringIO()):
+            reason = run_server.watch(
+                "http://127.0.0.1:1",
+                child,
+                config,
+                threading.Event(),
+                check=Mock(return_value=0.1),
+                rss=lambda _pid: 5000.0,
+            )
+
+        self.assertIn("RSS 5000 MB", reason)
+
+    def test_signal_stops_watching(self):
+        stopping = threading.Event()
+        stopping.set()
+        check = Mock()
+
+        reason = run_server.watch(
+            "http://127.0.0.1:1", Mock(), self.config, stopping, check=check
+        )
+
+        self.assertIsNone(reason)
+        check.assert_not_called()
+
+    def test_run_restarts_and_rewarms_the_child(self):
+        first, second = Mock(), Mock()
+        for child in (first, second):
+            child.poll.return_value = None
+            child.wait.return_value = 0
+
+        with (
+            patch.object(run_server.subprocess, "Popen", side_effect=[first, second]),
+            patch.object(run_server, "wait_until_ready"),
+            patch.object(run_server, "preload_model") as preload,
+            patch.object(run_server, "watch", side_effect=["RSS too high", None]),
+            patch.object(run_server.signal, "signal"),
+            redirect_stdout(io.StringIO()) as out,
+        ):
+            exit_code = run_server.run(
+                "127.0.0.1", 7781, startup_timeout=60, watchdog=self.config
+            )
+
+        self.assertEqual(exit_code, 0)
+        first.terminate.assert_called_once_with()
+        second.terminate.assert_not_called()
+        second.wait.assert_called_once_with()
+        self.assertEqual(preload.call_count, 2 * len(run_server.MODEL_IDS))
+        self.assertIn('"event": "watchdog_restart"', out.getvalue())
+
+
+def fake_snapshot(cache_dir, repo_id, files, revision="abc123"):
+    """Lay out a hub cache repo: blobs, a snapshot of symlinks into them, refs/main."""
+    repo = cache_dir / ("models--" + repo_id.replace("/", "--"))
+    snapshot = repo / "snapshots" / revision
+    (repo / "blobs").mkdir(parents=True)
+    (repo / "refs").mkdir()
+    (repo / "refs" / "main").write_text(revision)
+    for name, content in files.items():
+        blob = repo / "blobs" / f"blob-{name}"
+        if isinstance(content, Path):
+            blob.hardlink_to(content)
+        else:
+            blob.write_bytes(content)
+        link = snapshot / name
+        link.parent.mkdir(parents=True, exist_ok=True)
+        link.symlink_to(Path("../../blobs") / blob.name if "/" not in name else blob)
+    return repo
+
+
+class ReadaheadTests(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache = Path(temp_dir.name)
+
+    def test_resolves_current_snapshot_to_blobs(self):
+        repo = fake_snapshot(self.cache, "org/tts", {"model.safetensors": b"w" * 10, "config.json": b"{}"})
+        (repo / "snapshots" / "stale").mkdir()
+        (repo / "snapshots" / "stale" / "old.safetensors").write_bytes(b"old")
+
+        paths = run_server.snapshot_paths(self.cache, "org/tts")
+
+        self.assertEqual([path.name for path in paths], ["blob-config.json", "blob-model.safetensors"])
+        self.assertEqual(run_server.snapshot_paths(self.cache, "org/missing"), [])
+
+    def test_reads_every_segment_once_and_skips_hardlinked_copies(self):
+        weights = b"".join(bytes([index]) * 1000 for index in range(10))
+        tts = fake_snapshot(self.cache, "org/tts", {"model.safetensors": weights, "tokenizer.json": b"t" * 7})
+        fake_snapshot(self.cache, "org/asr", {"tokenizer.json": tts / "blobs" / "blob-tokenizer.json"})
+        paths = [
+            path for repo_id in ("org/tts", "org/asr")
+            for path in run_server.snapshot_paths(self.cache, repo_id)
+        ]
+
+        with patch.object(run_server, "READAHEAD_SEGMENT_BYTES", 3000):
+            stats = run_server.readahead(paths, jobs=3)
+
+        self.assertEqual((stats["files"], stats["bytes"], stats["cancelled"]), (2, 10_007, False))
+
+    def test_stopped_readahead_reports_cancellation(self):
+        fake_snapshot(self.cache, "org/tts", {"model.safetensors": b"w" * 100})
+        stop = threading.Event()
+        stop.set()
+
+        stats = run_server.readahead(run_server.snapshot_paths(self.cache, "org/tts"), 2, stop)
+
+        self.assertEqual((stats["bytes"], stats["cancelled"]), (0, True))
+
+    def test_startup_pages_in_weights_and_records_the_phase(self):
+        for model in run_server.MODEL_IDS:
+            fake_snapshot(self.cache, model, {"model.safetensors": b"w" * 4096})
+        child = Mock()
+        child.poll.return_value = None
+        child.wait.return_value = 0
+
+        with (
+            patch.dict(run_server.os.environ, {"HF_HUB_CACHE": str(self.cache)}),
+            patch.object(run_server.subprocess, "Popen", return_value=child),
+            patch.object(run_server, "wait_until_ready"),
+            patch.object(run_server, "preload_model"),
+            patch.object(run_server.signal, "signal"),
+            redirect_stdout(io.StringIO()) as out,
+        ):
+            metrics_file = self.cache / "startup.json"
+            run_server.run("127.0.0.1", 7781, startup_timeout=60, metrics_file=metrics_file,
+                           readahead_jobs=2)
+            metrics = json.loads(metrics_file.read_text())
+
+        self.assertIn("readahead", metrics["phases"])
+        self.assertEqual(metrics["readahead"]["files"], 2)
+        self.assertIn('"event": "readahead"', out.getvalue())
+
+    def test_hub_cache_follows_hf_environment(self):
+        with patch.dict(run_server.os.environ, {"HF_HOME": "/srv/hf"}, clear=True):
+            self.assertEqual(run_server.hub_cache_dir(), Path("/srv/hf/hub"))
+        with patch.dict(run_server.os.environ, {"HF_HOME": "/srv/hf", "HF_HUB_CACHE": "/fast/hub"}):
+            self.assertEqual(run_server.hub_cache_dir(), Path("/fast/hub"))
+
+
+class MultiWorkerTests(unittest.TestCase):
+    def test_split_workers_get_one_model_each_on_ports_after_the_proxy(self):
+        specs = run_server.worker_specs(7781, 3, split_models=True)
+
+        self.assertEqual([spec.port for spec in specs], [7782, 7783, 7784])
+        self.assertEqual(
+            [spec.models for spec in specs],
+            [(run_server.TTS_MODEL,), (run_server.ASR_MODEL,), (run_server.TTS_MODEL,)],
+        )
+        self.assertEqual(run_server.worker_specs(7781, 1), [run_server.WorkerSpec(7781)])
+        self.assertEqual(
+            run_server.worker_specs(7781, 1, proxied=True), [run_server.WorkerSpec(7782)]
+        )
+
+    def test_cache_options_build_the_proxy_cache(self):
+        args = run_server.parse_args(["--workers", "2", "--tts-cache-mb", "2"])
+
+        cache = front_proxy.cache_from_args(args)
+
+        self.assertEqual((cache.memory_bytes, cache.disk_dir), (2 * 1024 * 1024, None))
+        self.assertIsNone(front_proxy.cache_from_args(run_server.parse_args([])))
+
+    def test_run_starts_workers_behind_the_proxy_and_stops_all_on_exit(self):
+        children = [Mock(), Mock()]
+        for child in children:
+            child.poll.return_value = None
+            child.wait.return_value = 0
+
+        with (
+            patch.object(run_server.subprocess, "Popen", side_effect=children) as popen,
+            patch.object(run_server, "wait_until_ready"),
+            patch.object(run_server, "preload_model") as preload,
+            patch.object(front_proxy, "ProxyServer") as proxy_server,
+            patch.object(run_server.signal, "signal"),
+            redirect_stdout(io.StringIO()) as out,
+        ):
+            exit_code = run_server.run(
+                "127.0.0.1", 7781, startup_timeout=60, workers=2, split_models=True
+            )
+
+        self.assertEqual(exit_code, 0)
+        ports = sorted(call.args[0][call.args[0].index("--port") + 1] for call in popen.call_args_list)
+        self.assertEqual(ports, ["7782", "7783"])
+        self.assertCountEqual(
+            [(call.args[0], call.args[1]) for call in preload.call_args_list],
+            [
+                ("http://127.0.0.1:7782", run_server.TTS_MODEL),
+                ("http://127.0.0.1:7783", run_server.ASR_MODEL),
+            ],
+        )
+        proxy, host, port = proxy_server.call_args.args
+        self.assertEqual((host, port), ("127.0.0.1", 7781))
+        self.assertEqual(
+            {(backend.port, backend.models) for backend in proxy.backends},
+            {(7782, (run_server.TTS_MODEL,)), (7783, (run_server.ASR_MODEL,))},
+        )
+        proxy_server.return_value.stop.assert_called_once_with()
+        for child in children:
+            child.terminate.assert_called_once_with()
+        self.assertIn("(2 workers)", out.getvalue())
+
+    def test_failed_worker_startup_stops_the_others(self):
+        children = [Mock(), Mock()]
+        for child in children:
+            child.poll.return_value = None
+
+        def preload(url, _model, _timeout):
+            if url.endswith("7783"):
+                raise RuntimeError("load failed")
+
+        with (
+            patch.object(run_server.subprocess, "Popen", side_effect=children),
+            patch.object(run_server, "wait_until_ready"),
+            patch.object(run_server, "preload_model", side_effect=preload),
+            patch.object(front_proxy, "ProxyServer") as proxy_server,
+            patch.object(run_server.signal, "signal"),
+            redirect_stdout(io.StringIO()),
+            redirect_stderr(io.StringIO()),
+        ):
+            exit_code = run_server.run("127.0.0.1", 7781, startup_timeout=60, workers=2)
+
+        self.assertEqual(exit_code, 1)
+        proxy_server.assert_not_called()
+        for child in children:
+            child.terminate.assert_called_with()
+
+
 if __name__ == "__main__":
     unittest.main()